@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from yalexs.lock import LockDetail
+from yalexs.manager.accounts import AccountManager
+from yalexs.manager.data import YaleXSData
+from yalexs.manager.gateway import Gateway
+
+
+async def _async_setup_gateway(self: Gateway, conf: dict) -> None:
+    """Set up a gateway without authenticating."""
+    self.api = MagicMock()
+
+
+def _patch_gateway() -> ExitStack:
+    stack = ExitStack()
+    stack.enter_context(patch.object(Gateway, "async_setup", _async_setup_gateway))
+    stack.enter_context(patch.object(Gateway, "async_authenticate", AsyncMock()))
+    return stack
+
+
+class MockYaleXSData(YaleXSData):
+    """YaleXSData with the abstract methods implemented."""
+
+    def async_offline_key_discovered(self, detail: LockDetail) -> None:
+        """Handle offline key discovery."""
+
+
+@pytest.mark.asyncio
+async def test_accounts_share_resources_and_isolate_state(tmp_path: Path) -> None:
+    """Test accounts share the manager resources but not their state."""
+    session = MagicMock()
+    manager = AccountManager(tmp_path, session)
+    with _patch_gateway():
+        first = await manager.async_add_account("first", {}, MockYaleXSData)
+        second = await manager.async_add_account("second", {}, MockYaleXSData)
+        with pytest.raises(ValueError):
+            await manager.async_add_account("first", {}, MockYaleXSData)
+
+    assert len(manager) == 2
+    assert "first" in manager
+    assert manager["second"] is second
+    assert first.gateway is not second.gateway
+    assert first.data is not second.data
+    for account in (first, second):
+        assert account.gateway._aiohttp_session is session
+        assert account.gateway._rate_limiter is manager.rate_limiter
+        assert account.gateway._request_limiter is manager.request_limiter
+        assert account.gateway._token_bucket_limiter is manager.token_bucket_limiter
+        assert account.data._rate_limiter is manager.rate_limiter
+        assert account.data._scheduler is manager.scheduler
+
+    await manager.async_stop()
+    assert len(manager) == 0
+    session.close.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_failed_account_does_not_stop_the_others(tmp_path: Path) -> None:
+    """Test each account is set up even if another one fails."""
+    manager = AccountManager(tmp_path, MagicMock())
+    with _patch_gateway():
+        for account_id in ("ok", "broken"):
+            await manager.async_add_account(account_id, {}, MockYaleXSData)
+    error = RuntimeError("no houses")
+    manager["ok"].data.async_setup = AsyncMock()
+    manager["broken"].data.async_setup = AsyncMock(side_effect=error)
+
+    assert await manager.async_setup_accounts() == {"ok": None, "broken": error}
+    manager["ok"].data.async_setup.assert_awaited_once()
+
+    await manager.async_remove_account("broken")
+    assert "broken" not in manager
+    await manager.async_stop()
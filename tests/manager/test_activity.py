@@ -1,23 +1,37 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import os
+from collections.abc import AsyncIterator
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from freezegun.api import FrozenDateTimeFactory
 
+from yalexs.activity import Activity, ActivityCursor, ActivityType
 from yalexs.api_async import ApiAsync
+from yalexs.api_common import _process_activity_json
 from yalexs.manager.activity import (
+    ACTIVITY_CATCH_UP_FETCH_LIMIT,
     ACTIVITY_DEBOUNCE_COOLDOWN,
     INITIAL_LOCK_RESYNC_TIME,
     UPDATE_SOON,
     ActivityStream,
 )
 from yalexs.manager.gateway import Gateway
+from yalexs.manager.poll import AdaptivePollPolicy
 
 from ..common import fire_time_changed
 
 
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "..", "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
 @pytest.mark.asyncio
 async def test_activity_stream_debounce(freezer: FrozenDateTimeFactory) -> None:
     """Test activity stream debounce."""
@@ -191,3 +205,146 @@ async def test_activity_stream_debounce_during_init(
     await asyncio.sleep(0)
     assert async_get_house_activities.call_count == 2
     assert "myhouseid" not in activity._schedule_updates
+
+
+@pytest.mark.asyncio
+async def test_activity_stream_streams_catch_up() -> None:
+    """Test the catch-up fetch is processed as it is streamed."""
+    api = MagicMock(auto_spec=ApiAsync)
+    api.async_get_house_activities = AsyncMock(return_value=[])
+    activities = _process_activity_json(
+        json.loads(load_fixture("get_house_activities.json"))
+    )
+    limits: list[int] = []
+
+    async def _async_stream_house_activities(
+        token: str, house_id: str, limit: int, cursor: ActivityCursor
+    ) -> AsyncIterator[list]:
+        limits.append(limit)
+        yield activities[:5]
+        yield activities[5:]
+
+    api.async_stream_house_activities = _async_stream_house_activities
+    august_gateway = MagicMock(auto_spec=Gateway)
+    august_gateway.async_refresh_access_token_if_needed = AsyncMock()
+    august_gateway.async_get_access_token = AsyncMock()
+    push = MagicMock(connected=False)
+
+    activity = ActivityStream(
+        api, august_gateway, {"myhouseid"}, push, stream_activities=True
+    )
+    activity.async_signal_device_id_update = MagicMock()
+    await activity.async_setup()
+    await asyncio.sleep(0)
+
+    assert limits == [ACTIVITY_CATCH_UP_FETCH_LIMIT]
+    assert api.async_get_house_activities.call_count == 0
+    assert {
+        call.args[0] for call in activity.async_signal_device_id_update.call_args_list
+    } == {"mockDevice1", "mockDeviceId2"}
+    assert activity.get_latest_device_activity(
+        "mockDevice1", {ActivityType.LOCK_OPERATION}
+    )
+    activity.async_stop()
+
+
+@pytest.mark.asyncio
+async def test_activity_stream_compact_activities() -> None:
+    """Test compact activities are only built into full activities if they win."""
+    api = MagicMock(auto_spec=ApiAsync)
+    august_gateway = MagicMock(auto_spec=Gateway)
+    push = MagicMock(connected=False)
+    activity = ActivityStream(
+        api, august_gateway, {"myhouseid"}, push, compact_activities=True
+    )
+    compact_activities = _process_activity_json(
+        json.loads(load_fixture("get_house_activities.json")), compact=True
+    )
+
+    updated = activity.async_process_newer_device_activities(compact_activities)
+
+    assert updated == {"mockDevice1", "mockDeviceId2"}
+    for device_activities in activity._latest_activities.values():
+        for latest in device_activities.values():
+            assert isinstance(latest, Activity)
+    latest = activity.get_latest_device_activity(
+        "mockDevice1", {ActivityType.LOCK_OPERATION}
+    )
+    assert latest.activity_start_time == max(
+        compact.activity_start_time
+        for compact in compact_activities
+        if compact.device_id == "mockDevice1"
+        and compact.activity_type is ActivityType.LOCK_OPERATION
+    )
+    activity.async_stop()
+
+
+@pytest.mark.asyncio
+async def test_activity_stream_drops_duplicate_activities() -> None:
+    """Test activities that were already processed are dropped."""
+    api = MagicMock(auto_spec=ApiAsync)
+    august_gateway = MagicMock(auto_spec=Gateway)
+    push = MagicMock(connected=False)
+    activity = ActivityStream(api, august_gateway, {"myhouseid"}, push)
+    lock_activity = json.loads(load_fixture("lock_activity.json"))
+
+    assert activity.async_process_newer_device_activities(
+        _process_activity_json([lock_activity])
+    ) == {lock_activity["deviceID"]}
+    assert (activity.dedup_hits, activity.dedup_misses) == (0, 1)
+    assert (
+        activity.async_process_newer_device_activities(
+            _process_activity_json([lock_activity])
+        )
+        == set()
+    )
+    assert (activity.dedup_hits, activity.dedup_misses) == (1, 1)
+
+    # Activities without an id, like those from a lock operation,
+    # are identified by the device, action and start time
+    pushed = {key: value for key, value in lock_activity.items() if key != "entities"}
+    pushed["dateTime"] += 1000
+    for _ in range(2):
+        activity.async_process_newer_device_activities(_process_activity_json([pushed]))
+    assert (activity.dedup_hits, activity.dedup_misses) == (2, 2)
+    activity.async_stop()
+
+
+@pytest.mark.asyncio
+async def test_activity_stream_poll_policy() -> None:
+    """Test houses are polled when the poll policy says they are due."""
+    api = MagicMock(auto_spec=ApiAsync)
+    api.circuit_breaker = None
+    api.async_get_house_activities = AsyncMock(return_value=[])
+    august_gateway = MagicMock(auto_spec=Gateway)
+    august_gateway.async_refresh_access_token_if_needed = AsyncMock()
+    august_gateway.async_get_access_token = AsyncMock()
+    push = MagicMock(connected=True)
+    policy = AdaptivePollPolicy()
+
+    activity = ActivityStream(
+        api, august_gateway, {"quiet", "busy"}, push, poll_policy=policy
+    )
+    await activity.async_setup()
+    assert api.async_get_house_activities.call_count == 0
+    now = activity._loop.time()
+    activity._start_time = now - INITIAL_LOCK_RESYNC_TIME - 1
+    # Both houses were polled a couple of minutes ago
+    activity._last_update_time["quiet"] = now - 120
+    activity._last_update_time["busy"] = now - 120
+    activity._last_activity_time["busy"] = now - 60
+
+    await activity._async_refresh()
+    assert "quiet" not in activity._schedule_updates
+    assert "busy" in activity._schedule_updates
+    await asyncio.sleep(0.01)
+    api.async_get_house_activities.assert_called_once()
+    assert api.async_get_house_activities.call_args[0][1] == "busy"
+
+    # Every house is due once push updates are disconnected
+    push.connected = False
+    activity._last_update_time["busy"] = now - 120
+    await activity._async_refresh()
+    assert "quiet" in activity._schedule_updates
+    assert "busy" in activity._schedule_updates
+    activity.async_stop()
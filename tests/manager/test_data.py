@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiohttp import ClientResponseError
+
+from yalexs.activity import ActivityCursor, ActivityType
+from yalexs.api_common import _process_activity_json
+from yalexs.circuit_breaker import CircuitBreaker
+from yalexs.exceptions import CannotConnect, InvalidAuth, YaleApiError
+from yalexs.lock import Lock, LockDetail
+from yalexs.manager.activity import ACTIVITY_WARM_START_FETCH_LIMIT
+from yalexs.manager.data import YaleXSData
+from yalexs.manager.exceptions import YaleXSError
+from yalexs.manager.gateway import Gateway
+from yalexs.manager.snapshot import async_load_snapshot
+from yalexs.pubnub_activity import activities_from_pubnub_message
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "..", "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+class MockYaleXSData(YaleXSData):
+    """YaleXSData with the abstract methods implemented."""
+
+    def async_offline_key_discovered(self, detail: LockDetail) -> None:
+        """Handle offline key discovery."""
+
+
+def _lock_detail_json(lock_id: str) -> dict:
+    lock_json = json.loads(load_fixture("get_lock.online.json"))
+    lock_json["LockID"] = lock_id
+    return lock_json
+
+
+def _mock_gateway() -> MagicMock:
+    gateway = MagicMock(auto_spec=Gateway)
+    gateway.async_get_access_token = AsyncMock(return_value="token")
+    gateway.async_stop = AsyncMock()
+    return gateway
+
+
+def _add_locks(data: YaleXSData, lock_ids: list[str]) -> None:
+    for lock_id in lock_ids:
+        data._locks_by_id[lock_id] = Lock(
+            lock_id,
+            {"LockName": lock_id, "HouseID": "myhouseid", "UserType": "superuser"},
+        )
+
+
+@pytest.mark.asyncio
+async def test_refresh_device_detail_bounded_concurrency() -> None:
+    """Test device details are refreshed concurrently up to the limit."""
+    gateway = _mock_gateway()
+    in_flight = 0
+    max_in_flight = 0
+
+    async def _async_get_lock_detail(token: str, lock_id: str) -> LockDetail:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return LockDetail(_lock_detail_json(lock_id))
+
+    gateway.api.async_get_lock_detail = _async_get_lock_detail
+    data = MockYaleXSData(gateway, detail_refresh_concurrency=4)
+    lock_ids = [f"lock{idx}" for idx in range(20)]
+    _add_locks(data, lock_ids)
+
+    await data._async_refresh_device_detail_by_ids(lock_ids)
+
+    assert max_in_flight == 4
+    assert all(
+        data.get_device_detail(lock_id).device_id == lock_id for lock_id in lock_ids
+    )
+
+
+@pytest.mark.asyncio
+async def test_refresh_device_detail_isolates_slow_devices() -> None:
+    """Test a device that times out does not hold up the others."""
+    gateway = _mock_gateway()
+
+    async def _async_get_lock_detail(token: str, lock_id: str) -> LockDetail:
+        if lock_id == "slow":
+            await asyncio.sleep(10)
+        if lock_id == "broken":
+            raise TimeoutError
+        return LockDetail(_lock_detail_json(lock_id))
+
+    gateway.api.async_get_lock_detail = _async_get_lock_detail
+    data = MockYaleXSData(gateway, detail_refresh_timeout=0.05)
+    lock_ids = ["slow", "broken", "good1", "good2"]
+    _add_locks(data, lock_ids)
+
+    await data._async_refresh_device_detail_by_ids(lock_ids)
+
+    assert data.get_device_detail("good1").device_id == "good1"
+    assert data.get_device_detail("good2").device_id == "good2"
+    assert "slow" not in data._device_detail_by_id
+    assert "broken" not in data._device_detail_by_id
+
+
+@pytest.mark.asyncio
+async def test_refresh_device_detail_api_errors() -> None:
+    """Test api errors for one device do not stop the others."""
+    gateway = _mock_gateway()
+
+    async def _async_get_lock_detail(token: str, lock_id: str) -> LockDetail:
+        await asyncio.sleep(0)
+        if lock_id == "error":
+            raise YaleApiError("server error", None)
+        if lock_id == "unavailable":
+            raise CannotConnect("api unavailable")
+        if lock_id == "auth":
+            raise InvalidAuth(
+                "auth failed", ClientResponseError(MagicMock(), (), status=401)
+            )
+        await asyncio.sleep(0.01)
+        return LockDetail(_lock_detail_json(lock_id))
+
+    gateway.api.async_get_lock_detail = _async_get_lock_detail
+    data = MockYaleXSData(gateway)
+    lock_ids = ["error", "unavailable", "good1", "good2"]
+    _add_locks(data, [*lock_ids, "auth"])
+
+    await data._async_refresh_device_detail_by_ids(lock_ids)
+    assert set(data._device_detail_by_id) & {*lock_ids, "auth"} == {"good1", "good2"}
+
+    data._device_detail_by_id.clear()
+    # Failed auth is raised, but only once the other devices are done
+    with pytest.raises(InvalidAuth):
+        await data._async_refresh_device_detail_by_ids(["auth", "good1", "good2"])
+    assert set(data._device_detail_by_id) & {*lock_ids, "auth"} == {"good1", "good2"}
+
+
+@pytest.mark.asyncio
+async def test_refresh_skipped_while_circuit_open() -> None:
+    """Test polling backs off while the api circuit breaker is open."""
+    gateway = _mock_gateway()
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    gateway.api.circuit_breaker = breaker
+    gateway.api.async_get_lock_detail = AsyncMock(
+        side_effect=lambda token, lock_id: LockDetail(_lock_detail_json(lock_id))
+    )
+    data = MockYaleXSData(gateway)
+    _add_locks(data, ["lock1"])
+    data._subscriptions["lock1"] = set()
+
+    breaker.record_failure()
+    await data._async_refresh()
+    assert gateway.api.async_get_lock_detail.call_count == 0
+
+    breaker.record_success()
+    await data._async_refresh()
+    assert gateway.api.async_get_lock_detail.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_warm_setup_restores_snapshot(tmp_path: Path) -> None:
+    """Test a snapshot is served right away and reconciled in the background."""
+    snapshot_path = str(tmp_path / "snapshot.json")
+    lock_activity = json.loads(load_fixture("lock_activity.json"))
+    lock_activity["deviceID"] = "lock1"
+    with patch("yalexs.pubnub_async.AugustPubNub"):
+        data = MockYaleXSData(_mock_gateway())
+        _add_locks(data, ["lock1"])
+        data._device_detail_by_id["lock1"] = LockDetail(_lock_detail_json("lock1"))
+        data._house_ids = {"myhouseid"}
+        data._create_activity_stream()
+    data.activity_stream.async_process_newer_device_activities(
+        _process_activity_json([lock_activity])
+    )
+    data.activity_stream._cursors["myhouseid"] = ActivityCursor(1234, ["activity1"])
+    await data.async_save_snapshot(snapshot_path)
+    # The snapshot is written to a temporary file that replaces it
+    assert [path.name for path in tmp_path.iterdir()] == ["snapshot.json"]
+
+    gateway = _mock_gateway()
+    gateway.async_get_access_token = AsyncMock(return_value="warm-setup-token")
+    gateway.async_refresh_access_token_if_needed = AsyncMock()
+    api = gateway.api
+    devices_fetched = asyncio.Event()
+
+    async def _async_get_operable_locks(token: str) -> list[Lock]:
+        await devices_fetched.wait()
+        return list(data.locks)
+
+    api.async_get_operable_locks = _async_get_operable_locks
+    api.async_get_doorbells = AsyncMock(return_value=[])
+    api.async_get_lock_detail = AsyncMock(
+        side_effect=lambda token, lock_id: LockDetail(_lock_detail_json(lock_id))
+    )
+    api.async_get_user = AsyncMock(return_value={"UserID": "user"})
+    api.async_get_house_activities = AsyncMock(return_value=[])
+    warm = MockYaleXSData(gateway)
+    with patch("yalexs.pubnub_async.AugustPubNub") as pubnub:
+        pubnub.return_value.connected = False
+        pubnub.return_value.run = AsyncMock()
+        assert await warm.async_warm_setup(snapshot_path) is True
+
+        # The restored data is served before the api has been reached
+        assert [lock.device_id for lock in warm.locks] == ["lock1"]
+        assert warm.get_device_detail("lock1").device_id == "lock1"
+        latest = warm.activity_stream.get_latest_device_activity(
+            "lock1", {ActivityType.LOCK_OPERATION}
+        )
+        assert latest.activity_id == lock_activity["entities"]["activity"]
+        assert api.async_get_house_activities.call_count == 0
+
+        devices_fetched.set()
+        await warm._reconcile_task
+
+    assert api.async_get_lock_detail.call_count == 1
+    call = api.async_get_house_activities.call_args
+    assert call.kwargs["limit"] == ACTIVITY_WARM_START_FETCH_LIMIT
+    assert call.kwargs["cursor"].date_time == 1234
+    assert call.kwargs["cursor"].activity_ids == {"activity1"}
+    await warm.async_stop()
+
+
+@pytest.mark.asyncio
+async def test_warm_setup_without_snapshot(tmp_path: Path) -> None:
+    """Test a full setup is done if there is no usable snapshot."""
+    data = MockYaleXSData(_mock_gateway())
+    data.async_setup = AsyncMock()
+    assert await data.async_warm_setup(str(tmp_path / "missing.json")) is False
+    assert data.async_setup.call_count == 1
+
+    for contents in ("not json", json.dumps({"version": 0})):
+        (tmp_path / "bad.json").write_text(contents)
+        assert await async_load_snapshot(str(tmp_path / "bad.json")) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("window", [None, 0, 0.01])
+async def test_push_messages_coalesced(window: float | None) -> None:
+    """Test push messages for a device are processed together in a window."""
+    with patch("yalexs.pubnub_async.AugustPubNub"):
+        data = MockYaleXSData(_mock_gateway(), push_coalesce_window=window)
+        _add_locks(data, ["lock1"])
+        data._device_detail_by_id["lock1"] = LockDetail(_lock_detail_json("lock1"))
+        data._house_ids = {"myhouseid"}
+        data._create_activity_stream()
+    data.async_signal_device_id_update = MagicMock()
+    data.activity_stream.async_schedule_house_id_refresh = MagicMock()
+    data.activity_stream.async_process_newer_device_activities = MagicMock(
+        wraps=data.activity_stream.async_process_newer_device_activities
+    )
+
+    now = datetime.now()
+    for offset, status in enumerate(
+        ("kAugLockState_Unlocking", "kAugLockState_Unlocked", "kAugLockState_Locked")
+    ):
+        data.async_push_message(
+            "lock1", now + timedelta(seconds=offset), {"status": status}
+        )
+    # A message for a device that is not known does not stop the others
+    data.async_push_message("unknown", now, {"status": "kAugLockState_Locked"})
+
+    if window is None:
+        assert data.async_signal_device_id_update.call_count == 3
+    else:
+        assert data.async_signal_device_id_update.call_count == 0
+        await asyncio.sleep(window + 0.01)
+        assert data.async_signal_device_id_update.call_count == 1
+        assert (
+            data.activity_stream.async_process_newer_device_activities.call_count == 1
+        )
+    data.async_signal_device_id_update.assert_called_with("lock1")
+    latest = data.activity_stream.get_latest_device_activity(
+        "lock1", {ActivityType.LOCK_OPERATION_WITHOUT_OPERATOR}
+    )
+    assert latest.action == "lock"
+    await data.async_stop()
+    data._gateway.async_stop.assert_awaited_once()
+
+
+def _add_bridged_locks(data: YaleXSData, lock_ids_by_bridge: dict[str, list[str]]):
+    for bridge_id, lock_ids in lock_ids_by_bridge.items():
+        _add_locks(data, lock_ids)
+        for lock_id in lock_ids:
+            lock_json = _lock_detail_json(lock_id)
+            lock_json["Bridge"]["_id"] = bridge_id
+            data._device_detail_by_id[lock_id] = LockDetail(lock_json)
+
+
+@pytest.mark.asyncio
+async def test_lock_many_limits_each_bridge() -> None:
+    """Test devices on different bridges are operated concurrently."""
+    gateway = _mock_gateway()
+    in_flight: dict[str, int] = {}
+    max_in_flight: dict[str, int] = {}
+    max_total_in_flight = 0
+    now = datetime.now()
+
+    async def _async_lock_return_activities(token: str, lock_id: str) -> list:
+        nonlocal max_total_in_flight
+        bridge_id = data.get_device_detail(lock_id).bridge.device_id
+        in_flight[bridge_id] = in_flight.get(bridge_id, 0) + 1
+        max_in_flight[bridge_id] = max(
+            max_in_flight.get(bridge_id, 0), in_flight[bridge_id]
+        )
+        max_total_in_flight = max(max_total_in_flight, sum(in_flight.values()))
+        await asyncio.sleep(0.01)
+        in_flight[bridge_id] -= 1
+        if lock_id == "broken":
+            raise YaleApiError("bridge offline", None)
+        return activities_from_pubnub_message(
+            data.get_device_detail(lock_id), now, {"status": "kAugLockState_Locked"}
+        )
+
+    gateway.api.async_lock_return_activities = _async_lock_return_activities
+    with patch("yalexs.pubnub_async.AugustPubNub"):
+        data = MockYaleXSData(gateway)
+        _add_bridged_locks(
+            data,
+            {
+                "bridge1": ["lock1", "lock2", "broken"],
+                "bridge2": ["lock3", "lock4"],
+                "bridge3": ["lock5"],
+            },
+        )
+        data._house_ids = {"myhouseid"}
+        data._create_activity_stream()
+    data.async_signal_device_id_update = MagicMock()
+    data.activity_stream.async_process_newer_device_activities = MagicMock(
+        wraps=data.activity_stream.async_process_newer_device_activities
+    )
+
+    results = await data.async_lock_many(
+        ["lock1", "lock2", "broken", "lock3", "lock4", "lock5", "lock1"]
+    )
+
+    # One operation at a time on each bridge, with the bridges in parallel
+    assert max_in_flight == {"bridge1": 1, "bridge2": 1, "bridge3": 1}
+    assert max_total_in_flight == 3
+    assert list(results) == ["lock1", "lock2", "broken", "lock3", "lock4", "lock5"]
+    assert isinstance(results["broken"], YaleXSError)
+    for lock_id in ("lock1", "lock2", "lock3", "lock4", "lock5"):
+        assert results[lock_id][0].device_id == lock_id
+        latest = data.activity_stream.get_latest_device_activity(
+            lock_id, {ActivityType.LOCK_OPERATION_WITHOUT_OPERATOR}
+        )
+        assert latest.action == "lock"
+    assert data.activity_stream.async_process_newer_device_activities.call_count == 1
+    assert data.async_signal_device_id_update.call_count == 5
+    await data.async_stop()
+
+
+@pytest.mark.asyncio
+async def test_unlock_many_retries_busy_bridge() -> None:
+    """Test an operation is retried once when the bridge is in use."""
+    gateway = _mock_gateway()
+    busy = ClientResponseError(MagicMock(), (), status=423)
+    gateway.api.async_unlock_return_activities = AsyncMock(
+        side_effect=[
+            YaleApiError("bridge in use", busy),
+            [],
+            YaleApiError("bridge in use", busy),
+            YaleApiError("bridge in use", busy),
+        ]
+    )
+    data = MockYaleXSData(gateway)
+    _add_bridged_locks(data, {"bridge1": ["lock1", "lock2"]})
+
+    with patch("yalexs.manager.data.BRIDGE_BUSY_RETRY_DELAY", 0):
+        results = await data.async_unlock_many(["lock1", "lock2"])
+
+    assert results["lock1"] == []
+    assert isinstance(results["lock2"], YaleXSError)
+    assert gateway.api.async_unlock_return_activities.call_count == 4
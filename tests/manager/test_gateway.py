@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from yalexs.authenticator_common import Authentication, AuthenticationState
+from yalexs.manager.gateway import TOKEN_REFRESH_RETRY_DELAY, Gateway
+
+
+def _authentication(token: str) -> Authentication:
+    return Authentication(
+        AuthenticationState.AUTHENTICATED,
+        access_token=token,
+        access_token_expires="2099-01-01T00:00:00.000Z",
+    )
+
+
+@pytest.mark.asyncio
+async def test_token_refreshed_once_by_timer(tmp_path: Path) -> None:
+    """Test the token is refreshed once when due and waiters get the new one."""
+    gateway = Gateway(tmp_path, MagicMock())
+    gateway.authenticator = MagicMock()
+    gateway.authenticator.refresh_at.return_value = time.time() + 0.01
+    refreshed = asyncio.Event()
+    refresh_calls = 0
+
+    async def _async_refresh_access_token(force: bool) -> Authentication:
+        nonlocal refresh_calls
+        refresh_calls += 1
+        await refreshed.wait()
+        gateway.authenticator.refresh_at.return_value = time.time() + 3600
+        return _authentication("new")
+
+    gateway.authenticator.async_refresh_access_token = _async_refresh_access_token
+    gateway.authentication = _authentication("old")
+    assert gateway.access_token == "old"
+    assert await gateway.async_get_access_token() == "old"
+    # Not due yet so nothing is refreshed on the interval tick
+    await gateway.async_refresh_access_token_if_needed()
+    assert refresh_calls == 0
+
+    await asyncio.sleep(0.02)
+    assert refresh_calls == 1
+    waiters = [asyncio.create_task(gateway.async_get_access_token()) for _ in range(3)]
+    ticks = [
+        asyncio.create_task(gateway.async_refresh_access_token_if_needed())
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    refreshed.set()
+    assert await asyncio.gather(*waiters) == ["new", "new", "new"]
+    await asyncio.gather(*ticks)
+    assert refresh_calls == 1
+    assert gateway.access_token == "new"
+    assert gateway._refresh_handle is not None
+    await gateway.async_stop()
+    assert gateway._refresh_handle is None
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_is_retried(tmp_path: Path) -> None:
+    """Test a failed refresh is tried again later and the old token is kept."""
+    gateway = Gateway(tmp_path, MagicMock())
+    gateway.authenticator = MagicMock()
+    gateway.authenticator.refresh_at.return_value = time.time()
+
+    async def _async_refresh_access_token(force: bool) -> Authentication:
+        await asyncio.sleep(0)
+        raise RuntimeError("api down")
+
+    gateway.authenticator.async_refresh_access_token = _async_refresh_access_token
+    gateway.authentication = _authentication("old")
+    await asyncio.sleep(0.01)
+    assert await gateway.async_get_access_token() == "old"
+    assert gateway._refresh_task is None
+    assert gateway._refresh_at == pytest.approx(
+        time.time() + TOKEN_REFRESH_RETRY_DELAY, abs=1
+    )
+    await gateway.async_stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_saves_access_token(tmp_path: Path) -> None:
+    """Test stopping the gateway writes a token that is waiting to be saved."""
+    gateway = Gateway(tmp_path, MagicMock())
+    assert gateway._token_store is Gateway(tmp_path, MagicMock())._token_store
+    path = tmp_path / "token"
+    gateway._token_store.async_set(str(path), "abc")
+    assert not path.exists()
+    await gateway.async_stop()
+    assert path.read_text() == "abc"
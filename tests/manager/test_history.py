@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import time
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from freezegun.api import FrozenDateTimeFactory
+
+from yalexs.activity import SOURCE_LOG, CompactActivity
+from yalexs.api_async import ApiAsync
+from yalexs.api_common import _process_activity_json
+from yalexs.manager.activity import ActivityStream
+from yalexs.manager.gateway import Gateway
+from yalexs.manager.history import ActivityHistory
+
+from .test_activity import load_fixture
+
+
+def _activity(
+    activity_id: str | None, device_id: str, action: str, timestamp: float
+) -> CompactActivity:
+    return CompactActivity(
+        SOURCE_LOG,
+        {
+            "action": action,
+            "dateTime": timestamp * 1000,
+            "deviceID": device_id,
+            "entities": {"activity": activity_id, "house": "myhouseid"},
+        },
+    )
+
+
+def test_query_by_device_action_and_time() -> None:
+    """Test range queries use the device and action indexes."""
+    now = time.time()
+    history = ActivityHistory(100)
+    assert (
+        history.add(
+            [
+                _activity("a4", "lock1", "unlock", now - 60),
+                _activity("a1", "lock1", "unlock", now - 7200),
+                _activity("a2", "lock1", "lock", now - 1800),
+                _activity("a3", "lock2", "unlock", now - 900),
+                _activity("a5", "lock1", "remote_unlock", now - 30),
+            ]
+        )
+        == 5
+    )
+    hour_ago = datetime.fromtimestamp(now - 3600)
+
+    unlocks = history.query(device_id="lock1", actions={"unlock"}, start=hour_ago)
+    assert [activity.activity_id for activity in unlocks] == ["a4"]
+    unlocks = history.query(
+        device_id="lock1", actions={"unlock", "remote_unlock"}, start=hour_ago
+    )
+    assert [activity.activity_id for activity in unlocks] == ["a4", "a5"]
+    assert [activity.activity_id for activity in history.query(actions=["unlock"])] == [
+        "a1",
+        "a3",
+        "a4",
+    ]
+    assert [activity.activity_id for activity in history.query(device_id="lock1")] == [
+        "a1",
+        "a2",
+        "a4",
+        "a5",
+    ]
+    assert [
+        activity.activity_id
+        for activity in history.query(
+            start=hour_ago, end=datetime.fromtimestamp(now - 60)
+        )
+    ] == ["a2", "a3"]
+    assert history.query(device_id="missing") == []
+    assert history.query(device_id="lock2", actions={"lock"}) == []
+
+
+def test_duplicates_are_ignored() -> None:
+    """Test activities returned by overlapping fetches are only kept once."""
+    now = time.time()
+    history = ActivityHistory(100)
+    history.add([_activity("a1", "lock1", "unlock", now)])
+    assert history.add([_activity("a1", "lock1", "unlock", now)]) == 0
+    # Activities without an id are identified by what happened and when
+    history.add([_activity(None, "lock1", "lock", now)])
+    assert history.add([_activity(None, "lock1", "lock", now)]) == 0
+    assert history.add([_activity(None, "lock1", "lock", now + 1)]) == 1
+    assert len(history) == 3
+
+
+def test_evicts_oldest_over_maxlen() -> None:
+    """Test the oldest activities are evicted once the history is full."""
+    now = time.time()
+    history = ActivityHistory(3)
+    history.add(
+        [_activity(f"a{idx}", "lock1", "unlock", now - 100 + idx) for idx in range(5)]
+    )
+    # Activities that start at the same time are still evicted one by one
+    history.add([_activity("a5", "lock1", "unlock", now - 96)])
+
+    assert len(history) == 3
+    assert [activity.activity_id for activity in history.query()] == [
+        "a3",
+        "a4",
+        "a5",
+    ]
+    assert [
+        activity.activity_id
+        for activity in history.query(device_id="lock1", actions={"unlock"})
+    ] == ["a3", "a4", "a5"]
+    # An evicted activity can be added again
+    assert history.add([_activity("a0", "lock1", "unlock", now - 100)]) == 1
+    assert len(history) == 3
+
+
+def test_evicts_older_than_max_age(freezer: FrozenDateTimeFactory) -> None:
+    """Test activities older than the max age are evicted."""
+    now = time.time()
+    history = ActivityHistory(100, max_age=3600)
+    history.add(
+        [
+            _activity("old", "lock1", "unlock", now - 7200),
+            _activity("new", "lock1", "lock", now - 60),
+        ]
+    )
+    assert [activity.activity_id for activity in history.query()] == ["new"]
+
+    freezer.tick(timedelta(hours=1))
+    assert len(history) == 0
+    assert history.query(device_id="lock1", actions={"lock"}) == []
+
+
+@pytest.mark.asyncio
+async def test_activity_stream_keeps_history() -> None:
+    """Test the activity stream records fetched activities in the history."""
+    activities = _process_activity_json(
+        json.loads(load_fixture("get_house_activities.json"))
+    )
+    api = MagicMock(auto_spec=ApiAsync)
+    api.async_get_house_activities = AsyncMock(return_value=activities)
+    august_gateway = MagicMock(auto_spec=Gateway)
+    august_gateway.async_refresh_access_token_if_needed = AsyncMock()
+    august_gateway.async_get_access_token = AsyncMock()
+    push = MagicMock(connected=False)
+
+    activity = ActivityStream(api, august_gateway, {"myhouseid"}, push, history_size=5)
+    await activity.async_setup()
+
+    history = activity.get_activity_history("myhouseid")
+    assert len(history) == 5
+    newest = sorted(activities, key=lambda activity: activity.activity_start_time)[-5:]
+    assert history.query() == newest
+    assert activity.get_activity_history("otherhouse") is None
+    activity.async_stop()
+
+    activity = ActivityStream(api, august_gateway, {"myhouseid"}, push)
+    assert activity.get_activity_history("myhouseid") is None
+    activity.async_stop()
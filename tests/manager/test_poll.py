@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import pytest
+
+from yalexs.manager.poll import AdaptivePollPolicy
+
+
+def test_interval_tightens_when_push_down_or_active() -> None:
+    """Test quiet houses are polled rarely and busy or unpushed ones often."""
+    policy = AdaptivePollPolicy()
+    now = 10000.0
+    quiet = policy.interval(push_connected=True, last_activity=-86400.0, now=now)
+    active = policy.interval(push_connected=True, last_activity=now - 5, now=now)
+    push_down = policy.interval(push_connected=False, last_activity=-86400.0, now=now)
+    assert quiet == policy.quiet_interval
+    assert active == policy.active_interval
+    assert push_down == policy.push_down_interval
+    assert push_down < active < quiet
+
+
+def test_next_poll_spreads_houses_across_the_interval() -> None:
+    """Test houses polled at the same time are next polled at different times."""
+    policy = AdaptivePollPolicy()
+    interval = policy.quiet_interval
+    next_polls = [
+        policy.next_poll(
+            f"house{idx}",
+            push_connected=True,
+            last_poll=0.0,
+            last_activity=-86400.0,
+            now=0.0,
+        )
+        for idx in range(100)
+    ]
+    for next_poll in next_polls:
+        assert interval / 2 <= next_poll < interval * 1.5
+    # The phases land in every tenth of the interval
+    assert (
+        len({int(next_poll % interval // (interval / 10)) for next_poll in next_polls})
+        == 10
+    )
+
+
+def test_next_poll_is_stable_for_a_house() -> None:
+    """Test a house keeps its phase from one poll to the next."""
+    policy = AdaptivePollPolicy()
+    first = policy.next_poll(
+        "myhouseid", push_connected=False, last_poll=0.0, last_activity=0.0, now=0.0
+    )
+    second = policy.next_poll(
+        "myhouseid",
+        push_connected=False,
+        last_poll=first,
+        last_activity=0.0,
+        now=first,
+    )
+    assert second - first == pytest.approx(policy.push_down_interval)
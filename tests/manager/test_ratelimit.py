@@ -1,9 +1,17 @@
+import json
 import time
+from pathlib import Path
 
 import pytest
 
 from yalexs.exceptions import RateLimited
-from yalexs.manager.ratelimit import RATE_LIMIT_WAKEUP_INTERVAL, _RateLimitChecker
+from yalexs.manager.ratelimit import (
+    RATE_LIMIT_STORE_FILE,
+    RATE_LIMIT_WAKEUP_INTERVAL,
+    RateLimitCheck,
+    _RateLimitChecker,
+    _token_hash,
+)
 
 
 @pytest.mark.asyncio
@@ -18,3 +26,60 @@ async def test_init_rate_limit():
     assert exc.value.next_allowed == pytest.approx(
         time.monotonic() + RATE_LIMIT_WAKEUP_INTERVAL
     )
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_survives_restart(tmp_path: Path) -> None:
+    store_path = tmp_path / RATE_LIMIT_STORE_FILE
+    checker = RateLimitCheck()
+    await checker.async_load(store_path)
+    await checker.register_wakeup("token")
+    await checker.register_wakeup("other")
+    assert checker._save_handle is not None
+    await checker.async_stop()
+    assert checker._save_handle is None
+
+    stored = json.loads(store_path.read_text())
+    assert "token" not in store_path.read_text()
+    assert len(stored["wakeups"]) == 2
+    for wall_time in stored["wakeups"].values():
+        assert wall_time == pytest.approx(time.time(), abs=5)
+
+    restarted = RateLimitCheck()
+    await restarted.async_load(store_path)
+    with pytest.raises(RateLimited) as exc:
+        await restarted.check_rate_limit("token")
+    assert exc.value.next_allowed == pytest.approx(
+        time.monotonic() + RATE_LIMIT_WAKEUP_INTERVAL, abs=5
+    )
+    await restarted.check_rate_limit("unknown")
+
+
+@pytest.mark.asyncio
+async def test_expired_wakeups_are_not_restored(tmp_path: Path) -> None:
+    store_path = tmp_path / RATE_LIMIT_STORE_FILE
+    expired = time.time() - RATE_LIMIT_WAKEUP_INTERVAL - 1
+    store_path.write_text(
+        json.dumps({"version": 1, "wakeups": {_token_hash("token"): expired}})
+    )
+    checker = RateLimitCheck()
+    await checker.async_load(store_path)
+    await checker.check_rate_limit("token")
+    await checker.async_save()
+    assert json.loads(store_path.read_text())["wakeups"] == {}
+
+
+@pytest.mark.asyncio
+async def test_first_wakeup_saved_right_away(tmp_path: Path) -> None:
+    store_path = tmp_path / RATE_LIMIT_STORE_FILE
+    checker = RateLimitCheck()
+    await checker.async_load(store_path)
+    await checker.register_wakeup("token")
+    assert checker._save_handle is None
+    await checker._save_task
+    assert list(json.loads(store_path.read_text())["wakeups"]) == [_token_hash("token")]
+    # Wakeups soon after are batched
+    await checker.register_wakeup("other")
+    assert checker._save_handle is not None
+    await checker.async_stop()
+    assert len(json.loads(store_path.read_text())["wakeups"]) == 2
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from freezegun.api import FrozenDateTimeFactory
+
+from yalexs.manager.scheduler import DeadlineScheduler, SharedScheduler
+
+from ..common import fire_time_changed, get_scheduled_timer_handles
+
+
+@pytest.mark.asyncio
+async def test_deadlines_share_one_timer(freezer: FrozenDateTimeFactory) -> None:
+    """Test callbacks are called in deadline order from a single loop timer."""
+    loop = asyncio.get_running_loop()
+    called: list[str] = []
+    scheduler: DeadlineScheduler[str] = DeadlineScheduler(loop, called.append)
+    timers_before = len(get_scheduled_timer_handles(loop))
+    now = loop.time()
+
+    for idx in range(100):
+        scheduler.schedule(f"house{idx}", now + 5 + idx / 100)
+    scheduler.schedule("first", now + 1)
+    assert len(scheduler) == 101
+    assert "first" in scheduler
+    active_timers = [
+        handle for handle in get_scheduled_timer_handles(loop) if not handle.cancelled()
+    ]
+    assert len(active_timers) - timers_before == 1
+
+    freezer.tick(3)
+    fire_time_changed()
+    assert called == ["first"]
+    assert "first" not in scheduler
+
+    freezer.tick(5)
+    fire_time_changed()
+    assert called == ["first", *(f"house{idx}" for idx in range(100))]
+    assert len(scheduler) == 0
+
+
+@pytest.mark.asyncio
+async def test_reschedule_and_cancel(freezer: FrozenDateTimeFactory) -> None:
+    """Test a key only fires at its latest deadline and not once cancelled."""
+    loop = asyncio.get_running_loop()
+    called: list[str] = []
+    scheduler: DeadlineScheduler[str] = DeadlineScheduler(loop, called.append)
+    now = loop.time()
+
+    scheduler.schedule("house1", now + 1)
+    scheduler.schedule("house2", now + 1)
+    # Keep pushing house1 back like a debounce would
+    for idx in range(500):
+        scheduler.schedule("house1", now + 3 + idx / 1000)
+    assert len(scheduler._heap) <= 64
+    assert scheduler.cancel("house2") is True
+    assert scheduler.cancel("house2") is False
+
+    freezer.tick(2)
+    fire_time_changed()
+    assert called == []
+    freezer.tick(2)
+    fire_time_changed()
+    assert called == ["house1"]
+
+
+@pytest.mark.asyncio
+async def test_cancel_all(freezer: FrozenDateTimeFactory) -> None:
+    """Test no callbacks are called once everything is cancelled."""
+    loop = asyncio.get_running_loop()
+    called: list[str] = []
+    scheduler: DeadlineScheduler[str] = DeadlineScheduler(loop, called.append)
+    scheduler.schedule("house1", loop.time() + 1)
+    scheduler.cancel_all()
+    assert scheduler._timer is None
+    freezer.tick(2)
+    fire_time_changed()
+    assert called == []
+
+
+@pytest.mark.asyncio
+async def test_shared_scheduler_scopes(freezer: FrozenDateTimeFactory) -> None:
+    """Test owners of a shared scheduler can use the same keys."""
+    loop = asyncio.get_running_loop()
+    shared = SharedScheduler(loop)
+    first_called: list[str] = []
+    second_called: list[str] = []
+    first = shared.scope(first_called.append)
+    second = shared.scope(second_called.append)
+    now = loop.time()
+
+    first.schedule("house1", now + 1)
+    second.schedule("house1", now + 1)
+    second.schedule("house2", now + 1)
+    assert len(shared) == 3
+    assert "house2" not in first
+    assert second.cancel("house2") is True
+    assert first.cancel("house2") is False
+
+    freezer.tick(2)
+    fire_time_changed()
+    assert first_called == ["house1"]
+    assert second_called == ["house1"]
+    assert "house1" not in first
+
+    first.schedule("house1", loop.time() + 1)
+    second.schedule("house1", loop.time() + 1)
+    first.cancel_all()
+    freezer.tick(2)
+    fire_time_changed()
+    assert first_called == ["house1"]
+    assert second_called == ["house1", "house1"]
+    assert len(shared) == 0
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from yalexs.manager.subscriber import SubscriberMixin
+
+
+class MockSubscriber(SubscriberMixin):
+    """SubscriberMixin with the abstract methods implemented."""
+
+    async def _async_refresh(self) -> None:
+        """Refresh data."""
+
+
+@pytest.mark.asyncio
+async def test_signals_dispatched_immediately_by_default() -> None:
+    """Test callbacks are called for every signal by default."""
+    subscriber = MockSubscriber(timedelta(hours=1))
+    calls: list[str] = []
+    subscriber._subscriptions["lock1"].add(lambda: calls.append("lock1"))
+
+    subscriber.async_signal_device_id_update("lock1")
+    subscriber.async_signal_device_id_update("lock1")
+    assert calls == ["lock1", "lock1"]
+
+
+@pytest.mark.asyncio
+async def test_coalesced_signals_dispatched_once_per_iteration() -> None:
+    """Test repeated signals are dispatched once in the order they were first sent."""
+    subscriber = MockSubscriber(timedelta(hours=1), coalesce_signals=True)
+    calls: list[str] = []
+    for device_id in ("lock1", "lock2", "doorbell1"):
+        subscriber._subscriptions[device_id].add(
+            lambda device_id=device_id: calls.append(device_id)
+        )
+
+    # A push storm signals the same devices from several paths
+    for _ in range(100):
+        for device_id in ("lock2", "lock1", "lock2", "unsubscribed"):
+            subscriber.async_signal_device_id_update(device_id)
+    assert calls == []
+
+    await asyncio.sleep(0)
+    assert calls == ["lock2", "lock1"]
+
+    await asyncio.sleep(0)
+    assert calls == ["lock2", "lock1"]
+
+
+@pytest.mark.asyncio
+async def test_coalesced_signal_from_callback_is_dispatched_next_iteration() -> None:
+    """Test a device signaled while dispatching is dispatched on the next flush."""
+    subscriber = MockSubscriber(timedelta(hours=1), coalesce_signals=True)
+    calls: list[str] = []
+
+    def _lock1_callback() -> None:
+        calls.append("lock1")
+        if len(calls) == 1:
+            subscriber.async_signal_device_id_update("lock1")
+
+    subscriber._subscriptions["lock1"].add(_lock1_callback)
+    subscriber.async_signal_device_id_update("lock1")
+    await asyncio.sleep(0)
+    assert calls == ["lock1"]
+    await asyncio.sleep(0)
+    assert calls == ["lock1", "lock1"]
+
+
+@pytest.mark.asyncio
+async def test_coalesced_signals_dropped_on_stop() -> None:
+    """Test signals waiting to be dispatched are dropped on stop."""
+    subscriber = MockSubscriber(timedelta(hours=1), coalesce_signals=True)
+    calls: list[str] = []
+    subscriber._subscriptions["lock1"].add(lambda: calls.append("lock1"))
+    subscriber._refresh_task = asyncio.get_running_loop().create_future()
+
+    subscriber.async_signal_device_id_update("lock1")
+    subscriber.async_stop()
+    await asyncio.sleep(0)
+    assert calls == []
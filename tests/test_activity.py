@@ -1,8 +1,11 @@
+import copy
 import json
 import os
+import tracemalloc
 import unittest
 
 import aiounittest
+import pytest
 from aiohttp import ClientSession
 from aioresponses import aioresponses
 
@@ -63,12 +66,14 @@ from yalexs.activity import (
     ACTIVITY_ACTIONS_LOCK_OPERATION,
     SOURCE_LOG,
     SOURCE_WEBSOCKET,
+    ActivityCursor,
     ActivityType,
+    CompactActivity,
     DoorbellDingActivity,
     LockOperationActivity,
 )
 from yalexs.api_async import ApiAsync
-from yalexs.api_common import API_GET_LOCK_URL, ApiCommon
+from yalexs.api_common import API_GET_LOCK_URL, ApiCommon, _process_activity_json
 from yalexs.const import DEFAULT_BRAND
 from yalexs.lock import LockDoorStatus, LockStatus
 
@@ -606,3 +611,110 @@ class TestActivityApiAsync(aiounittest.AsyncTestCase):
             keypad_lock_activity.operator_thumbnail_url
             == "https://d33mytkkohwnk6.cloudfront.net/app/ActivityFeedIcons/pin_lock@3x.png"
         )
+
+
+def test_compact_activity_matches_full_activity() -> None:
+    fixtures = [
+        "get_house_activities.json",
+        "auto_lock_activity.json",
+        "doorbell_motion_activity.json",
+        "door_open_activity.json",
+        "pin_unlock_activity.json",
+        "remote_lock_activity_v4.json",
+    ]
+    for fixture in fixtures:
+        data = json.loads(load_fixture(fixture))
+        full_activities = _process_activity_json(data if type(data) is list else [data])
+        compact_activities = _process_activity_json(
+            data if type(data) is list else [data], compact=True
+        )
+        assert len(full_activities) == len(compact_activities)
+        for full, compact in zip(full_activities, compact_activities, strict=True):
+            for attr in (
+                "action",
+                "activity_id",
+                "activity_start_time",
+                "activity_type",
+                "device_id",
+                "house_id",
+                "source",
+            ):
+                assert getattr(compact, attr) == getattr(full, attr), (fixture, attr)
+            rebuilt = compact.to_activity()
+            assert type(rebuilt) is type(full)
+            assert rebuilt.activity_type == full.activity_type
+
+
+def test_compact_activity_without_data() -> None:
+    data = json.loads(load_fixture("pin_unlock_activity.json"))
+    compact = CompactActivity(SOURCE_LOG, data, keep_data=False)
+    assert compact.activity_type is ActivityType.LOCK_OPERATION
+    assert not hasattr(compact, "__dict__")
+    with pytest.raises(ValueError):
+        compact.to_activity()
+
+
+def test_compact_activity_memory() -> None:
+    """Compare the memory used by both modes for a scaled up catch-up fetch."""
+    activities = json.loads(load_fixture("get_house_activities.json"))
+    data = []
+    for offset in range(250):
+        for activity in activities:
+            activity = copy.deepcopy(activity)
+            activity["dateTime"] += offset
+            data.append(activity)
+
+    def _traced_size(compact: bool) -> int:
+        tracemalloc.start()
+        try:
+            processed = _process_activity_json(data, compact=compact)
+            for activity in processed:
+                # The fields the activity stream uses to order activities
+                _ = (
+                    activity.device_id,
+                    activity.activity_type,
+                    activity.activity_start_time,
+                )
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    full_size = _traced_size(False)
+    compact_size = _traced_size(True)
+    assert compact_size * 2 < full_size
+
+
+def test_activity_cursor_drops_seen_activities() -> None:
+    activities = json.loads(load_fixture("get_house_activities.json"))
+    cursor = ActivityCursor()
+
+    assert len(_process_activity_json(activities, cursor=cursor)) == 10
+    cursor.commit()
+    assert cursor.date_time == 545454
+    assert cursor.activity_ids == {"activityId"}
+    assert _process_activity_json(activities, cursor=cursor) == []
+
+    newer = copy.deepcopy(activities[0])
+    newer["dateTime"] = 545454
+    newer["entities"]["activity"] = "sameTimeActivity"
+    newest = copy.deepcopy(activities[0])
+    newest["dateTime"] = 600000
+    newest["entities"]["activity"] = "newestActivity"
+    processed = _process_activity_json([newest, newer, *activities], cursor=cursor)
+    assert [activity.activity_id for activity in processed] == [
+        "newestActivity",
+        "sameTimeActivity",
+    ]
+    # The cursor does not move until the fetch is committed
+    assert cursor.date_time == 545454
+    cursor.commit()
+    assert cursor.date_time == 600000
+    assert cursor.activity_ids == {"newestActivity"}
+
+
+def test_activity_cursor_uncommitted_fetch_is_not_dropped() -> None:
+    activities = json.loads(load_fixture("get_house_activities.json"))
+    cursor = ActivityCursor()
+    _process_activity_json(activities, cursor=cursor)
+    # The previous fetch failed before it was committed
+    assert len(_process_activity_json(activities, compact=True, cursor=cursor)) == 10
@@ -1,3 +1,5 @@
+import asyncio
+import json
 import os
 from datetime import datetime
 from unittest import mock
@@ -13,9 +15,12 @@ from dateutil.tz import tzlocal, tzutc
 from yarl import URL
 
 import yalexs.activity
-from yalexs import api_async
+from yalexs import api_async, api_common
 from yalexs.api_async import ApiAsync, _raise_response_exceptions
 from yalexs.api_common import (
+    API_ENDPOINT_CLASS_AUTH,
+    API_ENDPOINT_CLASS_OPERATE,
+    API_ENDPOINT_CLASS_READ,
     API_GET_DOORBELL_URL,
     API_GET_DOORBELLS_URL,
     API_GET_HOUSE_ACTIVITIES_URL,
@@ -24,6 +29,7 @@ from yalexs.api_common import (
     API_GET_LOCK_URL,
     API_GET_LOCKS_URL,
     API_GET_PINS_URL,
+    API_GET_SESSION_URL,
     API_GET_USER_URL,
     API_LOCK_ASYNC_URL,
     API_LOCK_URL,
@@ -35,11 +41,23 @@ from yalexs.api_common import (
     API_VALIDATE_VERIFICATION_CODE_URLS,
     HYPER_BRIDGE_PARAM,
     ApiCommon,
+    _api_headers,
+    api_auth_headers,
 )
 from yalexs.bridge import BridgeDetail, BridgeStatus, BridgeStatusDetail
+from yalexs.cache import TTLCache
+from yalexs.circuit_breaker import CircuitBreaker, CircuitState
 from yalexs.const import DEFAULT_BRAND, Brand
-from yalexs.exceptions import AugustApiAIOHTTPError, ContentTokenExpired
+from yalexs.exceptions import (
+    AugustApiAIOHTTPError,
+    CannotConnect,
+    ContentTokenExpired,
+    RateLimited,
+)
+from yalexs.fair_limiter import FairLimiter
 from yalexs.lock import LockDoorStatus, LockStatus
+from yalexs.retry import RetryPolicy
+from yalexs.token_bucket import DEFAULT_BUCKET_LIMITS, BucketLimit, TokenBucketLimiter
 
 ACCESS_TOKEN = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9"
 
@@ -1301,10 +1319,9 @@ async def test_retry_502_429(status_code: int, mock_aioresponse: aioresponses) -
             callback=response_callback,
         )
 
-    api = ApiAsync(ClientSession())
+    api = ApiAsync(ClientSession(), retry_policy=RetryPolicy(attempts=2))
     with (
         patch("yalexs.api_async.API_EXCEPTION_RETRY_TIME", 0),
-        patch("yalexs.api_async.API_RETRY_ATTEMPTS", 2),
         patch("yalexs.api_async.asyncio.sleep"),
     ):
         await api.async_validate_verification_code(
@@ -1312,3 +1329,423 @@ async def test_retry_502_429(status_code: int, mock_aioresponse: aioresponses) -
         )
     assert last_args["json"] == {"code": "123456", "email": "emailaddress"}
     assert attempt == 2
+
+
+@pytest.mark.asyncio
+async def test_coalesce_concurrent_identical_requests(
+    mock_aioresponse: aioresponses,
+) -> None:
+    lock_url = ApiCommon(DEFAULT_BRAND).get_brand_url(
+        API_GET_LOCK_URL.format(lock_id="ABC")
+    )
+    mock_aioresponse.get(lock_url, body=load_fixture("get_lock.online.json"))
+
+    api = ApiAsync(ClientSession(), coalesce_requests=True)
+    first, second = await asyncio.gather(
+        api.async_get_lock_detail(ACCESS_TOKEN, "ABC"),
+        api.async_get_lock_detail(ACCESS_TOKEN, "ABC"),
+    )
+    assert first.device_id == second.device_id
+    assert len(mock_aioresponse.requests[("get", URL(lock_url))]) == 1
+    assert not api._inflight_requests
+
+    # Once the request is finished the next one goes to the api again
+    mock_aioresponse.get(lock_url, body=load_fixture("get_lock.online.json"))
+    await api.async_get_lock_detail(ACCESS_TOKEN, "ABC")
+    assert len(mock_aioresponse.requests[("get", URL(lock_url))]) == 2
+
+
+@pytest.mark.asyncio
+async def test_coalesce_does_not_share_different_tokens(
+    mock_aioresponse: aioresponses,
+) -> None:
+    lock_url = ApiCommon(DEFAULT_BRAND).get_brand_url(
+        API_GET_LOCK_URL.format(lock_id="ABC")
+    )
+    mock_aioresponse.get(
+        lock_url, body=load_fixture("get_lock.online.json"), repeat=True
+    )
+
+    api = ApiAsync(ClientSession(), coalesce_requests=True)
+    await asyncio.gather(
+        api.async_get_lock_detail("token1", "ABC"),
+        api.async_get_lock_detail("token2", "ABC"),
+    )
+    assert len(mock_aioresponse.requests[("get", URL(lock_url))]) == 2
+
+
+@pytest.mark.asyncio
+async def test_response_cache_serves_read_endpoints(
+    mock_aioresponse: aioresponses,
+) -> None:
+    locks_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_LOCKS_URL)
+    lock_url = ApiCommon(DEFAULT_BRAND).get_brand_url(
+        API_LOCK_URL.format(lock_id="A6697750D607098BAE8D6BAA11EF8063")
+    )
+    mock_aioresponse.get(locks_url, body=load_fixture("get_locks.json"), repeat=True)
+    mock_aioresponse.put(lock_url, body=load_fixture("lock.json"))
+
+    api = ApiAsync(ClientSession(), response_cache=TTLCache())
+    first = await api.async_get_operable_locks(ACCESS_TOKEN)
+    second = await api.async_get_operable_locks(ACCESS_TOKEN)
+    assert [lock.device_id for lock in first] == [lock.device_id for lock in second]
+    assert len(mock_aioresponse.requests[("get", URL(locks_url))]) == 1
+
+    # Different tokens do not share cached responses
+    await api.async_get_locks("other")
+    assert len(mock_aioresponse.requests[("get", URL(locks_url))]) == 2
+
+    # Operating a lock invalidates the responses that can change
+    await api.async_lock(ACCESS_TOKEN, "A6697750D607098BAE8D6BAA11EF8063")
+    await api.async_get_locks(ACCESS_TOKEN)
+    assert len(mock_aioresponse.requests[("get", URL(locks_url))]) == 3
+
+
+@pytest.mark.asyncio
+async def test_response_cache_hits_are_not_shared(
+    mock_aioresponse: aioresponses,
+) -> None:
+    locks_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_LOCKS_URL)
+    mock_aioresponse.get(locks_url, body=load_fixture("get_locks.json"))
+
+    api = ApiAsync(ClientSession(), response_cache=TTLCache())
+    first = await api._async_get_json(api._build_get_locks_request(ACCESS_TOKEN))
+    first.clear()
+    second = await api._async_get_json(api._build_get_locks_request(ACCESS_TOKEN))
+    assert second
+    second.clear()
+    # Changing a returned response does not change the cached one
+    assert await api._async_get_json(api._build_get_locks_request(ACCESS_TOKEN))
+    assert len(mock_aioresponse.requests[("get", URL(locks_url))]) == 1
+
+
+@pytest.mark.asyncio
+async def test_conditional_requests_for_lock_detail(
+    mock_aioresponse: aioresponses,
+) -> None:
+    lock_url = ApiCommon(DEFAULT_BRAND).get_brand_url(
+        API_GET_LOCK_URL.format(lock_id="ABC")
+    )
+    body = load_fixture("get_lock.online.json")
+    mock_aioresponse.get(lock_url, body=body, headers={"ETag": 'W/"1"'})
+    mock_aioresponse.get(lock_url, status=304)
+
+    api = ApiAsync(ClientSession(), conditional_requests=True)
+    first = await api.async_get_lock_detail(ACCESS_TOKEN, "ABC")
+    second = await api.async_get_lock_detail(ACCESS_TOKEN, "ABC")
+
+    # The unmodified detail is reused instead of downloading
+    # and parsing the body again
+    assert second is first
+    requests = mock_aioresponse.requests[("get", URL(lock_url))]
+    assert "If-None-Match" not in requests[0].kwargs["headers"]
+    assert requests[1].kwargs["headers"]["If-None-Match"] == 'W/"1"'
+    assert requests[1].kwargs["headers"]["x-august-access-token"] == ACCESS_TOKEN
+
+    # A modified detail replaces the previous one
+    mock_aioresponse.get(lock_url, body=body, headers={"ETag": 'W/"2"'})
+    third = await api.async_get_lock_detail(ACCESS_TOKEN, "ABC")
+    assert third is not first
+    assert third.device_id == first.device_id
+
+
+@pytest.mark.asyncio
+async def test_retry_honors_retry_after(mock_aioresponse: aioresponses) -> None:
+    locks_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_LOCKS_URL)
+    mock_aioresponse.get(locks_url, status=429, headers={"Retry-After": "7"})
+    mock_aioresponse.get(locks_url, status=429)
+    mock_aioresponse.get(locks_url, body=load_fixture("get_locks.json"))
+
+    api = ApiAsync(ClientSession(), retry_policy=RetryPolicy(base_delay=1))
+    with patch("yalexs.api_async.asyncio.sleep") as mock_sleep:
+        locks = await api.async_get_locks(ACCESS_TOKEN)
+
+    assert len(locks) == 2
+    first_delay, second_delay = (call.args[0] for call in mock_sleep.call_args_list)
+    assert 7 <= first_delay <= 8
+    assert 0 <= second_delay <= 2
+
+
+@pytest.mark.asyncio
+async def test_retry_stops_at_deadline(mock_aioresponse: aioresponses) -> None:
+    locks_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_LOCKS_URL)
+    mock_aioresponse.get(
+        locks_url, status=429, headers={"Retry-After": "120"}, repeat=True
+    )
+
+    api = ApiAsync(ClientSession())
+    with (
+        patch("yalexs.api_async.asyncio.sleep") as mock_sleep,
+        pytest.raises(AugustApiAIOHTTPError),
+    ):
+        await api.async_get_locks(ACCESS_TOKEN)
+
+    # Waiting 120s would run past the default deadline
+    assert mock_sleep.call_count == 0
+    assert len(mock_aioresponse.requests[("get", URL(locks_url))]) == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_policy_per_endpoint(mock_aioresponse: aioresponses) -> None:
+    locks_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_LOCKS_URL)
+    mock_aioresponse.get(locks_url, status=502, repeat=True)
+
+    api = ApiAsync(
+        ClientSession(), retry_policies={API_GET_LOCKS_URL: RetryPolicy(attempts=3)}
+    )
+    with (
+        patch("yalexs.api_async.asyncio.sleep"),
+        pytest.raises(AugustApiAIOHTTPError),
+    ):
+        await api.async_get_locks(ACCESS_TOKEN)
+
+    assert len(mock_aioresponse.requests[("get", URL(locks_url))]) == 3
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast(mock_aioresponse: aioresponses) -> None:
+    locks_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_LOCKS_URL)
+    lock_url = ApiCommon(DEFAULT_BRAND).get_brand_url(
+        API_GET_LOCK_URL.format(lock_id="ABC")
+    )
+    mock_aioresponse.get(locks_url, status=503, repeat=True)
+    mock_aioresponse.get(lock_url, status=422, repeat=True)
+
+    breaker = CircuitBreaker("test", failure_threshold=2)
+    api = ApiAsync(
+        ClientSession(),
+        retry_policy=RetryPolicy(attempts=1),
+        circuit_breaker=breaker,
+    )
+    # Errors for a specific device do not count against the api
+    for _ in range(3):
+        with pytest.raises(AugustApiAIOHTTPError):
+            await api.async_get_lock_detail(ACCESS_TOKEN, "ABC")
+    assert breaker.state is CircuitState.CLOSED
+
+    for _ in range(2):
+        with pytest.raises(AugustApiAIOHTTPError):
+            await api.async_get_locks(ACCESS_TOKEN)
+    assert api.circuit_breaker.state is CircuitState.OPEN
+
+    with pytest.raises(CannotConnect):
+        await api.async_get_locks(ACCESS_TOKEN)
+    assert len(mock_aioresponse.requests[("get", URL(locks_url))]) == 2
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_ignores_rate_limits(
+    mock_aioresponse: aioresponses,
+) -> None:
+    locks_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_LOCKS_URL)
+    mock_aioresponse.get(locks_url, status=429, repeat=True)
+
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    api = ApiAsync(
+        ClientSession(),
+        retry_policy=RetryPolicy(attempts=1),
+        circuit_breaker=breaker,
+    )
+    # Rate limits are per access token and must not lock out other accounts
+    for _ in range(3):
+        with pytest.raises(AugustApiAIOHTTPError):
+            await api.async_get_locks(ACCESS_TOKEN)
+    assert breaker.state is CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_header_templates_invalidated_on_refresh(
+    mock_aioresponse: aioresponses,
+) -> None:
+    mock_aioresponse.get(
+        ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_HOUSES_URL),
+        body="{}",
+        headers={"x-august-access-token": "new"},
+    )
+    headers = _api_headers("old", DEFAULT_BRAND)
+    assert headers["x-august-access-token"] == "old"
+    assert headers["Accept-Version"] == "0.0.1"
+    # Callers get a copy they are free to change
+    headers["x-august-access-token"] = "changed"
+    assert _api_headers("old", DEFAULT_BRAND)["x-august-access-token"] == "old"
+    assert api_auth_headers("old", DEFAULT_BRAND) == {
+        "x-august-access-token": "old",
+        "x-august-api-key": "d9984f29-07a6-816e-e1c9-44ec9d1be431",
+        "x-august-branding": "august",
+    }
+    assert (DEFAULT_BRAND, "old") in api_common._API_HEADER_TEMPLATES
+
+    api = ApiAsync(ClientSession())
+    assert await api.async_refresh_access_token("old") == "new"
+    assert (DEFAULT_BRAND, "old") not in api_common._API_HEADER_TEMPLATES
+    assert (DEFAULT_BRAND, "old") not in api_common._AUTH_HEADER_TEMPLATES
+
+
+def test_header_templates_evict_least_recently_used() -> None:
+    with (
+        patch.object(api_common, "_API_HEADER_TEMPLATES", TTLCache(2)),
+        patch.object(api_common, "_AUTH_HEADER_TEMPLATES", TTLCache(2)),
+    ):
+        _api_headers("token1", DEFAULT_BRAND)
+        _api_headers("token2", DEFAULT_BRAND)
+        # Using token1 again keeps it when token3 is added
+        _api_headers("token1", DEFAULT_BRAND)
+        _api_headers("token3", DEFAULT_BRAND)
+        templates = api_common._API_HEADER_TEMPLATES
+        assert (DEFAULT_BRAND, "token1") in templates
+        assert (DEFAULT_BRAND, "token2") not in templates
+        assert (DEFAULT_BRAND, "token3") in templates
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("coalesce_requests", [False, True])
+async def test_stream_house_activities(
+    mock_aioresponse: aioresponses, coalesce_requests: bool
+) -> None:
+    url = (
+        ApiCommon(DEFAULT_BRAND)
+        .get_brand_url(API_GET_HOUSE_ACTIVITIES_URL)
+        .format(house_id="1234")
+    )
+    mock_aioresponse.get(
+        f"{url}?limit=2500",
+        body='{"events": ' + load_fixture("get_house_activities.json") + "}",
+    )
+
+    api = ApiAsync(ClientSession(), coalesce_requests=coalesce_requests)
+    with patch("yalexs.api_async.ACTIVITY_STREAM_CHUNK_SIZE", 512):
+        batches = [
+            batch
+            async for batch in api.async_stream_house_activities(
+                ACCESS_TOKEN, "1234", limit=2500
+            )
+        ]
+
+    activities = [activity for batch in batches for activity in batch]
+    assert len(activities) == 10
+    if not coalesce_requests:
+        assert len(batches) > 1
+    assert isinstance(activities[0], yalexs.activity.LockOperationActivity)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream", [False, True])
+async def test_house_activities_cursor(
+    mock_aioresponse: aioresponses, stream: bool
+) -> None:
+    url = (
+        ApiCommon(DEFAULT_BRAND)
+        .get_brand_url(API_GET_HOUSE_ACTIVITIES_URL)
+        .format(house_id="1234")
+    )
+    events = json.loads(load_fixture("get_house_activities.json"))
+    newest = {**events[0], "dateTime": 600000}
+    newest["entities"] = {**events[0]["entities"], "activity": "newestActivity"}
+    mock_aioresponse.get(f"{url}?limit=10", payload={"events": events})
+    mock_aioresponse.get(f"{url}?limit=10", payload={"events": events})
+    mock_aioresponse.get(f"{url}?limit=10", payload={"events": [newest, *events]})
+
+    api = ApiAsync(ClientSession())
+    cursor = yalexs.activity.ActivityCursor()
+
+    async def _fetch() -> list:
+        if not stream:
+            return await api.async_get_house_activities(
+                ACCESS_TOKEN, "1234", limit=10, cursor=cursor
+            )
+        return [
+            activity
+            async for batch in api.async_stream_house_activities(
+                ACCESS_TOKEN, "1234", limit=10, cursor=cursor
+            )
+            for activity in batch
+        ]
+
+    assert len(await _fetch()) == 10
+    assert await _fetch() == []
+    activities = await _fetch()
+    assert [activity.activity_id for activity in activities] == ["newestActivity"]
+    assert cursor.date_time == 600000
+
+
+@pytest.mark.asyncio
+async def test_request_limiter_slot_released(mock_aioresponse: aioresponses) -> None:
+    locks_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_LOCKS_URL)
+    mock_aioresponse.get(locks_url, body="{}")
+    mock_aioresponse.get(locks_url, status=503)
+
+    limiter = FairLimiter(1)
+    api = ApiAsync(
+        ClientSession(),
+        retry_policy=RetryPolicy(attempts=1),
+        request_limiter=limiter,
+        request_limiter_key="account",
+    )
+    assert await api.async_get_locks(ACCESS_TOKEN) == []
+    assert limiter.in_use == 0
+    with pytest.raises(AugustApiAIOHTTPError):
+        await api.async_get_locks(ACCESS_TOKEN)
+    assert limiter.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limiter_per_endpoint_class(
+    mock_aioresponse: aioresponses,
+) -> None:
+    locks_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_LOCKS_URL)
+    mock_aioresponse.get(locks_url, body="{}", repeat=True)
+
+    limiter = TokenBucketLimiter({API_ENDPOINT_CLASS_READ: BucketLimit(0.001, 1)})
+    api = ApiAsync(
+        ClientSession(),
+        retry_policy=RetryPolicy(attempts=1, deadline=1),
+        token_bucket_limiter=limiter,
+    )
+    await api.async_get_locks(ACCESS_TOKEN)
+    # The next read would have to wait longer than the deadline
+    with pytest.raises(RateLimited):
+        await api.async_get_locks(ACCESS_TOKEN)
+    # Lock operations have a bucket of their own
+    assert limiter.tokens(ACCESS_TOKEN, API_ENDPOINT_CLASS_OPERATE) > 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limiter_logins_per_account(
+    mock_aioresponse: aioresponses,
+) -> None:
+    session_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_GET_SESSION_URL)
+    mock_aioresponse.post(session_url, body="{}", repeat=True)
+
+    limiter = TokenBucketLimiter({API_ENDPOINT_CLASS_AUTH: BucketLimit(0.001, 1)})
+    api = ApiAsync(
+        ClientSession(),
+        retry_policy=RetryPolicy(attempts=1, deadline=1),
+        token_bucket_limiter=limiter,
+    )
+    for idx in range(10):
+        await api.async_get_session("install_id", f"user{idx}@example.com", "pw")
+    with pytest.raises(RateLimited):
+        await api.async_get_session("install_id", "user0@example.com", "pw")
+    assert limiter.tokens("user0@example.com", API_ENDPOINT_CLASS_AUTH) < 1
+    assert limiter.tokens("user9@example.com", API_ENDPOINT_CLASS_AUTH) < 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("hyper_bridge", [True, False])
+async def test_token_bucket_limiter_async_lock_is_operate(
+    mock_aioresponse: aioresponses, hyper_bridge: bool
+) -> None:
+    base_url = ApiCommon(DEFAULT_BRAND).get_brand_url(API_LOCK_ASYNC_URL)
+    if hyper_bridge:
+        base_url = f"{base_url}{HYPER_BRIDGE_PARAM}"
+    mock_aioresponse.put(base_url.format(lock_id="1234"))
+
+    limiter = TokenBucketLimiter()
+    api = ApiAsync(ClientSession(), token_bucket_limiter=limiter)
+    await api.async_lock_async(ACCESS_TOKEN, "1234", hyper_bridge=hyper_bridge)
+    assert limiter.tokens(ACCESS_TOKEN, API_ENDPOINT_CLASS_OPERATE) < (
+        DEFAULT_BUCKET_LIMITS[API_ENDPOINT_CLASS_OPERATE].burst
+    )
+    assert limiter.tokens(ACCESS_TOKEN, API_ENDPOINT_CLASS_READ) == (
+        DEFAULT_BUCKET_LIMITS[API_ENDPOINT_CLASS_READ].burst
+    )
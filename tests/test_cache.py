@@ -0,0 +1,40 @@
+from freezegun.api import FrozenDateTimeFactory
+
+from yalexs.cache import TTLCache
+
+
+def test_ttl_cache_expires(freezer: FrozenDateTimeFactory) -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+    assert cache.get("a") == 1
+    assert "b" in cache
+
+    freezer.tick(11)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    freezer.tick(20)
+    assert "b" not in cache
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_invalidate() -> None:
+    cache: TTLCache[tuple[str, str], int] = TTLCache()
+    cache.set(("url1", "token"), 1)
+    cache.set(("url2", "token"), 2)
+    cache.invalidate(lambda key: key[0] == "url1")
+    assert ("url1", "token") not in cache
+    assert cache.pop(("url2", "token")) == 2
+    assert len(cache) == 0
@@ -0,0 +1,53 @@
+import pytest
+from freezegun.api import FrozenDateTimeFactory
+
+from yalexs.circuit_breaker import CircuitBreaker, CircuitState, get_circuit_breaker
+from yalexs.exceptions import CannotConnect
+
+
+def test_circuit_breaker_opens_and_recovers(freezer: FrozenDateTimeFactory) -> None:
+    breaker = CircuitBreaker("https://api", failure_threshold=2, reset_timeout=30)
+    assert breaker.state is CircuitState.CLOSED
+
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.CLOSED
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+
+    with pytest.raises(CannotConnect):
+        breaker.before_request()
+
+    freezer.tick(31)
+    assert breaker.state is CircuitState.HALF_OPEN
+    # Only a single trial request is let through
+    breaker.before_request()
+    with pytest.raises(CannotConnect):
+        breaker.before_request()
+
+    breaker.record_success()
+    assert breaker.state is CircuitState.CLOSED
+    breaker.before_request()
+
+
+def test_circuit_breaker_reopens_after_failed_trial(
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    breaker = CircuitBreaker("https://api", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    freezer.tick(31)
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+
+    freezer.tick(31)
+    breaker.before_request()
+    # A cancelled trial lets the next request try again
+    breaker.record_cancelled()
+    breaker.before_request()
+
+
+def test_circuit_breakers_are_shared_per_base_url() -> None:
+    assert get_circuit_breaker("https://a") is get_circuit_breaker("https://a")
+    assert get_circuit_breaker("https://a") is not get_circuit_breaker("https://b")
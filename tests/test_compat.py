@@ -0,0 +1,43 @@
+import importlib
+import json
+import sys
+from unittest.mock import patch
+
+from yalexs import _compat
+from yalexs.authenticator_common import (
+    Authentication,
+    AuthenticationState,
+    from_authentication_json,
+    to_authentication_json,
+)
+
+
+def test_json_round_trip() -> None:
+    data = {"a": [1, 2.5, None, True], "b": "ü"}
+    assert _compat.json_loads(_compat.json_dumps(data)) == data
+    assert _compat.json_loads(json.dumps(data).encode()) == data
+
+
+def test_json_falls_back_to_stdlib() -> None:
+    try:
+        with patch.dict(sys.modules, {"orjson": None}):
+            compat = importlib.reload(_compat)
+        assert compat.json_loads is json.loads
+        assert compat.json_dumps is json.dumps
+    finally:
+        importlib.reload(_compat)
+
+
+def test_authentication_json_round_trip() -> None:
+    authentication = Authentication(
+        AuthenticationState.AUTHENTICATED,
+        install_id="install",
+        access_token="token",
+        access_token_expires="2030-01-01T00:00:00.000Z",
+    )
+    restored = from_authentication_json(
+        _compat.json_loads(to_authentication_json(authentication))
+    )
+    assert restored.access_token == "token"
+    assert restored.state is AuthenticationState.AUTHENTICATED
+    assert to_authentication_json(None) == "{}"
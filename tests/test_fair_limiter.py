@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from yalexs.fair_limiter import FairLimiter
+
+
+@pytest.mark.asyncio
+async def test_fair_limiter_takes_turns_between_tenants() -> None:
+    limiter = FairLimiter(1)
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def _request(tenant: str) -> None:
+        async with limiter.slot(tenant):
+            order.append(tenant)
+            await release.wait()
+
+    # The large account queues its requests first
+    tasks = [asyncio.create_task(_request("large")) for _ in range(5)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(_request("small")))
+    await asyncio.sleep(0)
+    assert limiter.in_use == 1
+    assert limiter.waiting == 5
+
+    release.set()
+    await asyncio.gather(*tasks)
+    # The small account only waits for one request of the large one
+    assert order == ["large", "large", "small", "large", "large", "large"]
+    assert limiter.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_fair_limiter_cancelled_waiter() -> None:
+    limiter = FairLimiter(1)
+    await limiter.acquire("a")
+    waiter = asyncio.create_task(limiter.acquire("b"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.waiting == 0
+
+    limiter.release()
+    assert limiter.in_use == 0
+    await limiter.acquire("c")
+    assert limiter.in_use == 1
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+import pytest
+
+# Only imported once they are needed
+LAZY_MODULES = {"dateutil", "engineio", "jwt", "pubnub", "requests", "socketio"}
+
+
+def _imported_modules(statement: str) -> set[str]:
+    """Return the modules that python -X importtime reports as imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return {
+        line.rsplit("|", 1)[1].strip()
+        for line in result.stderr.splitlines()
+        # Skip the header line
+        if line.startswith("import time:") and "self [us]" not in line
+    }
+
+
+@pytest.mark.parametrize(
+    "module",
+    ["yalexs.manager.data", "yalexs.api_async", "yalexs.authenticator_async"],
+)
+def test_heavy_dependencies_are_imported_lazily(module: str) -> None:
+    imported = _imported_modules(f"import {module}")
+    assert module in imported
+    assert not LAZY_MODULES.intersection(name.split(".")[0] for name in imported)
@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+from yalexs.json_stream import JSONArrayStreamDecoder
+
+
+def load_fixture(filename):
+    """Load a fixture."""
+    path = os.path.join(os.path.dirname(__file__), "fixtures", filename)
+    with open(path) as fptr:
+        return fptr.read()
+
+
+def _decode(data: bytes, chunk_size: int) -> list:
+    decoder = JSONArrayStreamDecoder("events")
+    items = []
+    for idx in range(0, len(data), chunk_size):
+        items.extend(decoder.feed(data[idx : idx + chunk_size]))
+    items.extend(decoder.feed(b"", final=True))
+    return items
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 1 << 20])
+def test_decode_array_items(chunk_size: int) -> None:
+    activities = json.loads(load_fixture("get_house_activities.json"))
+    documents = [
+        json.dumps(activities),
+        json.dumps({"more": [1, {"x": "]"}], "events": activities, "after": 12}),
+        json.dumps([1, 2.5, -3e10, "snow ☃", None, True, [3]], ensure_ascii=False),
+        ' { "events" : [ ] } ',
+        "[]",
+    ]
+    for document in documents:
+        expected = json.loads(document)
+        if isinstance(expected, dict):
+            expected = expected["events"]
+        assert _decode(document.encode(), chunk_size) == expected
+
+
+def test_items_are_returned_as_they_complete() -> None:
+    decoder = JSONArrayStreamDecoder("events")
+    assert decoder.feed(b'{"events": [{"a": 1}, {"b"') == [{"a": 1}]
+    assert decoder.feed(b": 2}, 1") == [{"b": 2}]
+    assert decoder.feed(b"0]}", final=True) == [10]
+
+
+@pytest.mark.parametrize("document", ["[1,2", "[1 2]", '{"events": [1]', "[1],", ""])
+def test_decode_invalid(document: str) -> None:
+    with pytest.raises(ValueError):
+        _decode(document.encode(), 1)
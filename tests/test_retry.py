@@ -0,0 +1,40 @@
+from unittest.mock import patch
+
+from yalexs.retry import RetryPolicy, parse_retry_after
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("nonsense") is None
+    assert parse_retry_after("5") == 5
+    assert parse_retry_after("-5") == 0
+    now = 784111777.0  # Sun, 06 Nov 1994 08:49:37 GMT
+    assert parse_retry_after("Sun, 06 Nov 1994 08:49:47 GMT", now) == 10
+    assert parse_retry_after("Sun, 06 Nov 1994 08:49:27 GMT", now) == 0
+
+
+def test_backoff_is_jittered_and_capped() -> None:
+    policy = RetryPolicy(base_delay=1, max_delay=10)
+    with patch("yalexs.retry.random.uniform", side_effect=lambda lo, hi: hi):
+        assert [policy.backoff(attempt) for attempt in range(1, 7)] == [
+            1,
+            2,
+            4,
+            8,
+            10,
+            10,
+        ]
+    with patch("yalexs.retry.random.uniform", side_effect=lambda lo, hi: lo):
+        assert policy.backoff(5) == 0
+
+
+def test_delay_honors_retry_after() -> None:
+    policy = RetryPolicy(base_delay=1, max_delay=10)
+    for _ in range(100):
+        assert 30 <= policy.delay(1, 30) <= 31
+
+
+def test_deadline() -> None:
+    assert RetryPolicy(deadline=None).deadline_at(100) is None
+    assert RetryPolicy(deadline=5).deadline_at(100) == 105
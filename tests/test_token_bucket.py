@@ -0,0 +1,63 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from yalexs.api_common import API_ENDPOINT_CLASS_OPERATE, API_ENDPOINT_CLASS_READ
+from yalexs.exceptions import RateLimited
+from yalexs.token_bucket import BucketLimit, TokenBucketLimiter
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_a_token() -> None:
+    limiter = TokenBucketLimiter({API_ENDPOINT_CLASS_READ: BucketLimit(100, 2)})
+    # Freeze the clock of the limiter so only the requested waits count
+    with (
+        patch("yalexs.token_bucket.time.monotonic", return_value=1000.0),
+        patch("yalexs.token_bucket.asyncio.sleep") as mock_sleep,
+    ):
+        await limiter.acquire("token", API_ENDPOINT_CLASS_READ)
+        await limiter.acquire("token", API_ENDPOINT_CLASS_READ)
+        # Other tokens and endpoint classes have their own buckets
+        await limiter.acquire("other", API_ENDPOINT_CLASS_READ)
+        await limiter.acquire("token", API_ENDPOINT_CLASS_OPERATE)
+        mock_sleep.assert_not_called()
+
+        await limiter.acquire("token", API_ENDPOINT_CLASS_READ)
+        mock_sleep.assert_awaited_once_with(pytest.approx(0.01))
+        # The next request waits behind the one already waiting
+        await limiter.acquire("token", API_ENDPOINT_CLASS_READ)
+        assert mock_sleep.await_args.args[0] == pytest.approx(0.02)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_timeout() -> None:
+    limiter = TokenBucketLimiter({API_ENDPOINT_CLASS_READ: BucketLimit(1, 1)})
+    await limiter.acquire("token", API_ENDPOINT_CLASS_READ, timeout=0)
+    with pytest.raises(RateLimited) as exc:
+        await limiter.acquire("token", API_ENDPOINT_CLASS_READ, timeout=0.5)
+    assert exc.value.next_allowed == pytest.approx(time.monotonic() + 1, abs=0.1)
+    # The failed request did not take a token
+    assert limiter.tokens("token", API_ENDPOINT_CLASS_READ) == pytest.approx(0, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_cancelled_waiter_returns_token() -> None:
+    limiter = TokenBucketLimiter({API_ENDPOINT_CLASS_READ: BucketLimit(1, 1)})
+    await limiter.acquire("token", API_ENDPOINT_CLASS_READ)
+    waiter = asyncio.create_task(limiter.acquire("token", API_ENDPOINT_CLASS_READ))
+    await asyncio.sleep(0)
+    assert limiter.tokens("token", API_ENDPOINT_CLASS_READ) < -0.9
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.tokens("token", API_ENDPOINT_CLASS_READ) == pytest.approx(0, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_unlimited_class() -> None:
+    limiter = TokenBucketLimiter()
+    for _ in range(100):
+        await limiter.acquire("token", "unknown", timeout=0)
+    assert limiter.tokens("token", "unknown") == float("inf")
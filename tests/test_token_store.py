@@ -0,0 +1,128 @@
+import asyncio
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from yalexs.authenticator_common import AuthenticatorCommon
+from yalexs.token_store import FileBackend, SQLiteBackend, TokenStore
+from yalexs.util import write_file_atomic
+
+
+def test_write_file_atomic(tmp_path: Path) -> None:
+    path = tmp_path / "token"
+    path.write_bytes(b"old")
+    with patch("yalexs.util.os.replace", side_effect=OSError), pytest.raises(OSError):
+        write_file_atomic(path, b"new")
+    # The old file is left alone and the temporary file is cleaned up
+    assert path.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [path]
+    write_file_atomic(path, b"new")
+    assert path.read_bytes() == b"new"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.asyncio
+async def test_file_backend_round_trip(tmp_path: Path) -> None:
+    key = str(tmp_path / "token")
+    store = TokenStore(FileBackend(), write_delay=0)
+    assert await store.async_get(key) is None
+    store.async_set(key, "abc")
+    await store.async_flush()
+    assert Path(key).read_text() == "abc"
+    assert await TokenStore(FileBackend()).async_get(key) == "abc"
+    store.async_set(key, None)
+    await store.async_flush()
+    assert not Path(key).exists()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_round_trip(tmp_path: Path) -> None:
+    path = tmp_path / "tokens.db"
+    store = TokenStore(SQLiteBackend(path))
+    store.async_set("one", "1")
+    store.async_set("two", "2")
+    await store.async_flush()
+    other = TokenStore(SQLiteBackend(path))
+    assert await other.async_get("one") == "1"
+    assert await other.async_get("two") == "2"
+    assert await other.async_get("three") is None
+    store.async_set("one", None)
+    await store.async_flush()
+    assert await TokenStore(SQLiteBackend(path)).async_get("one") is None
+
+
+@pytest.mark.asyncio
+async def test_writes_are_coalesced(tmp_path: Path) -> None:
+    backend = FileBackend()
+    store = TokenStore(backend, write_delay=0.01)
+    keys = [str(tmp_path / f"token{idx}") for idx in range(3)]
+    with patch.object(backend, "write", wraps=backend.write) as mock_write:
+        for value in ("a", "b", "c"):
+            for key in keys:
+                store.async_set(key, value)
+        await asyncio.sleep(0.05)
+    mock_write.assert_called_once_with(dict.fromkeys(keys, "c"))
+    for key in keys:
+        assert Path(key).read_text() == "c"
+
+
+@pytest.mark.asyncio
+async def test_reads_are_served_from_memory(tmp_path: Path) -> None:
+    backend = FileBackend()
+    store = TokenStore(backend)
+    key = str(tmp_path / "token")
+    Path(key).write_text("abc")
+    with patch.object(backend, "read", wraps=backend.read) as mock_read:
+        assert await store.async_get(key) == "abc"
+        assert await store.async_get(key) == "abc"
+        store.async_set(key, "def")
+        assert await store.async_get(key) == "def"
+    assert mock_read.call_count == 1
+    # Not written to disk until flushed
+    assert Path(key).read_text() == "abc"
+    await store.async_flush()
+    assert Path(key).read_text() == "def"
+
+
+@pytest.mark.asyncio
+async def test_failed_write_is_retried(tmp_path: Path) -> None:
+    backend = FileBackend()
+    store = TokenStore(backend)
+    key = str(tmp_path / "token")
+    store.async_set(key, "abc")
+    with patch.object(backend, "write", side_effect=OSError), pytest.raises(OSError):
+        await store.async_flush()
+    assert not Path(key).exists()
+    await store.async_flush()
+    assert Path(key).read_text() == "abc"
+
+
+@pytest.mark.asyncio
+async def test_misses_are_not_cached(tmp_path: Path) -> None:
+    key = str(tmp_path / "token")
+    writer = TokenStore(FileBackend(), write_delay=0)
+    reader = TokenStore(FileBackend())
+    assert await reader.async_get(key) is None
+    writer.async_set(key, "abc")
+    await writer.async_flush()
+    assert await reader.async_get(key) == "abc"
+    writer.async_set(key, None)
+    await writer.async_flush()
+    assert await writer.async_get(key) is None
+    Path(key).write_text("def")
+    assert await writer.async_get(key) == "def"
+
+
+@pytest.mark.asyncio
+async def test_default_store_is_shared(tmp_path: Path) -> None:
+    key = str(tmp_path / "token")
+    first = AuthenticatorCommon(MagicMock(), "email", "user", "pass")
+    second = AuthenticatorCommon(MagicMock(), "email", "user", "pass")
+    assert first._token_store is second._token_store
+    first._token_store.async_set(key, "abc")
+    # Seen by the other authenticator before it is written to disk
+    assert not Path(key).exists()
+    assert await second._token_store.async_get(key) == "abc"
+    await first._token_store.async_flush()
+    assert Path(key).read_text() == "abc"
@@ -1,8 +1,30 @@
 """Compat for external lib versions."""
 
+from __future__ import annotations
+
+import json
+from typing import Any
+
 try:
     from propcache.api import cached_property
 except ImportError:
     from propcache import cached_property
 
-__all__ = ("cached_property",)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    json_loads = orjson.loads
+
+    def json_dumps(obj: Any) -> str:
+        """Serialize an object to a JSON string."""
+        return orjson.dumps(obj).decode()
+
+else:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+__all__ = ("cached_property", "json_dumps", "json_loads")
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections.abc import Iterable
 from datetime import datetime
 from enum import Enum
 from typing import Any, Union
@@ -256,6 +257,47 @@ class ActivityType(Enum):
     DOORBELL_IMAGE_CAPTURE = "doorbell_image_capture"
 
 
+def _activity_start_time(data: dict[str, Any]) -> datetime:
+    """Return the start time of an activity from its data."""
+    return epoch_to_datetime(data.get("dateTime", data.get("timestamp")))
+
+
+def _doorbell_action_start_time(data: dict[str, Any]) -> datetime:
+    """Return the start time of a doorbell action activity from its data."""
+    if started := data.get("info", {}).get("started"):
+        return epoch_to_datetime(started)
+    return _activity_start_time(data)
+
+
+def _calling_user(data: dict[str, Any]) -> dict[str, Any]:
+    """Return the calling user of an activity from its data."""
+    return data.get("callingUser", data.get("user", {}))
+
+
+def _lock_operated_by(action: str | None, calling_user: dict[str, Any]) -> str | None:
+    """Return the name of who operated a lock or None if it is not known."""
+    first_name: str | None = calling_user.get("FirstName")
+    last_name: str | None = calling_user.get("LastName")
+
+    yale_user = get_user_info(calling_user.get("UserID"))
+    if yale_user and first_name is None and last_name is None:
+        first_name = yale_user.first_name
+        last_name = yale_user.last_name
+
+    # For legacy compatibility, we need to set the first_name and last_name
+    # if its a physical or rf lock operation
+    if (
+        first_name is None
+        and last_name is None
+        and (first_last := ACTIVITY_TO_FIRST_LAST_NAME.get(action))
+    ):
+        first_name, last_name = first_last
+
+    if first_name and last_name:
+        return f"{first_name} {last_name}"
+    return None
+
+
 class Activity:
     """Base class for activities."""
 
@@ -292,6 +334,11 @@ class Activity:
         """Return the source of the activity."""
         return self._source
 
+    @cached_property
+    def raw(self) -> dict[str, Any]:
+        """Return the data the activity was built from."""
+        return self._data
+
     @cached_property
     def activity_type(self) -> ActivityType:
         """Return the type of the activity."""
@@ -310,8 +357,7 @@ class Activity:
     @cached_property
     def activity_start_time(self) -> datetime:
         """Return the start time of the activity."""
-        data = self._data
-        return epoch_to_datetime(data.get("dateTime", data.get("timestamp")))
+        return _activity_start_time(self._data)
 
     @cached_property
     def activity_end_time(self) -> datetime:
@@ -341,7 +387,7 @@ class Activity:
     @cached_property
     def calling_user(self) -> dict[str, Any]:
         """Return the calling user."""
-        return self._data.get("callingUser", self._data.get("user", {}))
+        return _calling_user(self._data)
 
     @cached_property
     def is_status(self) -> bool:
@@ -426,9 +472,7 @@ class DoorbellBaseActionActivity(Activity):
     @cached_property
     def activity_start_time(self):
         """Return the start time of the activity."""
-        if started := self._info.get("started"):
-            return epoch_to_datetime(started)
-        return super().activity_start_time
+        return _doorbell_action_start_time(self._data)
 
     @cached_property
     def activity_end_time(self):
@@ -458,31 +502,10 @@ class LockOperationActivity(Activity):
     def __init__(self, source: str, data: dict[str, Any]) -> None:
         """Initialize lock operation activity."""
         super().__init__(source, data)
-        operated_by: str | None = None
-        calling_user = self.calling_user
-        first_name: str | None = calling_user.get("FirstName")
-        last_name: str | None = calling_user.get("LastName")
-
-        yale_user = self.yale_user
-        if yale_user and first_name is None and last_name is None:
-            first_name = yale_user.first_name
-            last_name = yale_user.last_name
-
-        # For legacy compatibility, we need to set the first_name and last_name
-        # if its a physical or rf lock operation
-        if (
-            first_name is None
-            and last_name is None
-            and (first_last := ACTIVITY_TO_FIRST_LAST_NAME.get(self.action))
-        ):
-            first_name, last_name = first_last
-
-        if first_name and last_name:
-            operated_by = f"{first_name} {last_name}"
+        self._operated_by = _lock_operated_by(self.action, self.calling_user)
+        if self._operated_by:
             self._activity_type = ActivityType.LOCK_OPERATION
 
-        self._operated_by = operated_by
-
     @cached_property
     def _operator_image_urls(self) -> tuple[str | None, str | None]:
         """Return the image URLs of the lock operator."""
@@ -626,3 +649,125 @@ ACTION_TO_CLASS: dict[str, ActivityTypes] = {}
 for activities, klass in ACTIONS_TO_CLASS:
     for activity in activities:
         ACTION_TO_CLASS[activity] = klass
+
+
+class CompactActivity:
+    """An activity with only the fields needed to order activities.
+
+    The fields are extracted up front into slots so many of them
+    can be held without the per instance dict and cached values
+    of a full activity. The raw data is optional; when it is kept
+    the full activity can be built with to_activity.
+    """
+
+    __slots__ = (
+        "_data",
+        "action",
+        "activity_id",
+        "activity_start_time",
+        "activity_type",
+        "device_id",
+        "house_id",
+        "source",
+    )
+
+    def __init__(
+        self, source: str, data: dict[str, Any], keep_data: bool = True
+    ) -> None:
+        """Initialize the compact activity."""
+        action: str = data["action"]
+        klass = ACTION_TO_CLASS[action]
+        entities = data.get("entities", {})
+        self.source = source
+        self.action = action
+        self.device_id: str | None = data.get("deviceID")
+        self.house_id: str | None = entities.get("house")
+        self.activity_id: str | None = entities.get("activity")
+        if issubclass(klass, DoorbellBaseActionActivity):
+            self.activity_start_time = _doorbell_action_start_time(data)
+        else:
+            self.activity_start_time = _activity_start_time(data)
+        if klass is LockOperationActivity and _lock_operated_by(
+            action, _calling_user(data)
+        ):
+            self.activity_type = ActivityType.LOCK_OPERATION
+        else:
+            self.activity_type = klass._activity_type
+        self._data = data if keep_data else None
+
+    def __repr__(self) -> str:
+        """Return the representation."""
+        return (
+            f"<{self.__class__.__name__} action={self.action} "
+            f"activity_type={self.activity_type} "
+            f"activity_start_time={self.activity_start_time} "
+            f"device_id={self.device_id}>"
+        )
+
+    def to_activity(self) -> ActivityTypes:
+        """Build the full activity."""
+        if self._data is None:
+            raise ValueError("The activity data was not kept")
+        return ACTION_TO_CLASS[self.action](self.source, self._data)
+
+
+class ActivityCursor:
+    """The newest activities already fetched for a house.
+
+    The cursor is the latest dateTime that has been fetched along
+    with the ids of the activities at that exact time, so the
+    activities a later fetch returns again can be dropped before
+    they are built. A fetch is filtered against the cursor as it
+    was when the fetch started; the cursor only moves forward once
+    commit is called after the whole fetch has been processed.
+    """
+
+    __slots__ = ("_next_activity_ids", "_next_date_time", "activity_ids", "date_time")
+
+    def __init__(
+        self, date_time: float | None = None, activity_ids: Iterable[str] = ()
+    ) -> None:
+        """Initialize the cursor."""
+        self.date_time = date_time
+        self.activity_ids: frozenset[str] = frozenset(activity_ids)
+        self._next_date_time = date_time
+        self._next_activity_ids = set(self.activity_ids)
+
+    def __repr__(self) -> str:
+        """Return the representation."""
+        return (
+            f"<{self.__class__.__name__} date_time={self.date_time} "
+            f"activity_ids={sorted(self.activity_ids)}>"
+        )
+
+    def filter(self, activities_json: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Return the activities that are newer than the cursor."""
+        date_time = self.date_time
+        activity_ids = self.activity_ids
+        newer: list[dict[str, Any]] = []
+        for activity_json in activities_json:
+            if (
+                activity_time := activity_json.get(
+                    "dateTime", activity_json.get("timestamp")
+                )
+            ) is None:
+                newer.append(activity_json)
+                continue
+            activity_id = activity_json.get("entities", {}).get("activity")
+            if date_time is not None and (
+                activity_time < date_time
+                or (activity_time == date_time and activity_id in activity_ids)
+            ):
+                continue
+            newer.append(activity_json)
+            if self._next_date_time is None or activity_time > self._next_date_time:
+                self._next_date_time = activity_time
+                self._next_activity_ids = set()
+            if activity_time == self._next_date_time and activity_id is not None:
+                self._next_activity_ids.add(activity_id)
+        return newer
+
+    def commit(self) -> None:
+        """Move the cursor past the activities that have been processed."""
+        self.date_time = self._next_date_time
+        self.activity_ids = frozenset(self._next_activity_ids)
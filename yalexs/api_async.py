@@ -4,27 +4,36 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import time
+from collections.abc import AsyncIterator, Hashable
+from functools import partial
 from http import HTTPStatus
-from typing import Any
+from typing import Any, TypeVar
 
 from aiohttp import (
     ClientConnectionError,
+    ClientError,
     ClientOSError,
     ClientResponse,
     ClientResponseError,
     ClientSession,
     ClientSSLError,
     ServerDisconnectedError,
+    hdrs,
 )
 
-from .activity import ActivityTypes
+from ._compat import json_loads
+from .activity import ActivityCursor, ActivityTypes, CompactActivity
 from .alarm import Alarm, AlarmDevice, ArmState
 from .api_common import (
+    API_CACHE_TTLS,
+    API_ENDPOINT_CLASS_READ,
+    API_ENDPOINT_CLASSES,
     API_EXCEPTION_RETRY_TIME,
+    API_GET_LOCKS_URL,
+    API_GET_PINS_URL,
     API_LOCK_ASYNC_URL,
     API_LOCK_URL,
-    API_RETRY_ATTEMPTS,
-    API_RETRY_TIME,
     API_STATUS_ASYNC_URL,
     API_UNLATCH_ASYNC_URL,
     API_UNLATCH_URL,
@@ -40,10 +49,16 @@ from .api_common import (
     _process_alarms_json,
     _process_doorbells_json,
     _process_locks_json,
+    invalidate_header_templates,
 )
+from .backports.tasks import create_eager_task
+from .cache import TTLCache
+from .circuit_breaker import CircuitBreaker
 from .const import DEFAULT_BRAND, HEADER_ACCESS_TOKEN, HEADER_AUGUST_ACCESS_TOKEN
 from .doorbell import Doorbell, DoorbellDetail
-from .exceptions import InvalidAuth, YaleApiError
+from .exceptions import InvalidAuth, RateLimited, YaleApiError
+from .fair_limiter import FairLimiter
+from .json_stream import JSONArrayStreamDecoder
 from .lock import (
     Lock,
     LockDetail,
@@ -53,9 +68,20 @@ from .lock import (
     determine_lock_status,
 )
 from .pin import Pin
+from .retry import DEFAULT_RETRY_POLICY, RetryPolicy, parse_retry_after
+from .token_bucket import TokenBucketLimiter
 
 _LOGGER = logging.getLogger(__name__)
 
+# Size of the chunks read when streaming house activities
+ACTIVITY_STREAM_CHUNK_SIZE = 16384
+
+# Maximum number of device details to keep validators for
+# when conditional requests are enabled
+DETAIL_VALIDATORS_CACHE_SIZE = 1024
+
+_DetailT = TypeVar("_DetailT", DoorbellDetail, LockDetail)
+
 
 def _obscure_payload(payload: dict[str, Any]) -> dict[str, Any]:
     """Obscure the payload for logging."""
@@ -92,12 +118,59 @@ class ApiAsync(ApiCommon):
         timeout=10,
         command_timeout=60,
         brand=DEFAULT_BRAND,
+        *,
+        coalesce_requests: bool = False,
+        response_cache: TTLCache[tuple[str, str | None], bytes] | None = None,
+        response_cache_ttls: dict[str, float] | None = None,
+        conditional_requests: bool = False,
+        retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+        retry_policies: dict[str, RetryPolicy] | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        request_limiter: FairLimiter | None = None,
+        request_limiter_key: Hashable = None,
+        token_bucket_limiter: TokenBucketLimiter | None = None,
     ) -> None:
         self._timeout = timeout
         self._command_timeout = command_timeout
         self._aiohttp_session = aiohttp_session
+        self._coalesce_requests = coalesce_requests
+        self._inflight_requests: dict[tuple[Any, ...], asyncio.Task] = {}
+        self._response_cache = response_cache
+        self._response_cache_ttls = API_CACHE_TTLS | (response_cache_ttls or {})
+        self._detail_validators: (
+            TTLCache[str, tuple[str | None, str | None, DoorbellDetail | LockDetail]]
+            | None
+        ) = TTLCache(DETAIL_VALIDATORS_CACHE_SIZE) if conditional_requests else None
+        self._retry_policy = retry_policy
+        self._retry_policies = retry_policies or {}
+        self._circuit_breaker = circuit_breaker
+        self._request_limiter = request_limiter
+        self._request_limiter_key = request_limiter_key
+        self._token_bucket_limiter = token_bucket_limiter
         super().__init__(brand)
 
+    @property
+    def circuit_breaker(self) -> CircuitBreaker | None:
+        """Return the circuit breaker for the api host if there is one."""
+        return self._circuit_breaker
+
+    def invalidate_response_cache(self, lock_id: str | None = None) -> None:
+        """Invalidate cached responses.
+
+        If a lock_id is passed only the responses that can change
+        when that lock is operated are removed.
+        """
+        if (cache := self._response_cache) is None:
+            return
+        if lock_id is None:
+            cache.clear()
+            return
+        urls = {
+            self.get_brand_url(API_GET_LOCKS_URL),
+            self.get_brand_url(API_GET_PINS_URL.format(lock_id=lock_id)),
+        }
+        cache.invalidate(lambda key: key[0] in urls)
+
     async def async_get_session(
         self, install_id: str, identifier: str, password: str
     ) -> ClientResponse:
@@ -130,18 +203,17 @@ class ApiAsync(ApiCommon):
     async def async_get_doorbells(self, access_token: str) -> list[Doorbell]:
         if not self.brand_supports_doorbells:
             return []
-        response = await self._async_dict_to_api(
-            self._build_get_doorbells_request(access_token)
+        return _process_doorbells_json(
+            await self._async_get_json(self._build_get_doorbells_request(access_token))
         )
-        return _process_doorbells_json(await response.json())
 
     async def async_get_doorbell_detail(
         self, access_token: str, doorbell_id: str
     ) -> DoorbellDetail:
-        response = await self._async_dict_to_api(
-            self._build_get_doorbell_detail_request(access_token, doorbell_id)
+        return await self._async_get_device_detail(
+            self._build_get_doorbell_detail_request(access_token, doorbell_id),
+            DoorbellDetail,
         )
-        return DoorbellDetail(await response.json())
 
     async def async_wakeup_doorbell(
         self, access_token: str, doorbell_id: str
@@ -152,10 +224,7 @@ class ApiAsync(ApiCommon):
         return True
 
     async def async_get_user(self, access_token: str) -> dict[str, Any]:
-        response = await self._async_dict_to_api(
-            self._build_get_user_request(access_token)
-        )
-        return await response.json()
+        return await self._async_get_json(self._build_get_user_request(access_token))
 
     async def async_get_houses(self, access_token: str) -> ClientResponse:
         return await self._async_dict_to_api(
@@ -163,26 +232,84 @@ class ApiAsync(ApiCommon):
         )
 
     async def async_get_house(self, access_token: str, house_id: str) -> dict[str, Any]:
-        response = await self._async_dict_to_api(
+        return await self._async_get_json(
             self._build_get_house_request(access_token, house_id)
         )
-        return await response.json()
 
     async def async_get_house_activities(
-        self, access_token: str, house_id: str, limit: int = 8
-    ) -> list[ActivityTypes]:
+        self,
+        access_token: str,
+        house_id: str,
+        limit: int = 8,
+        *,
+        compact: bool = False,
+        cursor: ActivityCursor | None = None,
+    ) -> list[ActivityTypes] | list[CompactActivity]:
+        """Return the house activities.
+
+        If a cursor is passed, only the activities that are newer
+        than it are returned and the cursor is moved past them.
+        """
         response = await self._async_dict_to_api(
             self._build_get_house_activities_request(
                 access_token, house_id, limit=limit
             )
         )
-        return _process_activity_json(await response.json())
+        activities = _process_activity_json(
+            await response.json(loads=json_loads), compact=compact, cursor=cursor
+        )
+        if cursor is not None:
+            cursor.commit()
+        return activities
 
-    async def async_get_locks(self, access_token: str) -> list[Lock]:
+    async def async_stream_house_activities(
+        self,
+        access_token: str,
+        house_id: str,
+        limit: int = 8,
+        *,
+        compact: bool = False,
+        cursor: ActivityCursor | None = None,
+    ) -> AsyncIterator[list[ActivityTypes] | list[CompactActivity]]:
+        """Yield house activities in batches as the response is read.
+
+        Each activity is built as soon as it has been received so
+        a large response never has to be decoded all at once. If a
+        cursor is passed, it is moved past the activities once the
+        whole response has been read.
+        """
         response = await self._async_dict_to_api(
-            self._build_get_locks_request(access_token)
+            self._build_get_house_activities_request(
+                access_token, house_id, limit=limit
+            )
+        )
+        decoder = JSONArrayStreamDecoder("events")
+        streamed = False
+        try:
+            async for chunk in response.content.iter_chunked(
+                ACTIVITY_STREAM_CHUNK_SIZE
+            ):
+                streamed = True
+                if activities := _process_activity_json(
+                    decoder.feed(chunk), compact=compact, cursor=cursor
+                ):
+                    yield activities
+            # The body has already been read if it was logged
+            # or shared with coalesced requests
+            body = b"" if streamed else await response.read()
+            if activities := _process_activity_json(
+                decoder.feed(body, final=True), compact=compact, cursor=cursor
+            ):
+                yield activities
+            if cursor is not None:
+                cursor.commit()
+        finally:
+            response.release()
+
+    async def async_get_locks(self, access_token: str) -> list[Lock]:
+        return _process_locks_json(
+            await self._async_get_json(self._build_get_locks_request(access_token))
         )
-        return _process_locks_json(await response.json())
 
     async def async_get_operable_locks(self, access_token: str) -> list[Lock]:
         locks = await self.async_get_locks(access_token)
@@ -192,10 +319,9 @@ class ApiAsync(ApiCommon):
     async def async_get_lock_detail(
         self, access_token: str, lock_id: str
     ) -> LockDetail:
-        response = await self._async_dict_to_api(
-            self._build_get_lock_detail_request(access_token, lock_id)
+        return await self._async_get_device_detail(
+            self._build_get_lock_detail_request(access_token, lock_id), LockDetail
         )
-        return LockDetail(await response.json())
 
     async def async_get_lock_status(
         self, access_token: str, lock_id: str, door_status=False
@@ -203,7 +329,7 @@ class ApiAsync(ApiCommon):
         response = await self._async_dict_to_api(
             self._build_get_lock_status_request(access_token, lock_id)
         )
-        json_dict = await response.json()
+        json_dict = await response.json(loads=json_loads)
 
         if door_status:
             return (
@@ -219,7 +345,7 @@ class ApiAsync(ApiCommon):
         response = await self._async_dict_to_api(
             self._build_get_lock_status_request(access_token, lock_id)
         )
-        json_dict = await response.json()
+        json_dict = await response.json(loads=json_loads)
 
         if lock_status:
             return (
@@ -230,32 +356,37 @@ class ApiAsync(ApiCommon):
         return determine_door_state(json_dict.get("doorState"))
 
     async def async_get_pins(self, access_token: str, lock_id: str) -> list[Pin]:
-        response = await self._async_dict_to_api(
+        json_dict = await self._async_get_json(
             self._build_get_pins_request(access_token, lock_id)
         )
-        json_dict = await response.json()
 
         return [Pin(pin_json) for pin_json in json_dict.get("loaded", [])]
 
     async def _async_call_lock_operation(
         self, url_str: str, access_token: str, lock_id: str
     ) -> dict[str, Any]:
-        response = await self._async_dict_to_api(
-            self._build_call_lock_operation_request(
-                url_str, access_token, lock_id, self._command_timeout
+        try:
+            response = await self._async_dict_to_api(
+                self._build_call_lock_operation_request(
+                    url_str, access_token, lock_id, self._command_timeout
+                )
             )
-        )
-        return await response.json()
+        finally:
+            self.invalidate_response_cache(lock_id)
+        return await response.json(loads=json_loads)
 
     async def _async_call_async_lock_operation(
         self, url_str: str, access_token: str, lock_id: str
     ) -> str:
         """Call an operation that will queue."""
-        response = await self._async_dict_to_api(
-            self._build_call_lock_operation_request(
-                url_str, access_token, lock_id, self._command_timeout
+        try:
+            response = await self._async_dict_to_api(
+                self._build_call_lock_operation_request(
+                    url_str, access_token, lock_id, self._command_timeout
+                )
             )
-        )
+        finally:
+            self.invalidate_response_cache(lock_id)
         return await response.text()
 
     async def _async_lock(self, access_token: str, lock_id: str) -> str:
@@ -396,7 +527,7 @@ class ApiAsync(ApiCommon):
         response = await self._async_dict_to_api(
             self._build_get_alarms_request(access_token)
         )
-        return _process_alarms_json(await response.json())
+        return _process_alarms_json(await response.json(loads=json_loads))
 
     async def async_get_alarm_devices(
         self, access_token: str, alarm: Alarm
@@ -408,7 +539,7 @@ class ApiAsync(ApiCommon):
                 access_token, alarm_id=alarm.device_id
             )
         )
-        return _process_alarm_devices_json(await response.json())
+        return _process_alarm_devices_json(await response.json(loads=json_loads))
 
     async def async_arm_alarm(
         self, access_token: str, alarm: Alarm, arm_state: ArmState
@@ -418,7 +549,7 @@ class ApiAsync(ApiCommon):
         response = await self._async_dict_to_api(
             self._build_call_alarm_state_request(access_token, alarm, arm_state)
         )
-        return await response.json()
+        return await response.json(loads=json_loads)
 
     async def async_refresh_access_token(self, access_token: str) -> str:
         """Obtain a new api token."""
@@ -426,10 +557,13 @@ class ApiAsync(ApiCommon):
             self._build_refresh_access_token_request(access_token)
         )
         response_headers = response.headers
-        return (
+        new_access_token = (
             response_headers.get(HEADER_ACCESS_TOKEN)
             or response_headers[HEADER_AUGUST_ACCESS_TOKEN]
         )
+        if new_access_token != access_token:
+            invalidate_header_templates(access_token)
+        return new_access_token
 
     async def async_add_websocket_subscription(
         self, access_token: str
@@ -438,7 +572,7 @@ class ApiAsync(ApiCommon):
         response = await self._async_dict_to_api(
             self._build_websocket_subscribe_request(access_token)
         )
-        return await response.json()
+        return await response.json(loads=json_loads)
 
     async def async_get_websocket_subscriptions(self, access_token: str) -> str:
         """Get websocket subscriptions."""
@@ -447,11 +581,72 @@ class ApiAsync(ApiCommon):
         )
         return await response.text()
 
+    async def _async_get_device_detail(
+        self, api_dict: dict[str, Any], detail_class: type[_DetailT]
+    ) -> _DetailT:
+        """Fetch a device detail.
+
+        When conditional requests are enabled the validators from the
+        last response are sent, and the previous detail is returned
+        as-is if the api reports it has not been modified.
+        """
+        if (validators := self._detail_validators) is None:
+            response = await self._async_dict_to_api(api_dict)
+            return detail_class(await response.json(loads=json_loads))
+        url = api_dict["url"]
+        if previous := validators.get(url):
+            etag, last_modified, _ = previous
+            headers = _api_headers(
+                access_token=api_dict.get("access_token"), brand=self.brand
+            )
+            if etag:
+                headers[hdrs.IF_NONE_MATCH] = etag
+            if last_modified:
+                headers[hdrs.IF_MODIFIED_SINCE] = last_modified
+            api_dict["headers"] = headers
+        response = await self._async_dict_to_api(api_dict)
+        if previous and response.status == HTTPStatus.NOT_MODIFIED:
+            _LOGGER.debug("Detail for %s has not been modified", url)
+            return previous[2]
+        detail = detail_class(await response.json(loads=json_loads))
+        response_headers = response.headers
+        etag = response_headers.get(hdrs.ETAG)
+        last_modified = response_headers.get(hdrs.LAST_MODIFIED)
+        if etag or last_modified:
+            validators.set(url, (etag, last_modified, detail))
+        else:
+            validators.pop(url)
+        return detail
+
+    async def _async_get_json(self, api_dict: dict[str, Any]) -> Any:
+        """Return the decoded json for a read request.
+
+        Responses from endpoints with a cache ttl are served from the
+        response cache when one is configured. The raw body is cached
+        and decoded again on every hit so callers never share objects.
+        """
+        cache = self._response_cache
+        if (
+            cache is None
+            or (ttl := self._response_cache_ttls.get(api_dict["endpoint"])) is None
+        ):
+            response = await self._async_dict_to_api(api_dict)
+            return await response.json(loads=json_loads)
+        key = (api_dict["url"], api_dict.get("access_token"))
+        if (body := cache.get(key)) is not None:
+            _LOGGER.debug("Using cached response for %s", key[0])
+            return json_loads(body)
+        response = await self._async_dict_to_api(api_dict)
+        body = await response.read()
+        cache.set(key, body, ttl)
+        return json_loads(body)
+
     async def _async_dict_to_api(self, api_dict: dict[str, Any]) -> ClientResponse:
         url = api_dict.pop("url")
         method = api_dict.pop("method")
         access_token = api_dict.pop("access_token", None)
-        payload = api_dict.get("params") or api_dict.get("json")
+        endpoint = api_dict.pop("endpoint", None)
+        retry_policy = self._retry_policies.get(endpoint, self._retry_policy)
 
         if "headers" not in api_dict:
             api_dict["headers"] = _api_headers(
@@ -465,6 +660,148 @@ class ApiAsync(ApiCommon):
         if "timeout" not in api_dict:
             api_dict["timeout"] = self._timeout
 
+        rate_key: tuple[str, str] | None = None
+        if self._token_bucket_limiter is not None and (
+            rate_token := access_token or _login_identity(api_dict)
+        ):
+            rate_key = (
+                rate_token,
+                API_ENDPOINT_CLASSES.get(endpoint, API_ENDPOINT_CLASS_READ),
+            )
+
+        if self._coalesce_requests and method == "get":
+            return await self._async_coalesced_request(
+                method, url, access_token, api_dict, retry_policy, rate_key=rate_key
+            )
+        return await self._async_request(
+            method, url, api_dict, retry_policy, rate_key=rate_key
+        )
+
+    async def _async_coalesced_request(
+        self,
+        method: str,
+        url: str,
+        access_token: str | None,
+        api_dict: dict[str, Any],
+        retry_policy: RetryPolicy,
+        *,
+        rate_key: tuple[str, str] | None = None,
+    ) -> ClientResponse:
+        """Share a single in-flight request between identical concurrent callers.
+
+        The body is read before the response is shared so every
+        caller can call json() or text() on the same response.
+        """
+        params = api_dict.get("params")
+        key = (
+            method,
+            url,
+            tuple(sorted(params.items())) if params else None,
+            access_token,
+        )
+        if (task := self._inflight_requests.get(key)) is None:
+            task = create_eager_task(
+                self._async_request_and_read(
+                    method, url, api_dict, retry_policy, rate_key=rate_key
+                )
+            )
+            self._inflight_requests[key] = task
+            task.add_done_callback(partial(self._async_inflight_request_done, key))
+        else:
+            _LOGGER.debug("Coalescing request to %s with an in-flight request", url)
+        # Shield the shared task so one caller being cancelled
+        # does not cancel the request for everyone else
+        return await asyncio.shield(task)
+
+    def _async_inflight_request_done(
+        self, key: tuple[Any, ...], task: asyncio.Task
+    ) -> None:
+        """Remove a finished in-flight request."""
+        if self._inflight_requests.get(key) is task:
+            del self._inflight_requests[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved since all the
+            # callers may have been cancelled before it finished
+            task.exception()
+
+    async def _async_request_and_read(
+        self,
+        method: str,
+        url: str,
+        api_dict: dict[str, Any],
+        retry_policy: RetryPolicy,
+        *,
+        rate_key: tuple[str, str] | None = None,
+    ) -> ClientResponse:
+        """Make a request and read the body so the response can be shared."""
+        response = await self._async_request(
+            method, url, api_dict, retry_policy, rate_key=rate_key
+        )
+        await response.read()
+        return response
+
+    async def _async_request(
+        self,
+        method: str,
+        url: str,
+        api_dict: dict[str, Any],
+        retry_policy: RetryPolicy,
+        *,
+        rate_key: tuple[str, str] | None = None,
+    ) -> ClientResponse:
+        if rate_key is not None:
+            # Wait for the rate limit before taking a request slot so
+            # waiting requests do not hold slots other accounts could use
+            await self._token_bucket_limiter.acquire(
+                *rate_key, timeout=retry_policy.deadline
+            )
+        if (limiter := self._request_limiter) is None:
+            return await self._async_breaker_request(
+                method, url, api_dict, retry_policy
+            )
+        # Shared with the other accounts in the process so the
+        # requests of a large account are interleaved with theirs
+        async with limiter.slot(self._request_limiter_key):
+            return await self._async_breaker_request(
+                method, url, api_dict, retry_policy
+            )
+
+    async def _async_breaker_request(
+        self,
+        method: str,
+        url: str,
+        api_dict: dict[str, Any],
+        retry_policy: RetryPolicy,
+    ) -> ClientResponse:
+        if (breaker := self._circuit_breaker) is None:
+            return await self._async_request_with_retries(
+                method, url, api_dict, retry_policy
+            )
+        breaker.before_request()
+        try:
+            response = await self._async_request_with_retries(
+                method, url, api_dict, retry_policy
+            )
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
+        except Exception as err:
+            if _is_upstream_failure(err):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        breaker.record_success()
+        return response
+
+    async def _async_request_with_retries(
+        self,
+        method: str,
+        url: str,
+        api_dict: dict[str, Any],
+        retry_policy: RetryPolicy,
+    ) -> ClientResponse:
+        payload = api_dict.get("params") or api_dict.get("json")
         debug_enabled = _LOGGER.isEnabledFor(logging.DEBUG)
 
         if debug_enabled:
@@ -475,8 +812,9 @@ class ApiAsync(ApiCommon):
                 _obscure_payload(payload),
             )
 
+        deadline_at = retry_policy.deadline_at(time.monotonic())
         attempts = 0
-        while attempts < API_RETRY_ATTEMPTS:
+        while True:
             attempts += 1
             try:
                 response = await self._aiohttp_session.request(method, url, **api_dict)
@@ -489,7 +827,9 @@ class ApiAsync(ApiCommon):
                 # Try again if we get disconnected
                 # We may get [Errno 104] Connection reset by peer or a
                 # transient disconnect/SSL error
-                if attempts == API_RETRY_ATTEMPTS:
+                if attempts >= retry_policy.attempts or _past_deadline(
+                    deadline_at, API_EXCEPTION_RETRY_TIME
+                ):
                     raise YaleApiError(
                         f"Failed to connect to August API: {ex}", ex
                     ) from ex
@@ -503,23 +843,68 @@ class ApiAsync(ApiCommon):
                     _obscure_headers(response.headers),
                     await response.read(),
                 )
-            if response.status in (429, 502):
-                # 429 - rate limited
-                # 502 - bad gateway
+            if (
+                not retry_policy.should_retry(response.status)
+                or attempts >= retry_policy.attempts
+            ):
+                break
+            # 429 - rate limited
+            # 502 - bad gateway
+            delay = retry_policy.delay(
+                attempts, parse_retry_after(response.headers.get(hdrs.RETRY_AFTER))
+            )
+            if _past_deadline(deadline_at, delay):
                 _LOGGER.debug(
-                    "API sent a %s (attempt: %d), sleeping and trying again",
+                    "API sent a %s (attempt: %d), not retrying past the deadline",
                     response.status,
                     attempts,
                 )
-                await asyncio.sleep(API_RETRY_TIME)
-                continue
-            break
+                break
+            _LOGGER.debug(
+                "API sent a %s (attempt: %d), retrying in %.1fs",
+                response.status,
+                attempts,
+                delay,
+            )
+            response.release()
+            await asyncio.sleep(delay)
 
         _raise_response_exceptions(response)
 
         return response
 
 
+def _is_upstream_failure(err: Exception) -> bool:
+    """Return if an error means the api itself is unhealthy.
+
+    Errors for a specific request, like a bridge being offline
+    or invalid auth, do not count against the api. Neither does
+    being rate limited, which is per access token and handled by
+    waiting for Retry-After, so one throttled account cannot open
+    the circuit for every other account.
+    """
+    if isinstance(err, RateLimited):
+        return False
+    if isinstance(err, YaleApiError):
+        return not err.status or err.status >= HTTPStatus.INTERNAL_SERVER_ERROR
+    return isinstance(err, (asyncio.TimeoutError, ClientError))
+
+
+def _login_identity(api_dict: dict[str, Any]) -> str | None:
+    """Return who a request without an access token is made for.
+
+    Logins are rate limited per account instead of sharing one
+    bucket between every account in the process.
+    """
+    body = api_dict.get("json") or {}
+    return body.get("identifier") or body.get("installId")
+
+
+def _past_deadline(deadline_at: float | None, delay: float) -> bool:
+    """Return if waiting for the delay would run past the deadline."""
+    return deadline_at is not None and time.monotonic() + delay > deadline_at
+
+
 def _raise_response_exceptions(response: ClientResponse) -> None:
     """Raise exceptions for known error codes."""
     try:
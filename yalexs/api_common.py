@@ -5,11 +5,20 @@ from __future__ import annotations
 import datetime
 import logging
 from functools import cache
+from types import MappingProxyType
 from typing import Any
 
 from ._compat import cached_property
-from .activity import ACTION_TO_CLASS, SOURCE_LOCK_OPERATE, SOURCE_LOG, ActivityTypes
+from .activity import (
+    ACTION_TO_CLASS,
+    SOURCE_LOCK_OPERATE,
+    SOURCE_LOG,
+    ActivityCursor,
+    ActivityTypes,
+    CompactActivity,
+)
 from .alarm import Alarm, AlarmDevice, ArmState
+from .cache import TTLCache
 from .const import BASE_URLS, BRAND_CONFIG, BRANDING, DEFAULT_BRAND, Brand, BrandConfig
 from .doorbell import Doorbell
 from .lock import Lock, LockDoorStatus, determine_door_state, door_state_to_string
@@ -18,6 +27,9 @@ from .time import parse_datetime
 API_EXCEPTION_RETRY_TIME = 0.1
 API_RETRY_TIME = 2.5
 API_RETRY_ATTEMPTS = 10
+API_RETRY_MAX_TIME = 30
+# The total time a single call may spend retrying
+API_RETRY_DEADLINE = 60
 
 HEADER_ACCEPT_VERSION = "Accept-Version"
 HEADER_AUGUST_COUNTRY = "x-august-country"
@@ -31,6 +43,10 @@ HEADER_VALUE_ACCEPT_VERSION = "0.0.1"
 HEADER_VALUE_AUGUST_BRANDING = "august"
 HEADER_VALUE_AUGUST_COUNTRY = "US"
 
+# Maximum number of (brand, access_token) header templates to keep,
+# enough for every account of a large AccountManager
+HEADER_TEMPLATE_CACHE_SIZE = 16384
+
 
 API_GET_SESSION_URL = "/session"
 API_SEND_VERIFICATION_CODE_URLS = {
@@ -68,6 +84,48 @@ API_GET_ALARMS_URL = "/users/alarms/mine"
 API_GET_ALARM_DEVICES_URL = "/alarms/{alarm_id}/devices"
 API_PUT_ALARM_URL = "/alarms/{alarm_id}/state/{arm_state}"
 
+# How long, in seconds, responses from idempotent read endpoints
+# can be served from the response cache when one is configured
+API_CACHE_TTLS: dict[str, float] = {
+    API_GET_LOCKS_URL: 30,
+    API_GET_DOORBELLS_URL: 30,
+    API_GET_USER_URL: 300,
+    API_GET_HOUSE_URL: 60,
+    API_GET_PINS_URL: 60,
+}
+
+# Requests are rate limited per access token and endpoint class so
+# the reads of an account never hold up its lock operations
+API_ENDPOINT_CLASS_READ = "read"
+API_ENDPOINT_CLASS_OPERATE = "operate"
+API_ENDPOINT_CLASS_WAKEUP = "wakeup"
+API_ENDPOINT_CLASS_AUTH = "auth"
+# Endpoints that are not listed are in the read class
+API_ENDPOINT_CLASSES: dict[str, str] = {
+    API_GET_SESSION_URL: API_ENDPOINT_CLASS_AUTH,
+    **dict.fromkeys(API_SEND_VERIFICATION_CODE_URLS.values(), API_ENDPOINT_CLASS_AUTH),
+    **dict.fromkeys(
+        API_VALIDATE_VERIFICATION_CODE_URLS.values(), API_ENDPOINT_CLASS_AUTH
+    ),
+    API_LOCK_URL: API_ENDPOINT_CLASS_OPERATE,
+    API_UNLOCK_URL: API_ENDPOINT_CLASS_OPERATE,
+    API_UNLATCH_URL: API_ENDPOINT_CLASS_OPERATE,
+    # The endpoint of the async operations includes the hyper bridge
+    # param when it is used, which is the default
+    **dict.fromkeys(
+        (
+            endpoint
+            for url in (API_LOCK_ASYNC_URL, API_UNLOCK_ASYNC_URL, API_UNLATCH_ASYNC_URL)
+            for endpoint in (url, f"{url}{HYPER_BRIDGE_PARAM}")
+        ),
+        API_ENDPOINT_CLASS_OPERATE,
+    ),
+    API_PUT_ALARM_URL: API_ENDPOINT_CLASS_OPERATE,
+    API_STATUS_ASYNC_URL: API_ENDPOINT_CLASS_WAKEUP,
+    f"{API_STATUS_ASYNC_URL}{HYPER_BRIDGE_PARAM}": API_ENDPOINT_CLASS_WAKEUP,
+    API_WAKEUP_DOORBELL_URL: API_ENDPOINT_CLASS_WAKEUP,
+}
+
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -77,31 +135,82 @@ def _get_brand_config(brand: Brand) -> BrandConfig:
     return BRAND_CONFIG.get(brand, BRAND_CONFIG[DEFAULT_BRAND])
 
 
-def api_auth_headers(
-    access_token: str | None = None, brand: Brand | None = None
-) -> dict[str, str]:
+# The least recently used templates are evicted once a cache is full
+_AUTH_HEADER_TEMPLATES: TTLCache[
+    tuple[Brand | None, str | None], MappingProxyType[str, str]
+] = TTLCache(HEADER_TEMPLATE_CACHE_SIZE)
+_API_HEADER_TEMPLATES: TTLCache[
+    tuple[Brand | None, str | None], MappingProxyType[str, str]
+] = TTLCache(HEADER_TEMPLATE_CACHE_SIZE)
+
+
+def _store_header_template(
+    templates: TTLCache[tuple[Brand | None, str | None], MappingProxyType[str, str]],
+    key: tuple[Brand | None, str | None],
+    headers: dict[str, str],
+) -> MappingProxyType[str, str]:
+    """Store an immutable header template."""
+    template = MappingProxyType(headers)
+    templates.set(key, template)
+    return template
+
+
+def _auth_header_template(
+    access_token: str | None, brand: Brand | None
+) -> MappingProxyType[str, str]:
+    """Return the immutable auth headers for a brand and access token."""
+    key = (brand, access_token)
+    if (template := _AUTH_HEADER_TEMPLATES.get(key)) is not None:
+        return template
     brand_config = _get_brand_config(brand)
-    base_headers = {
+    headers = {
         brand_config.api_key_header: brand_config.api_key,
         brand_config.branding_header: BRANDING.get(brand, HEADER_VALUE_AUGUST_BRANDING),
     }
     if access_token:
-        base_headers[brand_config.access_token_header] = access_token
-    return base_headers
+        headers[brand_config.access_token_header] = access_token
+    return _store_header_template(_AUTH_HEADER_TEMPLATES, key, headers)
+
+
+def _api_header_template(
+    access_token: str | None, brand: Brand | None
+) -> MappingProxyType[str, str]:
+    """Return the immutable api headers for a brand and access token."""
+    key = (brand, access_token)
+    if (template := _API_HEADER_TEMPLATES.get(key)) is not None:
+        return template
+    headers = {
+        **_auth_header_template(access_token, brand),
+        HEADER_ACCEPT_VERSION: HEADER_VALUE_ACCEPT_VERSION,
+        HEADER_CONTENT_TYPE: HEADER_VALUE_CONTENT_TYPE,
+        HEADER_AUGUST_COUNTRY: HEADER_VALUE_AUGUST_COUNTRY,
+    }
+    return _store_header_template(_API_HEADER_TEMPLATES, key, headers)
+
+
+def invalidate_header_templates(access_token: str | None = None) -> None:
+    """Drop cached header templates.
+
+    If an access_token is passed only the templates for that
+    token are removed, which is done when it is refreshed.
+    """
+    for templates in (_AUTH_HEADER_TEMPLATES, _API_HEADER_TEMPLATES):
+        if access_token is None:
+            templates.clear()
+            continue
+        templates.invalidate(lambda key: key[1] == access_token)
+
+
+def api_auth_headers(
+    access_token: str | None = None, brand: Brand | None = None
+) -> dict[str, str]:
+    return _auth_header_template(access_token, brand).copy()
 
 
 def _api_headers(
     access_token: str | None = None, brand: Brand | None = None
 ) -> dict[str, str]:
-    headers = api_auth_headers(access_token, brand)
-    headers.update(
-        {
-            HEADER_ACCEPT_VERSION: HEADER_VALUE_ACCEPT_VERSION,
-            HEADER_CONTENT_TYPE: HEADER_VALUE_CONTENT_TYPE,
-            HEADER_AUGUST_COUNTRY: HEADER_VALUE_AUGUST_COUNTRY,
-        }
-    )
-    return headers
+    return _api_header_template(access_token, brand).copy()
 
 
 def _convert_lock_result_to_activities(
@@ -161,9 +270,21 @@ def _datetime_string_to_epoch(datetime_string: str) -> datetime.datetime:
     return parse_datetime(datetime_string).timestamp() * 1000
 
 
-def _process_activity_json(json_dict: dict[str, Any]) -> list[ActivityTypes]:
+def _process_activity_json(
+    json_dict: dict[str, Any],
+    compact: bool = False,
+    cursor: ActivityCursor | None = None,
+) -> list[ActivityTypes] | list[CompactActivity]:
     if "events" in json_dict:
         json_dict = json_dict["events"]
+    if cursor is not None:
+        json_dict = cursor.filter(json_dict)
+    if compact:
+        return [
+            CompactActivity(SOURCE_LOG, activity_json)
+            for activity_json in json_dict
+            if activity_json.get("action") in ACTION_TO_CLASS
+        ]
     debug = _LOGGER.isEnabledFor(logging.DEBUG)
     return [
         activity
@@ -215,6 +336,7 @@ class ApiCommon:
         return {
             "method": "post",
             "url": self.get_brand_url(API_GET_SESSION_URL),
+            "endpoint": API_GET_SESSION_URL,
             "json": {
                 "installId": install_id,
                 "identifier": identifier,
@@ -233,6 +355,7 @@ class ApiCommon:
         return {
             **self._build_base_request(access_token, "post"),
             "url": self.get_brand_url(API_SEND_VERIFICATION_CODE_URLS[login_method]),
+            "endpoint": API_SEND_VERIFICATION_CODE_URLS[login_method],
             "json": json,
         }
 
@@ -250,6 +373,7 @@ class ApiCommon:
             "url": self.get_brand_url(
                 API_VALIDATE_VERIFICATION_CODE_URLS[login_method]
             ),
+            "endpoint": API_VALIDATE_VERIFICATION_CODE_URLS[login_method],
             "json": {login_method: username, "code": str(verification_code)},
         }
 
@@ -257,6 +381,7 @@ class ApiCommon:
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_DOORBELLS_URL),
+            "endpoint": API_GET_DOORBELLS_URL,
         }
 
     def _build_get_doorbell_detail_request(
@@ -267,6 +392,7 @@ class ApiCommon:
             "url": self.get_brand_url(
                 API_GET_DOORBELL_URL.format(doorbell_id=doorbell_id)
             ),
+            "endpoint": API_GET_DOORBELL_URL,
         }
 
     def _build_wakeup_doorbell_request(
@@ -277,18 +403,21 @@ class ApiCommon:
             "url": self.get_brand_url(
                 API_WAKEUP_DOORBELL_URL.format(doorbell_id=doorbell_id)
             ),
+            "endpoint": API_WAKEUP_DOORBELL_URL,
         }
 
     def _build_get_houses_request(self, access_token: str) -> dict[str, Any]:
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_HOUSES_URL),
+            "endpoint": API_GET_HOUSES_URL,
         }
 
     def _build_get_house_request(self, access_token, house_id):
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_HOUSE_URL.format(house_id=house_id)),
+            "endpoint": API_GET_HOUSE_URL,
         }
 
     def _build_get_house_activities_request(self, access_token, house_id, limit=8):
@@ -297,6 +426,7 @@ class ApiCommon:
             "url": self.get_brand_url(
                 API_GET_HOUSE_ACTIVITIES_URL.format(house_id=house_id)
             ),
+            "endpoint": API_GET_HOUSE_ACTIVITIES_URL,
             "version": "4.0.0",
             "params": {"limit": limit},
         }
@@ -305,12 +435,14 @@ class ApiCommon:
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_LOCKS_URL),
+            "endpoint": API_GET_LOCKS_URL,
         }
 
     def _build_get_user_request(self, access_token: str) -> dict[str, Any]:
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_USER_URL),
+            "endpoint": API_GET_USER_URL,
         }
 
     def _build_get_lock_detail_request(
@@ -319,6 +451,7 @@ class ApiCommon:
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_LOCK_URL.format(lock_id=lock_id)),
+            "endpoint": API_GET_LOCK_URL,
         }
 
     def _build_get_lock_status_request(
@@ -327,6 +460,7 @@ class ApiCommon:
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_LOCK_STATUS_URL.format(lock_id=lock_id)),
+            "endpoint": API_GET_LOCK_STATUS_URL,
         }
 
     def _build_get_pins_request(
@@ -335,18 +469,21 @@ class ApiCommon:
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_PINS_URL.format(lock_id=lock_id)),
+            "endpoint": API_GET_PINS_URL,
         }
 
     def _build_refresh_access_token_request(self, access_token: str) -> dict[str, Any]:
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_HOUSES_URL),
+            "endpoint": API_GET_HOUSES_URL,
         }
 
     def _build_websocket_subscribe_request(self, access_token: str) -> dict[str, Any]:
         return {
             **self._build_base_request(access_token, "post"),
             "url": self.get_brand_url(API_WEBSOCKET_SUBSCRIBERS),
+            "endpoint": API_WEBSOCKET_SUBSCRIBERS,
             "json": {
                 "scopes": ["lock"],
             },
@@ -362,6 +499,7 @@ class ApiCommon:
                     subscriber_id=subscriber_id
                 )
             ),
+            "endpoint": API_WEBSOCKET_SUBSCRIBERS_WITH_SUBSCRIBER_ID,
         }
 
     def _build_websocket_delete_request(
@@ -374,6 +512,7 @@ class ApiCommon:
                     subscriber_id=subscriber_id
                 )
             ),
+            "endpoint": API_WEBSOCKET_SUBSCRIBERS_WITH_SUBSCRIBER_ID,
         }
 
     def _build_call_lock_operation_request(
@@ -382,6 +521,7 @@ class ApiCommon:
         return {
             **self._build_base_request(access_token, "put"),
             "url": self.get_brand_url(url_str.format(lock_id=lock_id)),
+            "endpoint": url_str,
             "timeout": timeout,
         }
 
@@ -389,6 +529,7 @@ class ApiCommon:
         return {
             **self._build_base_request(access_token),
             "url": self.get_brand_url(API_GET_ALARMS_URL),
+            "endpoint": API_GET_ALARMS_URL,
         }
 
     def _build_get_alarm_devices_request(
@@ -399,6 +540,7 @@ class ApiCommon:
             "url": self.get_brand_url(
                 API_GET_ALARM_DEVICES_URL.format(alarm_id=alarm_id)
             ),
+            "endpoint": API_GET_ALARM_DEVICES_URL,
         }
 
     def _build_call_alarm_state_request(
@@ -409,5 +551,6 @@ class ApiCommon:
             "url": self.get_brand_url(
                 API_PUT_ALARM_URL.format(alarm_id=alarm.device_id, arm_state=arm_state)
             ),
+            "endpoint": API_PUT_ALARM_URL,
             "json": {"areaIDs": alarm.areaIDs},
         }
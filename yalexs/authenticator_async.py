@@ -4,9 +4,9 @@ import json
 import logging
 from datetime import datetime, timedelta, timezone
 
-import aiofiles
 from aiohttp import ClientError
 
+from ._compat import json_loads
 from .api_async import ApiAsync
 from .authenticator_common import (
     Authentication,
@@ -26,13 +26,10 @@ class AuthenticatorAsync(AuthenticatorCommon):
 
     _api: ApiAsync
 
-    async def _read_access_token_file(
-        self,
-        access_token_cache_file: str,
-        file: aiofiles.threadpool.binary.AsyncBufferedIOBase,
+    def _read_access_token_file(
+        self, access_token_cache_file: str, contents: str
     ) -> None:
-        contents = await file.read()
-        self._authentication = from_authentication_json(json.loads(contents))
+        self._authentication = from_authentication_json(json_loads(contents))
 
         # If token is to expire within 7 days then print a warning.
         if self._authentication.is_expired():
@@ -59,10 +56,10 @@ class AuthenticatorAsync(AuthenticatorCommon):
     async def async_setup_authentication(self) -> None:
         if access_token_cache_file := self._access_token_cache_file:
             try:
-                async with aiofiles.open(access_token_cache_file) as file:
-                    await self._read_access_token_file(access_token_cache_file, file)
+                contents = await self._token_store.async_get(access_token_cache_file)
+                if contents is not None:
+                    self._read_access_token_file(access_token_cache_file, contents)
                     return
-            except FileNotFoundError:
                 _LOGGER.debug("Cache file not found: %s", access_token_cache_file)
             except json.decoder.JSONDecodeError as error:
                 _LOGGER.error(
@@ -88,7 +85,7 @@ class AuthenticatorAsync(AuthenticatorCommon):
             install_id, identifier, self._password
         )
 
-        json_dict = await response.json()
+        json_dict = await response.json(loads=json_loads)
         authentication = self._authentication_from_session_response(
             install_id, response.headers, json_dict
         )
@@ -141,5 +138,8 @@ class AuthenticatorAsync(AuthenticatorCommon):
 
     async def _async_cache_authentication(self, authentication: Authentication) -> None:
         if self._access_token_cache_file is not None:
-            async with aiofiles.open(self._access_token_cache_file, "w") as file:
-                await file.write(to_authentication_json(authentication))
+            # Written in the background, atomically and together with
+            # any other tokens saved around the same time
+            self._token_store.async_set(
+                self._access_token_cache_file, to_authentication_json(authentication)
+            )
@@ -1,17 +1,17 @@
 from __future__ import annotations
 
-import json
 import logging
+import time
 import uuid
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 from enum import Enum
 from typing import Any
 
-import jwt
-
+from ._compat import json_dumps
 from .api_common import ApiCommon
 from .const import HEADER_ACCESS_TOKEN, HEADER_AUGUST_ACCESS_TOKEN
 from .time import parse_datetime
+from .token_store import TokenStore, _DefaultTokenStore
 
 # The default time before expiration to refresh a token
 DEFAULT_RENEWAL_THRESHOLD = timedelta(days=7)
@@ -21,9 +21,9 @@ _LOGGER = logging.getLogger(__name__)
 
 def to_authentication_json(authentication):
     if authentication is None:
-        return json.dumps({})
+        return json_dumps({})
 
-    return json.dumps(
+    return json_dumps(
         {
             "install_id": authentication.install_id,
             "access_token": authentication.access_token,
@@ -53,8 +53,10 @@ class Authentication:
         self._access_token = access_token
         self._access_token_expires = access_token_expires
         self._parsed_expiration_time = None
+        self._expires_at: float | None = None
         if access_token_expires:
             self._parsed_expiration_time = parse_datetime(access_token_expires)
+            self._expires_at = self._parsed_expiration_time.timestamp()
 
     @property
     def install_id(self):
@@ -79,8 +81,13 @@ class Authentication:
     def parsed_expiration_time(self):
         return self._parsed_expiration_time
 
+    @property
+    def expires_at(self) -> float | None:
+        """Return the POSIX time the access token expires at."""
+        return self._expires_at
+
     def is_expired(self):
-        return self._parsed_expiration_time < datetime.now(timezone.utc)
+        return self._expires_at < time.time()
 
 
 class AuthenticationState(Enum):
@@ -105,6 +112,7 @@ class AuthenticatorCommon:
         install_id: str | None = None,
         access_token_cache_file: str | None = None,
         access_token_renewal_threshold: timedelta = DEFAULT_RENEWAL_THRESHOLD,
+        token_store: TokenStore | None = None,
     ) -> None:
         self._api = api
         self._login_method = login_method
@@ -113,6 +121,8 @@ class AuthenticatorCommon:
         self._install_id = install_id
         self._access_token_cache_file = access_token_cache_file
         self._access_token_renewal_threshold = access_token_renewal_threshold
+        # access_token_cache_file is the key of the token in the store
+        self._token_store = token_store or _DefaultTokenStore
         self._authentication = None
 
     def _authentication_from_session_response(
@@ -142,13 +152,31 @@ class AuthenticatorCommon:
 
         return self._authentication
 
-    def should_refresh(self):
-        return self._authentication.state == AuthenticationState.AUTHENTICATED and (
-            (self._authentication.parsed_expiration_time() - datetime.now(timezone.utc))
-            < self._access_token_renewal_threshold
+    def refresh_at(self) -> float | None:
+        """Return the POSIX time the access token should be refreshed at.
+
+        Returns None if there is no authenticated access token.
+        """
+        authentication = self._authentication
+        if (
+            authentication is None
+            or authentication.state != AuthenticationState.AUTHENTICATED
+            or authentication.expires_at is None
+        ):
+            return None
+        return (
+            authentication.expires_at
+            - self._access_token_renewal_threshold.total_seconds()
         )
 
+    def should_refresh(self):
+        return (
+            refresh_at := self.refresh_at()
+        ) is not None and refresh_at < time.time()
+
     def _process_refreshed_access_token(self, refreshed_token):
+        import jwt  # noqa: PLC0415
+
         jwt_claims = jwt.decode(refreshed_token, options={"verify_signature": False})
 
         if "exp" not in jwt_claims:
@@ -0,0 +1,75 @@
+"""In-memory caches."""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+_KT = TypeVar("_KT", bound=Hashable)
+_VT = TypeVar("_VT")
+
+DEFAULT_CACHE_SIZE = 256
+
+_MISSING = object()
+
+
+class TTLCache(Generic[_KT, _VT]):
+    """A size bounded LRU cache where entries can expire.
+
+    Entries are evicted in least recently used order once the
+    cache is full, and are dropped on access once their time to
+    live has passed.
+    """
+
+    def __init__(
+        self, maxsize: int = DEFAULT_CACHE_SIZE, ttl: float | None = None
+    ) -> None:
+        """Initialize the cache."""
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data: OrderedDict[_KT, tuple[_VT, float | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return the number of entries, including any that have expired."""
+        return len(self._data)
+
+    def __contains__(self, key: Any) -> bool:
+        """Return if the key is in the cache and has not expired."""
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: _KT, default: Any = None) -> _VT | Any:
+        """Return the value for a key or default if missing or expired."""
+        if (entry := self._data.get(key)) is None:
+            return default
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: _KT, value: _VT, ttl: float | None = None) -> None:
+        """Store a value, optionally with a ttl that overrides the default."""
+        if ttl is None:
+            ttl = self._ttl
+        self._data[key] = (value, None if ttl is None else time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: _KT, default: Any = None) -> _VT | Any:
+        """Remove a key and return its value."""
+        if (entry := self._data.pop(key, None)) is None:
+            return default
+        return entry[0]
+
+    def invalidate(self, predicate: Callable[[_KT], bool]) -> None:
+        """Remove every entry where the predicate returns True for the key."""
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._data.clear()
@@ -0,0 +1,117 @@
+"""Circuit breaker for the api."""
+
+from __future__ import annotations
+
+import logging
+import time
+
+from .backports.enum import StrEnum
+from .exceptions import CannotConnect
+
+_LOGGER = logging.getLogger(__name__)
+
+# Number of consecutive failed requests before the circuit opens
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5
+# Seconds to fail fast before letting a trial request through
+CIRCUIT_BREAKER_RESET_TIMEOUT = 30
+
+
+class CircuitState(StrEnum):
+    """The state of a circuit breaker."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Fail fast when the api for a host keeps failing.
+
+    Once the failure threshold is reached the circuit opens and
+    requests raise CannotConnect right away instead of spending
+    their retry budget. After the reset timeout a single trial
+    request is let through; if it succeeds the circuit closes,
+    otherwise it opens again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_BREAKER_RESET_TIMEOUT,
+    ) -> None:
+        """Initialize the circuit breaker."""
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self) -> CircuitState:
+        """Return the current state."""
+        if self._opened_at is None:
+            return CircuitState.CLOSED
+        if self._trial_in_progress or self.retry_in <= 0:
+            return CircuitState.HALF_OPEN
+        return CircuitState.OPEN
+
+    @property
+    def retry_in(self) -> float:
+        """Return the seconds until a trial request is allowed."""
+        if self._opened_at is None:
+            return 0
+        return max(0, self._opened_at + self._reset_timeout - time.monotonic())
+
+    def before_request(self) -> None:
+        """Raise CannotConnect if the circuit is not accepting requests."""
+        if self._opened_at is None:
+            return
+        if self._trial_in_progress:
+            raise CannotConnect(
+                f"The api at {self.name} is unavailable, waiting for a trial request"
+            )
+        if (retry_in := self.retry_in) > 0:
+            raise CannotConnect(
+                f"The api at {self.name} is unavailable, retrying in {retry_in:.0f}s"
+            )
+        self._trial_in_progress = True
+
+    def record_success(self) -> None:
+        """Record a request that reached a healthy api."""
+        if self._opened_at is not None:
+            _LOGGER.info("The api at %s is available again", self.name)
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        """Record a request that failed because the api is unhealthy."""
+        self._failures += 1
+        if self._opened_at is None and self._failures < self._failure_threshold:
+            return
+        if self._opened_at is None:
+            _LOGGER.warning(
+                "The api at %s failed %s times in a row, pausing requests for %ss",
+                self.name,
+                self._failures,
+                self._reset_timeout,
+            )
+        self._opened_at = time.monotonic()
+        self._trial_in_progress = False
+
+    def record_cancelled(self) -> None:
+        """Record a request that was cancelled before it finished."""
+        # Let another trial request through since this one never finished
+        self._trial_in_progress = False
+
+
+_CIRCUIT_BREAKERS: dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(base_url: str) -> CircuitBreaker:
+    """Return the circuit breaker shared by every client of a base url."""
+    if (breaker := _CIRCUIT_BREAKERS.get(base_url)) is None:
+        breaker = _CIRCUIT_BREAKERS[base_url] = CircuitBreaker(base_url)
+    return breaker
@@ -4,7 +4,6 @@ import datetime
 import logging
 from typing import Any
 
-import requests
 from aiohttp import ClientSession
 
 from yalexs.exceptions import ContentTokenExpired
@@ -30,6 +29,11 @@ class Doorbell(Device):
         self._image_url = recent_image.get("secure_url", None)
         self._has_subscription = data.get("dvrSubscriptionSetupDone", False)
         self._content_token = data.get("contentToken", "")
+        self._data = data
+
+    @cached_property
+    def raw(self) -> dict[str, Any]:
+        return self._data
 
     @cached_property
     def serial_number(self):
@@ -184,6 +188,8 @@ class DoorbellDetail(DeviceDetail):
         return await response.read()
 
     def get_doorbell_image(self, timeout: float = 10.0) -> bytes:
+        import requests  # noqa: PLC0415
+
         _LOGGER.debug("get_doorbell_image sync %s", self.device_name)
         return requests.get(
             self._image_url,
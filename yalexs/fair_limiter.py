@@ -0,0 +1,99 @@
+"""Concurrency limit shared fairly between accounts."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Hashable
+from types import TracebackType
+
+
+class FairLimiter:
+    """Limit concurrent requests and share the slots fairly between tenants.
+
+    When every slot is in use, waiters are queued per tenant and
+    freed slots are handed to the tenants in turn, one request each,
+    so an account with thousands of queued requests cannot starve
+    an account with a single one.
+    """
+
+    def __init__(self, limit: int) -> None:
+        """Initialize the limiter."""
+        self._limit = limit
+        self._in_use = 0
+        # The tenants with queued requests in the order their turn comes up
+        self._waiters: dict[Hashable, deque[asyncio.Future[None]]] = {}
+
+    @property
+    def in_use(self) -> int:
+        """Return the number of slots in use."""
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        """Return the number of queued requests."""
+        return sum(len(queue) for queue in self._waiters.values())
+
+    def slot(self, key: Hashable) -> _FairSlot:
+        """Return a context manager that holds a slot for the tenant."""
+        return _FairSlot(self, key)
+
+    async def acquire(self, key: Hashable) -> None:
+        """Wait for a slot for the tenant."""
+        if self._in_use < self._limit and not self._waiters:
+            self._in_use += 1
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        if (queue := self._waiters.get(key)) is None:
+            queue = self._waiters[key] = deque()
+        queue.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # The slot was handed over just before the cancel
+                self.release()
+            elif (queue := self._waiters.get(key)) and future in queue:
+                queue.remove(future)
+                if not queue:
+                    del self._waiters[key]
+            raise
+
+    def release(self) -> None:
+        """Release a slot, handing it to the tenant whose turn is next."""
+        waiters = self._waiters
+        while waiters:
+            key = next(iter(waiters))
+            queue = waiters.pop(key)
+            future = queue.popleft()
+            if queue:
+                # Back of the line until the other tenants had a turn
+                waiters[key] = queue
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_use -= 1
+
+
+class _FairSlot:
+    """Hold a FairLimiter slot for the duration of a block."""
+
+    __slots__ = ("_key", "_limiter")
+
+    def __init__(self, limiter: FairLimiter, key: Hashable) -> None:
+        """Initialize the slot."""
+        self._limiter = limiter
+        self._key = key
+
+    async def __aenter__(self) -> None:
+        """Acquire the slot."""
+        await self._limiter.acquire(self._key)
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Release the slot."""
+        self._limiter.release()
@@ -0,0 +1,142 @@
+"""Incremental decoding of JSON arrays."""
+
+from __future__ import annotations
+
+import codecs
+import json
+from enum import Enum
+from typing import Any
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789.eE+-"
+
+
+class _State(Enum):
+    """Where the decoder is in the document."""
+
+    START = 1
+    OBJECT_KEY = 2
+    OBJECT_COLON = 3
+    OBJECT_VALUE = 4
+    ARRAY = 5
+    DONE = 6
+
+
+class JSONArrayStreamDecoder:
+    """Decode the items of a JSON array as the document arrives.
+
+    The array can either be the document itself or the value of
+    key in a top level object. Each item is returned as soon as
+    it is complete so the whole document never has to be decoded
+    at once.
+    """
+
+    def __init__(self, key: str) -> None:
+        """Initialize the decoder."""
+        self._key = key
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._state = _State.START
+        self._expect_comma = False
+        self._in_object = False
+        self._pending_key: str | None = None
+
+    def feed(self, data: bytes, final: bool = False) -> list[Any]:
+        """Feed the next chunk and return the items it completed."""
+        self._buffer = self._buffer[self._pos :] + self._text_decoder.decode(
+            data, final
+        )
+        self._pos = 0
+        items: list[Any] = []
+        while self._step(items, final):
+            pass
+        if final and self._state is not _State.DONE:
+            raise ValueError("Incomplete JSON document")
+        return items
+
+    def _next_char(self) -> str | None:
+        """Skip whitespace and return the next character if there is one."""
+        buffer = self._buffer
+        pos = self._pos
+        end = len(buffer)
+        while pos < end and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return buffer[pos] if pos < end else None
+
+    def _decode_value(self, final: bool) -> tuple[bool, Any]:
+        """Decode the next value if it has been fully received."""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return False, None
+        if (
+            not final
+            and not isinstance(value, (dict, list, str))
+            and (end == len(self._buffer) or self._buffer[end] in _NUMBER_CHARS)
+        ):
+            # A number that was cut off at the end of the
+            # chunk may continue in the next one
+            return False, None
+        self._pos = end
+        return True, value
+
+    def _step(self, items: list[Any], final: bool) -> bool:  # noqa: C901
+        """Advance through the buffer and return if progress was made."""
+        if (char := self._next_char()) is None:
+            return False
+        state = self._state
+        if state is _State.START:
+            if char == "[":
+                self._state = _State.ARRAY
+            elif char == "{":
+                self._state = _State.OBJECT_KEY
+                self._in_object = True
+            else:
+                raise ValueError(f"Expected an array or object, got {char!r}")
+            self._pos += 1
+            return True
+        if state is _State.DONE:
+            raise ValueError(f"Unexpected data after the document: {char!r}")
+        if state is _State.OBJECT_COLON:
+            if char != ":":
+                raise ValueError(f"Expected ':', got {char!r}")
+            self._pos += 1
+            self._state = _State.OBJECT_VALUE
+            return True
+        if state is _State.OBJECT_VALUE:
+            if self._pending_key == self._key and char == "[":
+                self._pos += 1
+                self._state = _State.ARRAY
+                return True
+            decoded, _ = self._decode_value(final)
+            if decoded:
+                self._expect_comma = True
+                self._state = _State.OBJECT_KEY
+            return decoded
+        # Inside the array or the object, items and keys are separated by commas
+        if char == ("]" if state is _State.ARRAY else "}"):
+            self._pos += 1
+            self._expect_comma = state is _State.ARRAY and self._in_object
+            self._state = _State.OBJECT_KEY if self._expect_comma else _State.DONE
+            return True
+        if self._expect_comma:
+            if char != ",":
+                raise ValueError(f"Expected ',', got {char!r}")
+            self._pos += 1
+            self._expect_comma = False
+            return True
+        decoded, value = self._decode_value(final)
+        if not decoded:
+            return False
+        if state is _State.ARRAY:
+            items.append(value)
+            self._expect_comma = True
+        else:
+            self._pending_key = value
+            self._state = _State.OBJECT_COLON
+        return True
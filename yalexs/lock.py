@@ -43,6 +43,11 @@ class Lock(Device):
             data["HouseID"],
         )
         self._user_type = data["UserType"]
+        self._data = data
+
+    @cached_property
+    def raw(self):
+        return self._data
 
     @cached_property
     def is_operable(self):
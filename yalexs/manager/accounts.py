@@ -0,0 +1,189 @@
+"""Run many accounts in one process."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from aiohttp import ClientSession, TCPConnector
+
+from ..fair_limiter import FairLimiter
+from ..token_bucket import TokenBucketLimiter
+from ..token_store import TokenStore, _DefaultTokenStore
+from .data import YaleXSData
+from .gateway import Config, Gateway
+from .ratelimit import RateLimitCheck
+from .scheduler import SharedScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+# Requests in flight at the same time across every account
+ACCOUNTS_MAX_CONCURRENT_REQUESTS = 100
+# Accounts being set up at the same time
+ACCOUNTS_MAX_CONCURRENT_SETUPS = 20
+
+
+@dataclass
+class Account:
+    """The objects of a single account."""
+
+    account_id: str
+    gateway: Gateway
+    data: YaleXSData
+
+
+class AccountManager:
+    """Run many accounts in one process.
+
+    The accounts share one aiohttp session and connection pool, the
+    rate limiters, one scheduler for their activity updates and one
+    request limiter that hands out request slots to the accounts in
+    turn so a large account cannot starve the others. Everything
+    else, including authentication, devices and push connections,
+    is kept per account.
+    """
+
+    def __init__(
+        self,
+        config_path: Path,
+        aiohttp_session: ClientSession | None = None,
+        *,
+        max_concurrent_requests: int = ACCOUNTS_MAX_CONCURRENT_REQUESTS,
+        max_concurrent_setups: int = ACCOUNTS_MAX_CONCURRENT_SETUPS,
+        token_store: TokenStore | None = None,
+    ) -> None:
+        """Initialize the manager.
+
+        If no aiohttp_session is passed, one is created with a
+        connection pool sized for max_concurrent_requests and closed
+        when the manager is stopped.
+
+        The access tokens of the accounts are cached in token_store,
+        by default each in its own file in config_path. A store with
+        a SQLiteBackend keeps them in a single file instead.
+        """
+        self._config_path = config_path
+        self._owns_session = aiohttp_session is None
+        self._aiohttp_session = aiohttp_session or ClientSession(
+            connector=TCPConnector(limit=max_concurrent_requests)
+        )
+        self._loop = asyncio.get_running_loop()
+        self.rate_limiter = RateLimitCheck()
+        self.request_limiter = FairLimiter(max_concurrent_requests)
+        self.token_bucket_limiter = TokenBucketLimiter()
+        self.token_store = token_store or _DefaultTokenStore
+        self.scheduler = SharedScheduler(self._loop)
+        self._setup_semaphore = asyncio.Semaphore(max_concurrent_setups)
+        self._accounts: dict[str, Account] = {}
+
+    def __contains__(self, account_id: object) -> bool:
+        """Return if an account has been added."""
+        return account_id in self._accounts
+
+    def __getitem__(self, account_id: str) -> Account:
+        """Return an account."""
+        return self._accounts[account_id]
+
+    def __len__(self) -> int:
+        """Return the number of accounts."""
+        return len(self._accounts)
+
+    @property
+    def aiohttp_session(self) -> ClientSession:
+        """Return the session shared by the accounts."""
+        return self._aiohttp_session
+
+    def create_gateway(self) -> Gateway:
+        """Create a gateway that uses the shared resources."""
+        return Gateway(
+            self._config_path,
+            self._aiohttp_session,
+            rate_limiter=self.rate_limiter,
+            request_limiter=self.request_limiter,
+            token_bucket_limiter=self.token_bucket_limiter,
+            token_store=self.token_store,
+        )
+
+    async def async_add_account(
+        self,
+        account_id: str,
+        config: Config,
+        data_class: type[YaleXSData],
+        **data_kwargs: Any,
+    ) -> Account:
+        """Authenticate an account and create its data object.
+
+        The data object is created with data_class, which must
+        implement the abstract methods of YaleXSData, and the
+        data_kwargs. It is set up by async_setup_accounts.
+        """
+        if account_id in self._accounts:
+            raise ValueError(f"Account {account_id} has already been added")
+        gateway = self.create_gateway()
+        async with self._setup_semaphore:
+            await gateway.async_setup(config)
+            await gateway.async_authenticate()
+        data = data_class(
+            gateway,
+            rate_limiter=self.rate_limiter,
+            scheduler=self.scheduler,
+            **data_kwargs,
+        )
+        account = Account(account_id, gateway, data)
+        self._accounts[account_id] = account
+        return account
+
+    async def async_setup_accounts(
+        self, account_ids: Iterable[str] | None = None
+    ) -> dict[str, Exception | None]:
+        """Set up the data of the accounts, all of them by default.
+
+        Returns the exception each account failed with, or None if it
+        was set up, so one failing account does not stop the others.
+        """
+        ids = list(self._accounts if account_ids is None else account_ids)
+        results = await asyncio.gather(
+            *(self._async_setup_account(self._accounts[id_]) for id_ in ids),
+            return_exceptions=True,
+        )
+        outcomes: dict[str, Exception | None] = {}
+        for idx, result in enumerate(results):
+            account_id = ids[idx]
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                _LOGGER.warning("Failed to set up account %s: %s", account_id, result)
+                outcomes[account_id] = result
+            else:
+                outcomes[account_id] = None
+        return outcomes
+
+    async def _async_setup_account(self, account: Account) -> None:
+        """Set up the data of an account."""
+        async with self._setup_semaphore:
+            await account.data.async_setup()
+
+    async def async_remove_account(self, account_id: str) -> None:
+        """Stop an account and forget it."""
+        account = self._accounts.pop(account_id)
+        await account.data.async_stop()
+
+    async def async_stop(self) -> None:
+        """Stop every account and close the session if it was created here."""
+        accounts = list(self._accounts.values())
+        self._accounts.clear()
+        await asyncio.gather(
+            *(account.data.async_stop() for account in accounts),
+            return_exceptions=True,
+        )
+        await self.rate_limiter.async_stop()
+        try:
+            await self.token_store.async_flush()
+        except Exception:
+            _LOGGER.exception("Failed to save the access tokens")
+        if self._owns_session:
+            await self._aiohttp_session.close()
@@ -5,24 +5,43 @@ from __future__ import annotations
 import asyncio
 import logging
 from collections import defaultdict
+from collections.abc import Hashable
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any
 
 from aiohttp import ClientError
 
-from ..activity import Activity, ActivityType
+from ..activity import Activity, ActivityCursor, ActivityType, CompactActivity
 from ..api_async import ApiAsync
 from ..backports.tasks import create_eager_task
+from ..cache import TTLCache
+from ..circuit_breaker import CircuitState
 from ..exceptions import AugustApiAIOHTTPError
-from ..pubnub_async import AugustPubNub
 from ..util import get_latest_activity
 from .const import ACTIVITY_UPDATE_INTERVAL
 from .gateway import Gateway
-from .socketio import SocketIORunner
+from .history import ActivityHistory
+from .poll import AdaptivePollPolicy
+from .scheduler import DeadlineScheduler, ScopedScheduler, SharedScheduler
+from .snapshot import (
+    activity_from_snapshot,
+    activity_to_snapshot,
+    cursor_from_snapshot,
+    cursor_to_snapshot,
+)
 from .subscriber import SubscriberMixin
 
+if TYPE_CHECKING:
+    from ..pubnub_async import AugustPubNub
+    from .socketio import SocketIORunner
+
 _LOGGER = logging.getLogger(__name__)
 
 ACTIVITY_STREAM_FETCH_LIMIT = 10
 ACTIVITY_CATCH_UP_FETCH_LIMIT = 2500
+# The latest activities and cursors were restored from a snapshot
+# so only the activities since it was saved need to be fetched
+ACTIVITY_WARM_START_FETCH_LIMIT = 100
 
 INITIAL_LOCK_RESYNC_TIME = 60
 
@@ -36,6 +55,9 @@ UPDATE_SOON = 3.0
 
 NEVER_TIME = -86400.0
 
+# Number of recently processed activities remembered to drop duplicates
+ACTIVITY_DEDUP_CACHE_SIZE = 4096
+
 
 class ActivityStream(SubscriberMixin):
     """August activity stream handler."""
@@ -46,10 +68,40 @@ class ActivityStream(SubscriberMixin):
         august_gateway: Gateway,
         house_ids: set[str],
         push: AugustPubNub | SocketIORunner,
+        *,
+        stream_activities: bool = False,
+        compact_activities: bool = False,
+        history_size: int = 0,
+        history_max_age: float | None = None,
+        poll_policy: AdaptivePollPolicy | None = None,
+        scheduler: SharedScheduler | None = None,
     ) -> None:
-        """Init activity stream object."""
-        super().__init__(ACTIVITY_UPDATE_INTERVAL)
-        self._schedule_updates: dict[str, asyncio.TimerHandle] = {}
+        """Init activity stream object.
+
+        If stream_activities is set, large catch-up fetches are
+        processed as the response is read instead of after the
+        whole response has been decoded.
+
+        If compact_activities is set, fetched activities are ordered
+        as CompactActivity objects and only the latest ones are
+        built into full activities.
+
+        If history_size is set, up to that many fetched activities
+        are kept per house in an ActivityHistory, dropping those
+        older than history_max_age seconds.
+
+        If poll_policy is set, houses are also polled on the schedule
+        of the policy instead of only when push updates arrive.
+
+        If scheduler is set, the update deadlines of the houses are
+        served by it instead of a scheduler of this stream.
+        """
+        update_interval = ACTIVITY_UPDATE_INTERVAL
+        if poll_policy is not None:
+            update_interval = min(
+                update_interval, timedelta(seconds=poll_policy.push_down_interval)
+            )
+        super().__init__(update_interval)
         self._august_gateway = august_gateway
         self._api = api
         self._house_ids = house_ids
@@ -57,13 +109,92 @@ class ActivityStream(SubscriberMixin):
             str, dict[ActivityType, Activity | None]
         ] = defaultdict(lambda: defaultdict(lambda: None))
         self._did_first_update = False
+        self._restored = False
         self.push = push
         self._update_tasks: dict[str, asyncio.Task] = {}
         self._last_update_time: dict[str, float] = dict.fromkeys(house_ids, NEVER_TIME)
         self._start_time: float | None = None
         self._pending_updates: dict[str, int] = dict.fromkeys(house_ids, 1)
+        self._poll_policy = poll_policy
+        self._last_activity_time: dict[str, float] = dict.fromkeys(
+            house_ids, NEVER_TIME
+        )
         self._loop = asyncio.get_running_loop()
+        # Every house deadline is served by one loop timer
+        self._schedule_updates: DeadlineScheduler[str] | ScopedScheduler[str] = (
+            scheduler.scope(self._async_schedule_update_callback)
+            if scheduler is not None
+            else DeadlineScheduler(self._loop, self._async_schedule_update_callback)
+        )
         self._shutdown: bool = False
+        self._stream_activities = stream_activities
+        self._fetch_kwargs: dict[str, bool] = (
+            {"compact": True} if compact_activities else {}
+        )
+        # The same activity is often reported by the api, push and the
+        # result of a lock operation, so recently processed ones are
+        # remembered to drop the copies
+        self._processed_activities: TTLCache[Hashable, bool] = TTLCache(
+            ACTIVITY_DEDUP_CACHE_SIZE
+        )
+        self._dedup_hits = 0
+        self._dedup_misses = 0
+        # Activities already fetched are dropped before they are built
+        self._cursors: dict[str, ActivityCursor] = {
+            house_id: ActivityCursor() for house_id in house_ids
+        }
+        self._histories: dict[str, ActivityHistory] = (
+            {
+                house_id: ActivityHistory(history_size, history_max_age)
+                for house_id in house_ids
+            }
+            if history_size
+            else {}
+        )
+
+    @property
+    def dedup_hits(self) -> int:
+        """Return the number of duplicate activities that were dropped."""
+        return self._dedup_hits
+
+    @property
+    def dedup_misses(self) -> int:
+        """Return the number of activities that were not duplicates."""
+        return self._dedup_misses
+
+    def get_activity_history(self, house_id: str) -> ActivityHistory | None:
+        """Return the activity history for a house if it is kept."""
+        return self._histories.get(house_id)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return a snapshot of the latest activities and cursors."""
+        return {
+            "activities": [
+                activity_to_snapshot(activity)
+                for device_activities in self._latest_activities.values()
+                for activity in device_activities.values()
+                if activity is not None
+            ],
+            "cursors": {
+                house_id: cursor_to_snapshot(cursor)
+                for house_id, cursor in self._cursors.items()
+                if cursor.date_time is not None
+            },
+        }
+
+    def async_restore_snapshot(self, snapshot: dict[str, Any]) -> None:
+        """Restore the latest activities and cursors from a snapshot."""
+        self.async_process_newer_device_activities(
+            [
+                activity
+                for activity_snapshot in snapshot["activities"]
+                if (activity := activity_from_snapshot(activity_snapshot))
+            ]
+        )
+        for house_id, cursor_snapshot in snapshot["cursors"].items():
+            if house_id in self._cursors:
+                self._cursors[house_id] = cursor_from_snapshot(cursor_snapshot)
+        self._restored = True
 
     async def async_setup(self) -> None:
         """Token refresh check and catch up the activity stream."""
@@ -79,11 +210,11 @@ class ActivityStream(SubscriberMixin):
             task.cancel()
         self._update_tasks.clear()
         self._async_cancel_all_future_updates()
+        self._schedule_updates.cancel_all()
 
     def _async_cancel_future_updates(self, house_id: str) -> None:
         """Cancel future updates."""
-        if handle := self._schedule_updates.pop(house_id, None):
-            handle.cancel()
+        self._schedule_updates.cancel(house_id)
         self._pending_updates[house_id] = 0
 
     def _async_cancel_all_future_updates(self) -> None:
@@ -123,9 +254,34 @@ class ActivityStream(SubscriberMixin):
         if self._shutdown:
             return
         await self._august_gateway.async_refresh_access_token_if_needed()
-        if not self.push_updates_connected:
+        if self._poll_policy is not None and self._did_first_update:
+            self._async_poll_due_houses()
+        elif not self.push_updates_connected:
             _LOGGER.debug("Push updates are not connected, data will be stale")
 
+    def _async_poll_due_houses(self) -> None:
+        """Schedule an update for each house the poll policy says is due."""
+        policy = self._poll_policy
+        push_connected = self.push_updates_connected
+        now = self._loop.time()
+        for house_id in self._house_ids:
+            if house_id in self._schedule_updates or self._update_running(house_id):
+                continue
+            next_poll = policy.next_poll(
+                house_id,
+                push_connected=push_connected,
+                last_poll=self._last_update_time[house_id],
+                last_activity=self._last_activity_time[house_id],
+                now=now,
+            )
+            if next_poll > now:
+                continue
+            _LOGGER.debug("Polling house id %s", house_id)
+            self._pending_updates[house_id] = 1
+            self._async_schedule_update(
+                house_id, now, self._determine_update_delay(house_id, now, True)
+            )
+
     async def _async_first_refresh(self) -> None:
         """Update the activity stream from August for the first time."""
         if self.push_updates_connected:
@@ -159,7 +315,6 @@ class ActivityStream(SubscriberMixin):
 
     def _async_schedule_update_callback(self, house_id: str) -> None:
         """Schedule an update callback."""
-        self._schedule_updates.pop(house_id, None)
         now = self._loop.time()
         if delay := self._determine_update_delay(house_id, now, from_callback=True):
             self._async_schedule_update(house_id, now, delay)
@@ -187,11 +342,7 @@ class ActivityStream(SubscriberMixin):
         # likely not updated yet and we will just get the same
         # activities again. Instead, schedule the update for
         # the future.
-        if scheduled := self._schedule_updates.pop(house_id, None):
-            scheduled.cancel()
-        self._schedule_updates[house_id] = self._loop.call_at(
-            now + delay, self._async_schedule_update_callback, house_id
-        )
+        self._schedule_updates.schedule(house_id, now + delay)
 
     async def _async_execute_schedule_update(self, house_id: str) -> None:
         """Execute a scheduled update."""
@@ -238,6 +389,7 @@ class ActivityStream(SubscriberMixin):
         """Update for a house activities now and once in the future."""
         self._async_cancel_future_updates(house_id)
         now = self._loop.time()
+        self._last_activity_time[house_id] = now
         self._set_update_count(house_id, now)
         delay = self._determine_update_delay(house_id, now)
         self._async_schedule_update(house_id, now, delay)
@@ -246,6 +398,8 @@ class ActivityStream(SubscriberMixin):
         """Return if the activity limit has been reached."""
         if self._did_first_update:
             return ACTIVITY_STREAM_FETCH_LIMIT
+        if self._restored:
+            return ACTIVITY_WARM_START_FETCH_LIMIT
         return ACTIVITY_CATCH_UP_FETCH_LIMIT
 
     async def _async_update_house_id(self, house_id: str) -> None:
@@ -255,14 +409,47 @@ class ActivityStream(SubscriberMixin):
         """
         if self._shutdown:
             return
+        if (
+            breaker := self._api.circuit_breaker
+        ) and breaker.state is CircuitState.OPEN:
+            _LOGGER.debug(
+                "Skipping activity update for house id %s while the api is unavailable",
+                house_id,
+            )
+            return
 
         _LOGGER.debug("Updating device activity for house id %s", house_id)
+        limit = self._activity_limit()
+        history = self._histories.get(house_id)
         try:
-            activities = await self._api.async_get_house_activities(
-                await self._august_gateway.async_get_access_token(),
-                house_id,
-                limit=self._activity_limit(),
-            )
+            access_token = await self._august_gateway.async_get_access_token()
+            if self._stream_activities and limit > ACTIVITY_STREAM_FETCH_LIMIT:
+                updated_device_ids: set[str] = set()
+                async for activities in self._api.async_stream_house_activities(
+                    access_token,
+                    house_id,
+                    limit=limit,
+                    cursor=self._cursors[house_id],
+                    **self._fetch_kwargs,
+                ):
+                    if history is not None:
+                        history.add(activities)
+                    updated_device_ids.update(
+                        self.async_process_newer_device_activities(activities)
+                    )
+            else:
+                activities = await self._api.async_get_house_activities(
+                    access_token,
+                    house_id,
+                    limit=limit,
+                    cursor=self._cursors[house_id],
+                    **self._fetch_kwargs,
+                )
+                if history is not None:
+                    history.add(activities)
+                updated_device_ids = self.async_process_newer_device_activities(
+                    activities
+                )
         except (AugustApiAIOHTTPError, ClientError) as ex:
             _LOGGER.error(
                 "Request error trying to retrieve activity for house id %s: %s",
@@ -275,7 +462,9 @@ class ActivityStream(SubscriberMixin):
         _LOGGER.debug(
             "Completed retrieving device activities for house id %s", house_id
         )
-        for device_id in self.async_process_newer_device_activities(activities):
+        if updated_device_ids and self._did_first_update:
+            self._last_activity_time[house_id] = self._loop.time()
+        for device_id in updated_device_ids:
             _LOGGER.debug(
                 "async_signal_device_id_update (from activity stream): %s",
                 device_id,
@@ -283,12 +472,26 @@ class ActivityStream(SubscriberMixin):
             self.async_signal_device_id_update(device_id)
 
     def async_process_newer_device_activities(
-        self, activities: list[Activity]
+        self, activities: list[Activity] | list[CompactActivity]
     ) -> set[str]:
         """Process activities if they are newer than the last one."""
         updated_device_ids: set[str] = set()
         latest_activities = self._latest_activities
+        compact_winners: list[tuple[dict[ActivityType, Activity], ActivityType]] = []
+        processed_activities = self._processed_activities
         for activity in activities:
+            # Activities pushed or returned by a lock operation have no
+            # id so they are identified by what happened and when
+            dedup_key = activity.activity_id or (
+                activity.device_id,
+                activity.action,
+                activity.activity_start_time,
+            )
+            if dedup_key in processed_activities:
+                self._dedup_hits += 1
+                continue
+            self._dedup_misses += 1
+            processed_activities.set(dedup_key, True)
             device_id = activity.device_id
             activity_type = activity.activity_type
             device_activities = latest_activities[device_id]
@@ -310,5 +513,12 @@ class ActivityStream(SubscriberMixin):
 
             device_activities[activity_type] = activity
             updated_device_ids.add(device_id)
+            if type(activity) is CompactActivity:
+                compact_winners.append((device_activities, activity_type))
+
+        # Only build the full activities that are still the latest
+        for device_activities, activity_type in compact_winners:
+            if type(activity := device_activities[activity_type]) is CompactActivity:
+                device_activities[activity_type] = activity.to_activity()
 
         return updated_device_ids
@@ -27,3 +27,21 @@ ACTIVITY_UPDATE_INTERVAL = timedelta(seconds=10)
 # in order to reduce the number of api requests and
 # avoid hitting rate limits
 MIN_TIME_BETWEEN_DETAIL_UPDATES = timedelta(hours=24)
+
+# Limit how many device detail requests can be in flight at the
+# same time so large accounts do not have to refresh every device
+# in sequence, while still avoiding hammering the api.
+DEVICE_DETAIL_REFRESH_CONCURRENCY = 3
+
+# How long to wait for a single device detail refresh before
+# giving up on that device so it does not hold up the others.
+DEVICE_DETAIL_REFRESH_TIMEOUT = 60
+
+# A bridge handles one operation at a time and answers 423 while it
+# is busy, so bulk operations are limited per bridge.
+BRIDGE_OPERATION_CONCURRENCY = 1
+
+# How long to wait before retrying a bulk operation the bridge
+# answered 423 (in use) for, which happens when something else
+# is operating a lock on the same bridge.
+BRIDGE_BUSY_RETRY_DELAY = 3
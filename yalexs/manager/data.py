@@ -5,10 +5,12 @@ from __future__ import annotations
 import asyncio
 import logging
 from abc import abstractmethod
+from collections import defaultdict
 from collections.abc import Callable, Coroutine, Iterable, ValuesView
 from contextlib import suppress
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import partial
+from http import HTTPStatus
 from itertools import chain
 from typing import Any, ParamSpec, TypeVar
 
@@ -17,18 +19,26 @@ from aiohttp import ClientError, ClientResponseError, ClientSession
 from .._compat import cached_property
 from ..activity import ActivityTypes, Source
 from ..backports.tasks import create_eager_task
+from ..circuit_breaker import CircuitState
 from ..const import Brand
 from ..doorbell import ContentTokenExpired, Doorbell, DoorbellDetail
-from ..exceptions import AugustApiAIOHTTPError
+from ..exceptions import AugustApiAIOHTTPError, RateLimited
 from ..lock import Lock, LockDetail
 from ..pubnub_activity import activities_from_pubnub_message
-from ..pubnub_async import AugustPubNub
 from .activity import ActivityStream
-from .const import MIN_TIME_BETWEEN_DETAIL_UPDATES
+from .const import (
+    BRIDGE_BUSY_RETRY_DELAY,
+    BRIDGE_OPERATION_CONCURRENCY,
+    DEVICE_DETAIL_REFRESH_CONCURRENCY,
+    DEVICE_DETAIL_REFRESH_TIMEOUT,
+    MIN_TIME_BETWEEN_DETAIL_UPDATES,
+)
 from .exceptions import CannotConnect, YaleXSError
 from .gateway import Gateway
-from .ratelimit import _RateLimitChecker
-from .socketio import SocketIORunner
+from .poll import AdaptivePollPolicy
+from .ratelimit import RateLimitCheck, _RateLimitChecker
+from .scheduler import SharedScheduler
+from .snapshot import async_load_snapshot, async_save_snapshot
 from .subscriber import SubscriberMixin
 
 _LOGGER = logging.getLogger(__name__)
@@ -41,6 +51,9 @@ API_CACHED_ATTRS = {
 }
 YALEXS_BLE_DOMAIN = "yalexs_ble"
 
+# asyncio.TimeoutError is only the builtin TimeoutError from Python 3.11
+_TIMEOUT_ERRORS = (TimeoutError, asyncio.TimeoutError)
+
 _R = TypeVar("_R")
 _P = ParamSpec("_P")
 
@@ -67,10 +80,49 @@ class YaleXSData(SubscriberMixin):
     """YaleXS Data coordinator object."""
 
     def __init__(
-        self, gateway: Gateway, error_exception_class: Exception = YaleXSError
+        self,
+        gateway: Gateway,
+        error_exception_class: Exception = YaleXSError,
+        *,
+        detail_refresh_concurrency: int = DEVICE_DETAIL_REFRESH_CONCURRENCY,
+        detail_refresh_timeout: float = DEVICE_DETAIL_REFRESH_TIMEOUT,
+        push_coalesce_window: float | None = None,
+        coalesce_signals: bool = False,
+        poll_policy: AdaptivePollPolicy | None = None,
+        rate_limiter: RateLimitCheck | None = None,
+        scheduler: SharedScheduler | None = None,
+        bridge_operation_concurrency: int = BRIDGE_OPERATION_CONCURRENCY,
     ) -> None:
-        """Init August data object."""
-        super().__init__(MIN_TIME_BETWEEN_DETAIL_UPDATES)
+        """Init August data object.
+
+        If push_coalesce_window is set, push messages are held for that
+        many seconds, or until the next event loop iteration if it is 0,
+        and the messages for each device are processed together so
+        subscribers are signaled once per device per window.
+
+        If coalesce_signals is set, subscribers are called once per
+        event loop iteration no matter how many times a device is
+        signaled.
+
+        If poll_policy is set, houses are polled for activities on the
+        schedule of the policy and device details are refreshed every
+        push_down_detail_interval seconds while push updates are
+        disconnected.
+
+        The rate_limiter and scheduler are shared by the accounts of an
+        AccountManager; by default the process wide rate limiter and a
+        scheduler of the activity stream are used.
+
+        Bulk operations run up to bridge_operation_concurrency
+        operations on each bridge at the same time.
+        """
+        update_interval = MIN_TIME_BETWEEN_DETAIL_UPDATES
+        if poll_policy is not None:
+            update_interval = min(
+                update_interval,
+                timedelta(seconds=poll_policy.push_down_detail_interval),
+            )
+        super().__init__(update_interval, coalesce_signals=coalesce_signals)
         self._gateway = gateway
         self.activity_stream: ActivityStream = None
         self._api = gateway.api
@@ -80,10 +132,25 @@ class YaleXSData(SubscriberMixin):
         self._house_ids: set[str] = set()
         self._push_unsub: Callable[[], Coroutine[Any, Any, None]] | None = None
         self._initial_sync_task: asyncio.Task | None = None
+        self._reconcile_task: asyncio.Task | None = None
+        self._push_source: Source | None = None
         self._error_exception_class = error_exception_class
         self._shutdown: bool = False
         # Track last known state from WebSocket messages to avoid unnecessary updates
         self._last_websocket_state: dict[str, dict[str, str]] = {}
+        self._detail_refresh_semaphore = asyncio.Semaphore(detail_refresh_concurrency)
+        self._detail_refresh_timeout = detail_refresh_timeout
+        self._push_coalesce_window = push_coalesce_window
+        self._pending_push_messages: defaultdict[
+            str, list[tuple[datetime, dict[str, Any], Source | str]]
+        ] = defaultdict(list)
+        self._push_flush_handle: asyncio.Handle | None = None
+        self._poll_policy = poll_policy
+        self._last_detail_refresh = self._loop.time()
+        self._rate_limiter = rate_limiter or _RateLimitChecker
+        self._scheduler = scheduler
+        self._bridge_operation_concurrency = bridge_operation_concurrency
+        self._bridge_semaphores: dict[str, asyncio.Semaphore] = {}
 
     @cached_property
     def brand(self) -> Brand:
@@ -93,15 +160,134 @@ class YaleXSData(SubscriberMixin):
     async def async_setup(self) -> None:
         """Async setup of august device data and activities."""
         token = await self._gateway.async_get_access_token()
-        await _RateLimitChecker.check_rate_limit(token)
-        await _RateLimitChecker.register_wakeup(token)
+        await self._rate_limiter.check_rate_limit(token)
+        await self._rate_limiter.register_wakeup(token)
+        await self._async_setup_devices(token)
+        await self.async_setup_activity_stream()
+        self._async_start_initial_sync()
+
+    async def async_warm_setup(self, snapshot_path: str) -> bool:
+        """Set up from a snapshot and reconcile with the api in the background.
+
+        The devices, their details and the latest activities are
+        available as soon as this returns. If there is no usable
+        snapshot at snapshot_path this is the same as async_setup.
+
+        Returns if the snapshot was restored.
+        """
+        if (snapshot := await async_load_snapshot(snapshot_path)) is not None:
+            try:
+                self._restore_snapshot(snapshot)
+            except (KeyError, TypeError, ValueError) as err:
+                _LOGGER.warning("Unable to restore snapshot %s: %s", snapshot_path, err)
+                self._device_detail_by_id.clear()
+                self.activity_stream = None
+            else:
+                self._reconcile_task = create_eager_task(
+                    self._async_reconcile(), name="august-reconcile"
+                )
+                return True
+        await self.async_setup()
+        return False
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return a snapshot of the device data for a warm start."""
+        details = self._device_detail_by_id
+        return {
+            "locks": {
+                device_id: lock.raw for device_id, lock in self._locks_by_id.items()
+            },
+            "doorbells": {
+                device_id: doorbell.raw
+                for device_id, doorbell in self._doorbells_by_id.items()
+            },
+            "lock_details": {
+                device_id: details[device_id].raw
+                for device_id in self._locks_by_id
+                if device_id in details
+            },
+            "doorbell_details": {
+                device_id: details[device_id].raw
+                for device_id in self._doorbells_by_id
+                if device_id in details
+            },
+            "activity_stream": self.activity_stream.snapshot()
+            if self.activity_stream
+            else None,
+        }
+
+    async def async_save_snapshot(self, snapshot_path: str) -> None:
+        """Save a snapshot of the device data for async_warm_setup."""
+        await async_save_snapshot(snapshot_path, self.snapshot())
+
+    def _restore_snapshot(self, snapshot: dict[str, Any]) -> None:
+        """Restore the device data from a snapshot."""
+        locks = [Lock(device_id, data) for device_id, data in snapshot["locks"].items()]
+        doorbells = [
+            Doorbell(device_id, data)
+            for device_id, data in snapshot["doorbells"].items()
+        ]
+        lock_details = [LockDetail(data) for data in snapshot["lock_details"].values()]
+        doorbell_details = [
+            DoorbellDetail(data) for data in snapshot["doorbell_details"].values()
+        ]
+        self._locks_by_id = {device.device_id: device for device in locks}
+        self._doorbells_by_id = {device.device_id: device for device in doorbells}
+        self._house_ids = {device.house_id for device in chain(locks, doorbells)}
+        for detail in chain(lock_details, doorbell_details):
+            self._device_detail_by_id[detail.device_id] = detail
+            if isinstance(detail, LockDetail):
+                if detail.keypad is not None:
+                    self._device_detail_by_id[detail.keypad.device_id] = detail.keypad
+                if detail.offline_key:
+                    self.async_offline_key_discovered(detail)
+        self._remove_inoperative_locks()
+        self._remove_inoperative_doorbells()
+        self._create_activity_stream()
+        if activity_stream_snapshot := snapshot["activity_stream"]:
+            self.activity_stream.async_restore_snapshot(activity_stream_snapshot)
 
+    async def _async_reconcile(self) -> None:
+        """Bring the data restored from a snapshot up to date with the api."""
+        try:
+            token = await self._gateway.async_get_access_token()
+            try:
+                await self._rate_limiter.check_rate_limit(token)
+            except RateLimited as err:
+                _LOGGER.debug("Not refreshing the restored devices: %s", err)
+            else:
+                await self._rate_limiter.register_wakeup(token)
+                await self._async_setup_devices(token, self._house_ids)
+                self._async_start_initial_sync()
+            await self.async_setup_activity_stream()
+        except (AugustApiAIOHTTPError, ClientError, CannotConnect) as err:
+            _LOGGER.warning("Unable to reconcile the restored data: %s", err)
+
+    async def _async_setup_devices(
+        self, token: str, house_ids: set[str] | None = None
+    ) -> None:
+        """Fetch the devices and their details.
+
+        If house_ids is passed, devices in any other house are not set up.
+        """
         # This used to be a gather but it was less reliable with august's recent api changes.
         locks: list[Lock] = await self._api.async_get_operable_locks(token) or []
         doorbells: list[Doorbell] = await self._api.async_get_doorbells(token) or []
+        if house_ids is None:
+            house_ids = {device.house_id for device in chain(locks, doorbells)}
+        elif (
+            new_house_ids := {device.house_id for device in chain(locks, doorbells)}
+            - house_ids
+        ):
+            _LOGGER.info(
+                "Devices in houses %s will be set up on the next full setup",
+                new_house_ids,
+            )
+            locks = [device for device in locks if device.house_id in house_ids]
+            doorbells = [device for device in doorbells if device.house_id in house_ids]
         self._doorbells_by_id = {device.device_id: device for device in doorbells}
         self._locks_by_id = {device.device_id: device for device in locks}
-        self._house_ids = {device.house_id for device in chain(locks, doorbells)}
+        self._house_ids = house_ids
 
         await self._async_refresh_device_detail_by_ids(
             [device.device_id for device in chain(locks, doorbells)]
@@ -113,8 +299,9 @@ class YaleXSData(SubscriberMixin):
         # detail being None all over the place
         self._remove_inoperative_locks()
         self._remove_inoperative_doorbells()
-        await self.async_setup_activity_stream()
 
+    def _async_start_initial_sync(self) -> None:
+        """Start the initial sync of the locks."""
         if self._locks_by_id and self.brand is not Brand.YALE_GLOBAL:
             # Do not prevent setup as the sync can timeout
             # but it is not a fatal error as the lock
@@ -123,25 +310,42 @@ class YaleXSData(SubscriberMixin):
                 self._async_initial_sync(), name="august-initial-sync"
             )
 
-    async def async_setup_activity_stream(self) -> None:
-        """Set up the activity stream."""
-        token = await self._gateway.async_get_access_token()
-        user_data = await self._api.async_get_user(token)
+    def _create_activity_stream(self) -> None:
+        """Create the activity stream and the push connection it uses."""
         push: AugustPubNub | SocketIORunner
+        # Only one push transport is used per brand so the other
+        # one is never imported
         if self.brand is Brand.YALE_GLOBAL:
+            from .socketio import SocketIORunner  # noqa: PLC0415
+
             push = SocketIORunner(self._gateway)
-            push_source = Source.WEBSOCKET
+            self._push_source = Source.WEBSOCKET
         else:
+            from ..pubnub_async import AugustPubNub  # noqa: PLC0415
+
             push = AugustPubNub()
-            push_source = Source.PUBNUB
+            self._push_source = Source.PUBNUB
             for device in self._device_detail_by_id.values():
                 push.register_device(device)
         self.activity_stream = ActivityStream(
-            self._api, self._gateway, self._house_ids, push
+            self._api,
+            self._gateway,
+            self._house_ids,
+            push,
+            poll_policy=self._poll_policy,
+            scheduler=self._scheduler,
         )
+
+    async def async_setup_activity_stream(self) -> None:
+        """Set up the activity stream."""
+        token = await self._gateway.async_get_access_token()
+        user_data = await self._api.async_get_user(token)
+        if self.activity_stream is None:
+            self._create_activity_stream()
+        push = self.activity_stream.push
         await self.activity_stream.async_setup()
         # Use partial to bind the source parameter
-        push_callback = partial(self.async_push_message, source=push_source)
+        push_callback = partial(self.async_push_message, source=self._push_source)
         push.subscribe(push_callback)
         self._push_unsub = await push.run(user_data["UserID"], self.brand)
 
@@ -179,26 +383,69 @@ class YaleXSData(SubscriberMixin):
         source: Source | str = "unknown",
     ) -> None:
         """Process a push message."""
+        if (window := self._push_coalesce_window) is None:
+            self._async_handle_push_messages(device_id, [(date_time, message, source)])
+            return
+        self._pending_push_messages[device_id].append((date_time, message, source))
+        if self._push_flush_handle is None:
+            if window:
+                self._push_flush_handle = self._loop.call_later(
+                    window, self._async_flush_push_messages
+                )
+            else:
+                self._push_flush_handle = self._loop.call_soon(
+                    self._async_flush_push_messages
+                )
+
+    def _async_flush_push_messages(self) -> None:
+        """Process the push messages held during the coalesce window."""
+        self._push_flush_handle = None
+        pending = self._pending_push_messages
+        self._pending_push_messages = defaultdict(list)
+        for device_id, messages in pending.items():
+            self._async_handle_push_messages(device_id, messages)
+
+    def _async_handle_push_messages(
+        self,
+        device_id: str,
+        messages: list[tuple[datetime, dict[str, Any], Source | str]],
+    ) -> None:
+        """Handle the push messages for a device in the order they arrived."""
+        activities: list[ActivityTypes] = []
+        for date_time, message, source in messages:
+            try:
+                activities.extend(
+                    self._async_push_message_activities(
+                        device_id, date_time, message, source
+                    )
+                )
+            except Exception:
+                _LOGGER.exception(
+                    "Error processing push message for device %s at %s: %s",
+                    device_id,
+                    date_time,
+                    message,
+                )
+                # If we have an error, we want to continue processing other messages
+        if not activities:
+            return
         try:
-            self._async_handle_push_message(device_id, date_time, message, source)
+            self._async_process_push_activities(device_id, activities)
         except Exception:
             _LOGGER.exception(
-                "Error processing push message for device %s at %s: %s",
+                "Error processing push activities for device %s: %s",
                 device_id,
-                date_time,
-                message,
+                activities,
             )
-            # If we have an error, we want to continue processing other messages
-            return
 
-    def _async_handle_push_message(
+    def _async_push_message_activities(
         self,
         device_id: str,
         date_time: datetime,
         message: dict[str, Any],
         source: Source | str,
-    ) -> None:
-        """Handle a push message."""
+    ) -> list[ActivityTypes]:
+        """Return the activities for a push message."""
         _LOGGER.debug("async_push_message from %s: %s %s", source, device_id, message)
 
         # Check if this is a WebSocket message with unchanged state
@@ -211,10 +458,16 @@ class YaleXSData(SubscriberMixin):
                 message.get("lockAction"),
                 message.get("doorState"),
             )
-            return
+            return []
 
         device = self.get_device_detail(device_id)
-        activities = activities_from_pubnub_message(device, date_time, message, source)
+        return activities_from_pubnub_message(device, date_time, message, source)
+
+    def _async_process_push_activities(
+        self, device_id: str, activities: list[ActivityTypes]
+    ) -> None:
+        """Process the activities from push messages for a device."""
+        device = self.get_device_detail(device_id)
         activity_stream = self.activity_stream
         _LOGGER.debug("async_push_message activities: %s for %s", activities, device_id)
         if activities and activity_stream.async_process_newer_device_activities(
@@ -242,8 +495,16 @@ class YaleXSData(SubscriberMixin):
                 break
 
     async def async_stop(self, *args: Any) -> None:
-        """Stop the subscriptions."""
+        """Stop the subscriptions and the gateway."""
         self._shutdown = True
+        self._async_cancel_signal_flush()
+        if self._push_flush_handle:
+            self._push_flush_handle.cancel()
+            self._push_flush_handle = None
+        if self._reconcile_task:
+            self._reconcile_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._reconcile_task
         if self.activity_stream:
             self.activity_stream.async_stop()
         if self._initial_sync_task:
@@ -252,6 +513,8 @@ class YaleXSData(SubscriberMixin):
                 await self._initial_sync_task
         if self._push_unsub:
             await self._push_unsub()
+        await self._gateway.async_stop()
+        await self._rate_limiter.async_stop()
 
     @property
     def doorbells(self) -> ValuesView[Doorbell]:
@@ -271,28 +534,78 @@ class YaleXSData(SubscriberMixin):
         """Refresh data."""
         if self._shutdown:
             return
+        if (
+            breaker := self._api.circuit_breaker
+        ) and breaker.state is CircuitState.OPEN:
+            _LOGGER.debug("Skipping device refresh while the api is unavailable")
+            return
+        if not self._detail_refresh_due():
+            return
+        self._last_detail_refresh = self._loop.time()
         await self._async_refresh_device_detail_by_ids(self._subscriptions.keys())
 
+    def _detail_refresh_due(self) -> bool:
+        """Return if the device details should be refreshed now.
+
+        With a poll policy the refresh interval is shortened so the
+        details are refreshed often while push updates are
+        disconnected, but only once per MIN_TIME_BETWEEN_DETAIL_UPDATES
+        while they are connected.
+        """
+        if (
+            self._poll_policy is None
+            or self.activity_stream is None
+            or not self.activity_stream.push_updates_connected
+        ):
+            return True
+        # Allow for the interval timer firing a little early
+        return (
+            self._loop.time() - self._last_detail_refresh
+            > MIN_TIME_BETWEEN_DETAIL_UPDATES.total_seconds()
+            - self._update_interval_seconds / 2
+        )
+
     async def _async_refresh_device_detail_by_ids(
         self, device_ids_list: Iterable[str]
     ) -> None:
-        """Refresh each device in sequence.
+        """Refresh the detail for each device with bounded concurrency.
 
         This used to be a gather but it was less reliable with august's
-        recent api changes.
+        recent api changes so the number of requests in flight is
+        limited by the detail refresh semaphore.
 
         The august api has been timing out for some devices so
         we want the ones that it isn't timing out for to keep working.
+        Errors that are not for a single device, such as failed auth,
+        are raised once every refresh has finished.
         """
-        for device_id in device_ids_list:
+        results = await asyncio.gather(
+            *(
+                self._async_refresh_device_detail_by_id_limited(device_id)
+                for device_id in list(device_ids_list)
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def _async_refresh_device_detail_by_id_limited(self, device_id: str) -> None:
+        """Refresh a single device while holding the detail refresh semaphore."""
+        async with self._detail_refresh_semaphore:
             try:
-                await self._async_refresh_device_detail_by_id(device_id)
-            except TimeoutError:  # noqa: PERF203
+                await asyncio.wait_for(
+                    self._async_refresh_device_detail_by_id(device_id),
+                    self._detail_refresh_timeout,
+                )
+            except _TIMEOUT_ERRORS:
                 _LOGGER.warning(
                     "Timed out calling august api during refresh of device: %s",
                     device_id,
                 )
-            except (ClientResponseError, CannotConnect) as err:
+            except (ClientResponseError, AugustApiAIOHTTPError) as err:
+                if isinstance(err, AugustApiAIOHTTPError) and err.auth_failed:
+                    raise
                 _LOGGER.warning(
                     "Error from august api during refresh of device: %s",
                     device_id,
@@ -364,6 +677,7 @@ class YaleXSData(SubscriberMixin):
                 device_name,
                 ex,
             )
+            return
         _LOGGER.debug("Completed retrieving detail for %s (%s)", device_name, device_id)
         # If the key changes after startup we need to trigger a
         # discovery to keep it up to date
@@ -398,9 +712,9 @@ class YaleXSData(SubscriberMixin):
     async def async_status_async(self, device_id: str, hyper_bridge: bool) -> str:
         """Request status of the device but do not wait for a response since it will come via pubnub."""
         token = await self._gateway.async_get_access_token()
-        await _RateLimitChecker.check_rate_limit(token)
+        await self._rate_limiter.check_rate_limit(token)
         result = await self._async_status_async(device_id, hyper_bridge)
-        await _RateLimitChecker.register_wakeup(token)
+        await self._rate_limiter.register_wakeup(token)
         return result
 
     async def _async_status_async(self, device_id: str, hyper_bridge: bool) -> str:
@@ -461,6 +775,101 @@ class YaleXSData(SubscriberMixin):
             hyper_bridge,
         )
 
+    async def async_lock_many(
+        self, device_ids: Iterable[str]
+    ) -> dict[str, list[ActivityTypes] | Exception]:
+        """Lock many devices, see _async_operate_many."""
+        return await self._async_operate_many(device_ids, self.async_lock)
+
+    async def async_unlock_many(
+        self, device_ids: Iterable[str]
+    ) -> dict[str, list[ActivityTypes] | Exception]:
+        """Unlock many devices, see _async_operate_many."""
+        return await self._async_operate_many(device_ids, self.async_unlock)
+
+    async def async_unlatch_many(
+        self, device_ids: Iterable[str]
+    ) -> dict[str, list[ActivityTypes] | Exception]:
+        """Open/unlatch many devices, see _async_operate_many."""
+        return await self._async_operate_many(device_ids, self.async_unlatch)
+
+    async def _async_operate_many(
+        self,
+        device_ids: Iterable[str],
+        operation: Callable[[str], Coroutine[Any, Any, list[ActivityTypes]]],
+    ) -> dict[str, list[ActivityTypes] | Exception]:
+        """Run an operation on many devices at the same time.
+
+        The devices on different bridges are operated concurrently and
+        the devices on the same bridge are limited by the bridge
+        semaphore since the bridge rejects operations while it is busy.
+
+        Returns the activities of each device or the exception its
+        operation failed with, so one failing device does not stop the
+        others. The activities of every device are processed by the
+        activity stream together and subscribers are signaled once
+        for each updated device.
+        """
+        ids = list(dict.fromkeys(device_ids))
+        results = await asyncio.gather(
+            *(self._async_operate_on_bridge(id_, operation) for id_ in ids),
+            return_exceptions=True,
+        )
+        outcomes: dict[str, list[ActivityTypes] | Exception] = {}
+        activities: list[ActivityTypes] = []
+        for idx, result in enumerate(results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                _LOGGER.warning("Operation failed for device %s: %s", ids[idx], result)
+            else:
+                activities.extend(result)
+            outcomes[ids[idx]] = result
+        if activities and self.activity_stream:
+            for device_id in self.activity_stream.async_process_newer_device_activities(
+                activities
+            ):
+                self.async_signal_device_id_update(device_id)
+        return outcomes
+
+    async def _async_operate_on_bridge(
+        self,
+        device_id: str,
+        operation: Callable[[str], Coroutine[Any, Any, list[ActivityTypes]]],
+    ) -> list[ActivityTypes]:
+        """Run an operation while holding the semaphore of the device's bridge."""
+        async with self._bridge_semaphore(device_id):
+            try:
+                return await operation(device_id)
+            except self._error_exception_class as err:
+                cause = err.__cause__
+                if not (
+                    isinstance(cause, AugustApiAIOHTTPError)
+                    and cause.status == HTTPStatus.LOCKED
+                ):
+                    raise
+            _LOGGER.debug(
+                "Bridge for device %s is in use, retrying in %s seconds",
+                device_id,
+                BRIDGE_BUSY_RETRY_DELAY,
+            )
+            await asyncio.sleep(BRIDGE_BUSY_RETRY_DELAY)
+            return await operation(device_id)
+
+    def _bridge_semaphore(self, device_id: str) -> asyncio.Semaphore:
+        """Return the semaphore for the bridge of a device.
+
+        Devices without a bridge, like wifi locks, get their own.
+        """
+        detail = self._device_detail_by_id.get(device_id)
+        bridge = detail.bridge if isinstance(detail, LockDetail) else None
+        key = bridge.device_id if bridge else device_id
+        if (semaphore := self._bridge_semaphores.get(key)) is None:
+            semaphore = self._bridge_semaphores[key] = asyncio.Semaphore(
+                self._bridge_operation_concurrency
+            )
+        return semaphore
+
     async def _async_call_api_op_requires_bridge(
         self,
         device_id: str,
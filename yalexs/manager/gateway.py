@@ -4,7 +4,7 @@ from __future__ import annotations
 
 import asyncio
 import logging
-import os
+import time
 from http import HTTPStatus
 from pathlib import Path
 from typing import TypedDict
@@ -14,8 +14,14 @@ from aiohttp import ClientError, ClientResponseError, ClientSession
 from ..api_async import ApiAsync
 from ..authenticator_async import AuthenticationState, AuthenticatorAsync
 from ..authenticator_common import Authentication
-from ..const import DEFAULT_BRAND
+from ..backports.tasks import create_eager_task
+from ..cache import TTLCache
+from ..circuit_breaker import get_circuit_breaker
+from ..const import BASE_URLS, DEFAULT_BRAND
 from ..exceptions import AugustApiAIOHTTPError, RateLimited
+from ..fair_limiter import FairLimiter
+from ..token_bucket import TokenBucketLimiter
+from ..token_store import TokenStore, _DefaultTokenStore
 from .const import (
     CONF_ACCESS_TOKEN_CACHE_FILE,
     CONF_BRAND,
@@ -29,10 +35,13 @@ from .const import (
     VERIFICATION_CODE_KEY,
 )
 from .exceptions import CannotConnect, InvalidAuth, RequireValidation
-from .ratelimit import _RateLimitChecker
+from .ratelimit import RATE_LIMIT_STORE_FILE, RateLimitCheck, _RateLimitChecker
 
 _LOGGER = logging.getLogger(__name__)
 
+# Seconds to wait before trying again when refreshing the token fails
+TOKEN_REFRESH_RETRY_DELAY = 60
+
 
 class Config(TypedDict):
     """Config for the gateway."""
@@ -51,20 +60,146 @@ class Gateway:
 
     api: ApiAsync
     authenticator: AuthenticatorAsync
-    authentication: Authentication
+    access_token: str | None = None
     _access_token_cache_file: str
 
-    def __init__(self, config_path: Path, aiohttp_session: ClientSession) -> None:
-        """Init the connection."""
+    def __init__(
+        self,
+        config_path: Path,
+        aiohttp_session: ClientSession,
+        *,
+        rate_limiter: RateLimitCheck | None = None,
+        request_limiter: FairLimiter | None = None,
+        token_bucket_limiter: TokenBucketLimiter | None = None,
+        token_store: TokenStore | None = None,
+        cache_responses: bool = False,
+    ) -> None:
+        """Init the connection.
+
+        If request_limiter is set, the api requests of this gateway
+        wait for a slot of it, shared fairly with the other gateways
+        using it.
+
+        If token_bucket_limiter is set, the api requests wait for it
+        to keep under the api rate limits.
+
+        The access token is cached in token_store, by default in a
+        file in config_path through a store shared by the process.
+
+        If cache_responses is set, the responses of the read endpoints
+        are cached for a short time so setup does not fetch the locks
+        again right after authenticating.
+        """
         self._aiohttp_session = aiohttp_session
-        self._token_refresh_lock = asyncio.Lock()
+        self._rate_limiter = rate_limiter or _RateLimitChecker
+        self._request_limiter = request_limiter
+        self._token_bucket_limiter = token_bucket_limiter
+        self._token_store = token_store or _DefaultTokenStore
+        self._cache_responses = cache_responses
+        self._authentication: Authentication | None = None
+        self._refresh_task: asyncio.Task | None = None
+        self._refresh_handle: asyncio.TimerHandle | None = None
+        # POSIX time the token is due to be refreshed at
+        self._refresh_at: float | None = None
         self._config_path = config_path
         self._config: Config | None = None
         self._loop = asyncio.get_running_loop()
 
+    @property
+    def authentication(self) -> Authentication | None:
+        """Return the current authentication."""
+        return self._authentication
+
+    @authentication.setter
+    def authentication(self, authentication: Authentication) -> None:
+        """Replace the authentication and schedule the refresh of its token."""
+        self._authentication = authentication
+        self.access_token = authentication.access_token
+        self._async_schedule_refresh()
+
     async def async_get_access_token(self) -> str:
-        """Get the access token."""
-        return self.authentication.access_token
+        """Get the access token.
+
+        Callers that ask while the token is being refreshed get the
+        refreshed token.
+        """
+        if (task := self._refresh_task) is not None:
+            await asyncio.wait((task,))
+        return self.access_token
+
+    def _async_schedule_refresh(self, delay: float | None = None) -> None:
+        """Schedule the token to be refreshed before it expires."""
+        if self._refresh_handle:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
+        if delay is None:
+            if (refresh_at := self.authenticator.refresh_at()) is None:
+                self._refresh_at = None
+                return
+            delay = refresh_at - time.time()
+        self._refresh_at = time.time() + delay
+        self._refresh_handle = self._loop.call_later(
+            max(0.0, delay), self._async_start_refresh
+        )
+
+    def _async_start_refresh(self) -> asyncio.Task:
+        """Start refreshing the token unless a refresh is already running."""
+        self._refresh_handle = None
+        if self._refresh_task is None:
+            self._refresh_task = create_eager_task(
+                self._async_refresh_access_token(), loop=self._loop
+            )
+            if self._refresh_task.done():
+                self._async_refresh_done(self._refresh_task)
+            else:
+                self._refresh_task.add_done_callback(self._async_refresh_done)
+        return self._refresh_task
+
+    def _async_refresh_done(self, task: asyncio.Task) -> None:
+        """Retry a refresh that failed."""
+        if self._refresh_task is task:
+            self._refresh_task = None
+        if task.cancelled():
+            return
+        if (err := task.exception()) is not None:
+            _LOGGER.warning(
+                "Failed to refresh the august access token, trying again in %s"
+                " seconds: %s",
+                TOKEN_REFRESH_RETRY_DELAY,
+                err,
+            )
+            self._async_schedule_refresh(TOKEN_REFRESH_RETRY_DELAY)
+
+    async def _async_refresh_access_token(self) -> None:
+        """Refresh the access token."""
+        refreshed_authentication = await self.authenticator.async_refresh_access_token(
+            force=True
+        )
+        _LOGGER.info(
+            (
+                "Refreshed august access token. The old token expired at %s, and"
+                " the new token expires at %s"
+            ),
+            self.authentication.access_token_expires,
+            refreshed_authentication.access_token_expires,
+        )
+        self.authentication = refreshed_authentication
+        if self._refresh_at is not None and self._refresh_at <= time.time():
+            # The api did not extend the token so do not refresh it
+            # again right away
+            self._async_schedule_refresh(TOKEN_REFRESH_RETRY_DELAY)
+
+    async def async_stop(self) -> None:
+        """Cancel the scheduled token refresh and save the access token."""
+        if self._refresh_handle:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
+        if self._refresh_task:
+            self._refresh_task.cancel()
+        try:
+            await self._token_store.async_flush()
+        except Exception:
+            _LOGGER.exception("Failed to save the access token")
 
     def async_configure_access_token_cache_file(
         self, username: str, access_token_cache_file: str | None
@@ -82,17 +217,31 @@ class Gateway:
             return
 
         self._config = conf
+        # Restore the wakeups of previous runs before any are checked
+        await self._rate_limiter.async_load(
+            Path(self._config_path).joinpath(RATE_LIMIT_STORE_FILE)
+        )
+        brand = self._config.get(CONF_BRAND, DEFAULT_BRAND)
         self.api = ApiAsync(
             self._aiohttp_session,
             timeout=self._config.get(CONF_TIMEOUT, DEFAULT_TIMEOUT),
-            brand=self._config.get(CONF_BRAND, DEFAULT_BRAND),
+            brand=brand,
+            response_cache=TTLCache() if self._cache_responses else None,
+            # Shared with every account using the same api host so
+            # they all back off together when it is degraded
+            circuit_breaker=get_circuit_breaker(BASE_URLS[brand]),
+            request_limiter=self._request_limiter,
+            request_limiter_key=self,
+            token_bucket_limiter=self._token_bucket_limiter,
         )
         klass = authenticator_class or AuthenticatorAsync
         username = conf.get(CONF_USERNAME)
         access_token_cache_file_path: str | None = None
         if username:
-            access_token_cache_file_path = self.async_configure_access_token_cache_file(
-                conf[CONF_USERNAME], conf.get(CONF_ACCESS_TOKEN_CACHE_FILE)
+            access_token_cache_file_path = str(
+                self.async_configure_access_token_cache_file(
+                    conf[CONF_USERNAME], conf.get(CONF_ACCESS_TOKEN_CACHE_FILE)
+                )
             )
 
         self.authenticator = klass(
@@ -102,6 +251,7 @@ class Gateway:
             self._config.get(CONF_PASSWORD, ""),
             install_id=self._config.get(CONF_INSTALL_ID),
             access_token_cache_file=access_token_cache_file_path,
+            token_store=self._token_store,
         )
 
         await self.authenticator.async_setup_authentication()
@@ -111,7 +261,7 @@ class Gateway:
         try:
             self.authentication = await self.authenticator.async_authenticate()
             token = await self.async_get_access_token()
-            await _RateLimitChecker.check_rate_limit(token)
+            await self._rate_limiter.check_rate_limit(token)
             auth_state = self.authentication.state
             if auth_state is AuthenticationState.AUTHENTICATED:
                 # Call the locks api to verify we are actually
@@ -148,29 +298,19 @@ class Gateway:
         return self.authentication
 
     async def async_reset_authentication(self) -> None:
-        """Remove the cache file."""
-        await self._loop.run_in_executor(None, self._reset_authentication)
-
-    def _reset_authentication(self) -> None:
         """Remove the cache file."""
         path = self._config_path.joinpath(self._access_token_cache_file)
-        if os.path.exists(path):
-            os.unlink(path)
+        self._token_store.async_set(str(path), None)
+        await self._token_store.async_flush()
 
     async def async_refresh_access_token_if_needed(self) -> None:
-        """Refresh the august access token if needed."""
-        if not self.authenticator.should_refresh():
+        """Refresh the august access token if needed.
+
+        The token is refreshed by a timer, this only catches a timer
+        that is late, for example after the system was suspended.
+        """
+        if self._refresh_task is None and (
+            self._refresh_at is None or self._refresh_at > time.time()
+        ):
             return
-        async with self._token_refresh_lock:
-            refreshed_authentication = (
-                await self.authenticator.async_refresh_access_token(force=False)
-            )
-            _LOGGER.info(
-                (
-                    "Refreshed august access token. The old token expired at %s, and"
-                    " the new token expires at %s"
-                ),
-                self.authentication.access_token_expires,
-                refreshed_authentication.access_token_expires,
-            )
-            self.authentication = refreshed_authentication
+        await asyncio.shield(self._async_start_refresh())
@@ -0,0 +1,214 @@
+"""Bounded history of activities."""
+
+from __future__ import annotations
+
+import heapq
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Union
+
+from ..activity import Activity, CompactActivity
+
+HistoryActivity = Union[Activity, CompactActivity]  # noqa: UP007
+
+# Activities are ordered by a single integer key made of the start
+# time in milliseconds with an insertion sequence in the low bits so
+# activities that start in the same millisecond still have unique keys
+_SEQUENCE_BITS = 20
+_SEQUENCE_MASK = (1 << _SEQUENCE_BITS) - 1
+_MAX_KEY = (1 << 63) - 1
+
+
+def _time_key(timestamp: float) -> int:
+    """Return the smallest key for a timestamp."""
+    return int(timestamp * 1000) << _SEQUENCE_BITS
+
+
+class _TimeIndex:
+    """Activities sorted by key."""
+
+    __slots__ = ("activities", "keys")
+
+    def __init__(self) -> None:
+        """Initialize the index."""
+        self.keys = array("q")
+        self.activities: list[HistoryActivity] = []
+
+    def add(self, key: int, activity: HistoryActivity) -> None:
+        """Add an activity to the index."""
+        keys = self.keys
+        if not keys or key > keys[-1]:
+            keys.append(key)
+            self.activities.append(activity)
+            return
+        idx = bisect_right(keys, key)
+        keys.insert(idx, key)
+        self.activities.insert(idx, activity)
+
+    def range(self, start_key: int, end_key: int) -> list[HistoryActivity]:
+        """Return the activities with a key in [start_key, end_key)."""
+        keys = self.keys
+        return self.activities[
+            bisect_left(keys, start_key) : bisect_left(keys, end_key)
+        ]
+
+    def keyed_range(
+        self, start_key: int, end_key: int
+    ) -> list[tuple[int, HistoryActivity]]:
+        """Return (key, activity) pairs with a key in [start_key, end_key)."""
+        keys = self.keys
+        activities = self.activities
+        return [
+            (keys[idx], activities[idx])
+            for idx in range(bisect_left(keys, start_key), bisect_left(keys, end_key))
+        ]
+
+    def evict_before(self, key: int) -> None:
+        """Remove the activities with a key before key."""
+        if (idx := bisect_left(self.keys, key)) > 0:
+            del self.keys[:idx]
+            del self.activities[:idx]
+
+
+class ActivityHistory:
+    """A bounded, time ordered history of the activities for a house.
+
+    The activities are kept in a list sorted by start time, with a
+    parallel array of sort keys, and in the same kind of sorted index
+    per device, action and device + action so range queries such as
+    the unlocks of a device in the last hour are a binary search. The
+    activities arrive mostly in order so adding one is usually an
+    append. Once there are more than maxlen or they are older than
+    max_age seconds, the oldest activities are sliced off the front
+    of the lists.
+    """
+
+    def __init__(self, maxlen: int, max_age: float | None = None) -> None:
+        """Initialize the history."""
+        self._maxlen = maxlen
+        self._max_age = max_age
+        self._sequence = 0
+        self._all = _TimeIndex()
+        self._seen: set[tuple[str | None, str | None, str | None, int]] = set()
+        self._by_device: dict[str | None, _TimeIndex] = {}
+        self._by_action: dict[str | None, _TimeIndex] = {}
+        self._by_device_action: dict[tuple[str | None, str | None], _TimeIndex] = {}
+
+    def __len__(self) -> int:
+        """Return the number of activities in the history."""
+        self._evict_expired()
+        return len(self._all.keys)
+
+    def add(self, activities: Iterable[HistoryActivity]) -> int:
+        """Add activities to the history and return how many were new."""
+        added = 0
+        for activity in activities:
+            added += self._add(activity)
+        if added:
+            self._evict()
+        return added
+
+    def _add(self, activity: HistoryActivity) -> bool:
+        """Add an activity unless it is already in the history."""
+        device_id = activity.device_id
+        action = activity.action
+        timestamp = activity.activity_start_time.timestamp()
+        # The same activity is returned by every fetch that overlaps
+        # so it is identified by its id, or what it did and when if
+        # it does not have one
+        seen_key = (activity.activity_id, device_id, action, int(timestamp * 1000))
+        if seen_key in self._seen:
+            return False
+        self._seen.add(seen_key)
+        key = _time_key(timestamp) | (self._sequence & _SEQUENCE_MASK)
+        self._sequence += 1
+        self._all.add(key, activity)
+        for indexes, index_key in (
+            (self._by_device, device_id),
+            (self._by_action, action),
+            (self._by_device_action, (device_id, action)),
+        ):
+            if (index := indexes.get(index_key)) is None:
+                index = indexes[index_key] = _TimeIndex()
+            index.add(key, activity)
+        return True
+
+    def query(
+        self,
+        *,
+        device_id: str | None = None,
+        actions: Iterable[str] | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> list[HistoryActivity]:
+        """Return the activities that match, oldest first.
+
+        start is inclusive and end is exclusive.
+        """
+        self._evict_expired()
+        start_key = 0 if start is None else _time_key(start.timestamp())
+        end_key = _MAX_KEY if end is None else _time_key(end.timestamp())
+        if actions is None:
+            if device_id is None:
+                return self._all.range(start_key, end_key)
+            if index := self._by_device.get(device_id):
+                return index.range(start_key, end_key)
+            return []
+        indexes = [
+            index
+            for action in set(actions)
+            if (
+                index := (
+                    self._by_action.get(action)
+                    if device_id is None
+                    else self._by_device_action.get((device_id, action))
+                )
+            )
+        ]
+        if len(indexes) == 1:
+            return indexes[0].range(start_key, end_key)
+        return [
+            activity
+            for _, activity in heapq.merge(
+                *(index.keyed_range(start_key, end_key) for index in indexes),
+                key=lambda item: item[0],
+            )
+        ]
+
+    def _evict(self) -> None:
+        """Evict activities that are too old or over the size limit."""
+        self._evict_expired()
+        if (overflow := len(self._all.keys) - self._maxlen) > 0:
+            self._evict_before(self._all.keys[overflow])
+
+    def _evict_expired(self) -> None:
+        """Evict activities that are older than the max age."""
+        if self._max_age is None or not self._all.keys:
+            return
+        cutoff = _time_key(time.time() - self._max_age)
+        if self._all.keys[0] < cutoff:
+            self._evict_before(cutoff)
+
+    def _evict_before(self, key: int) -> None:
+        """Evict the activities with a key before key."""
+        if (idx := bisect_left(self._all.keys, key)) == 0:
+            return
+        for activity in self._all.activities[:idx]:
+            self._seen.discard(
+                (
+                    activity.activity_id,
+                    activity.device_id,
+                    activity.action,
+                    int(activity.activity_start_time.timestamp() * 1000),
+                )
+            )
+        self._all.evict_before(key)
+        for indexes in (self._by_device, self._by_action, self._by_device_action):
+            for index_key in list(indexes):
+                index = indexes[index_key]
+                index.evict_before(key)
+                if not index.keys:
+                    del indexes[index_key]
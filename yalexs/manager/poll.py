@@ -0,0 +1,69 @@
+"""Adaptive polling policy for houses."""
+
+from __future__ import annotations
+
+import math
+import zlib
+from dataclasses import dataclass
+
+# Poll quiet houses this often while push updates are connected
+POLL_QUIET_INTERVAL = 1800
+# Poll houses that had activity recently this often
+POLL_ACTIVE_INTERVAL = 60
+# Poll every house this often while push updates are disconnected
+POLL_PUSH_DOWN_INTERVAL = 10
+# A house is active for this long after its last activity
+POLL_ACTIVE_WINDOW = 600
+# Refresh device details this often while push updates are disconnected
+POLL_PUSH_DOWN_DETAIL_INTERVAL = 3600
+
+
+@dataclass(frozen=True)
+class AdaptivePollPolicy:
+    """How often a house is polled when push updates can be missed.
+
+    Quiet houses are polled rarely while push updates are connected
+    since push delivers their changes. The interval tightens for a
+    house with recent activity, where push messages are often
+    followed by more events, and for every house while push is
+    disconnected. Each house polls at its own phase within the
+    interval so houses with the same interval do not poll at the
+    same time.
+    """
+
+    quiet_interval: float = POLL_QUIET_INTERVAL
+    active_interval: float = POLL_ACTIVE_INTERVAL
+    push_down_interval: float = POLL_PUSH_DOWN_INTERVAL
+    active_window: float = POLL_ACTIVE_WINDOW
+    push_down_detail_interval: float = POLL_PUSH_DOWN_DETAIL_INTERVAL
+
+    def interval(
+        self, *, push_connected: bool, last_activity: float, now: float
+    ) -> float:
+        """Return the poll interval for a house."""
+        if not push_connected:
+            return self.push_down_interval
+        if now - last_activity < self.active_window:
+            return self.active_interval
+        return self.quiet_interval
+
+    def next_poll(
+        self,
+        house_id: str,
+        *,
+        push_connected: bool,
+        last_poll: float,
+        last_activity: float,
+        now: float,
+    ) -> float:
+        """Return the loop time the house should be polled next."""
+        interval = self.interval(
+            push_connected=push_connected, last_activity=last_activity, now=now
+        )
+        # A stable phase per house spreads the polls across the interval
+        phase = zlib.crc32(house_id.encode()) / 0xFFFFFFFF * interval
+        # The first slot for the house at least half an interval after
+        # the last poll, so moving to a new phase never polls twice in
+        # quick succession
+        earliest = last_poll + interval / 2
+        return math.ceil((earliest - phase) / interval) * interval + phase
@@ -2,16 +2,34 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import logging
 import time
 from collections import defaultdict
+from pathlib import Path
 
 from ..exceptions import RateLimited
+from .snapshot import async_load_snapshot, async_save_snapshot
+
+_LOGGER = logging.getLogger(__name__)
 
 RATE_LIMIT_WAKEUP_INTERVAL = 60 * 26
 
+# A wakeup is written to the store right away, the ones that follow
+# within this many seconds are batched into the next write
+RATE_LIMIT_SAVE_DELAY = 5
+
+RATE_LIMIT_STORE_FILE = ".yalexs_rate_limits.json"
+
 _NEVER_TIME = -RATE_LIMIT_WAKEUP_INTERVAL
 
 
+def _token_hash(token: str) -> str:
+    """Return the key a token is stored under so the token is never written."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 class RateLimitCheck:
     """The rate limit is checked locally here to avoid getting blocked.
 
@@ -20,15 +38,45 @@ class RateLimitCheck:
 
     If rate limiting is not checked locally there is a risk that the
     client will get permanently blocked by the server.
+
+    Once a store has been loaded, the wakeups are saved to it with
+    wall clock timestamps so a restarted process still knows about
+    the wakeups of the one before it.
     """
 
     def __init__(self) -> None:
         """Initialize the rate limit checker."""
         self._client_wakeups: defaultdict[str, float] = defaultdict(lambda: _NEVER_TIME)
+        self._store_path: Path | None = None
+        # Wakeups loaded from the store, by token hash, until the
+        # token they belong to is checked
+        self._stored_wakeups: dict[str, float] = {}
+        self._save_handle: asyncio.TimerHandle | None = None
+        self._save_task: asyncio.Task | None = None
+        self._last_save_time = _NEVER_TIME
+
+    async def async_load(self, path: Path) -> None:
+        """Load the wakeups saved in the store at path and save to it from now on."""
+        if self._store_path == path:
+            return
+        self._store_path = path
+        if (snapshot := await async_load_snapshot(str(path))) is None:
+            return
+        wall_now = time.time()
+        now = time.monotonic()
+        for key, wall_time in snapshot.get("wakeups", {}).items():
+            # Convert back to the monotonic clock of this process
+            if (age := wall_now - wall_time) < RATE_LIMIT_WAKEUP_INTERVAL:
+                self._stored_wakeups[key] = now - max(0.0, age)
 
     async def check_rate_limit(self, token: str) -> None:
         """Check if the client is rate limited."""
         now = time.monotonic()
+        if self._stored_wakeups and token not in self._client_wakeups:
+            if (
+                stored := self._stored_wakeups.pop(_token_hash(token), None)
+            ) is not None:
+                self._client_wakeups[token] = stored
         last_time = self._client_wakeups[token]
         next_allowed = last_time + RATE_LIMIT_WAKEUP_INTERVAL
         if next_allowed > now:
@@ -40,7 +88,66 @@ class RateLimitCheck:
 
     async def register_wakeup(self, token: str) -> None:
         """Register a wakeup for the client."""
-        self._client_wakeups[token] = time.monotonic()
+        now = time.monotonic()
+        self._client_wakeups[token] = now
+        if self._store_path is None or self._save_handle is not None:
+            return
+        if (
+            self._save_task and not self._save_task.done()
+        ) or now - self._last_save_time < RATE_LIMIT_SAVE_DELAY:
+            self._save_handle = asyncio.get_running_loop().call_later(
+                RATE_LIMIT_SAVE_DELAY, self._async_schedule_save
+            )
+            return
+        # Nothing was saved recently so save now, a process that
+        # crashes right after setup must not lose the wakeup
+        self._async_schedule_save()
+
+    def _async_schedule_save(self) -> None:
+        """Save the wakeups registered since the last save."""
+        self._save_handle = None
+        if self._save_task and not self._save_task.done():
+            # Saved again by the running save once it is done
+            self._save_handle = asyncio.get_running_loop().call_later(
+                RATE_LIMIT_SAVE_DELAY, self._async_schedule_save
+            )
+            return
+        self._last_save_time = time.monotonic()
+        self._save_task = asyncio.get_running_loop().create_task(self.async_save())
+
+    async def async_save(self) -> None:
+        """Save the wakeups that still limit a client to the store."""
+        if self._store_path is None:
+            return
+        wall_now = time.time()
+        now = time.monotonic()
+        wakeups = {
+            key: wall_now - (now - last_time)
+            for key, last_time in self._stored_wakeups.items()
+            if now - last_time < RATE_LIMIT_WAKEUP_INTERVAL
+        }
+        wakeups.update(
+            (_token_hash(token), wall_now - (now - last_time))
+            for token, last_time in self._client_wakeups.items()
+            if now - last_time < RATE_LIMIT_WAKEUP_INTERVAL
+        )
+        try:
+            await async_save_snapshot(str(self._store_path), {"wakeups": wakeups})
+        except OSError as err:
+            _LOGGER.warning(
+                "Unable to save rate limits to %s: %s", self._store_path, err
+            )
+
+    async def async_stop(self) -> None:
+        """Save any wakeups that have not been saved yet."""
+        if self._save_task:
+            # Let the running save finish first so it cannot overwrite
+            # the newer one
+            await self._save_task
+        if self._save_handle:
+            self._save_handle.cancel()
+            self._save_handle = None
+            await self.async_save()
 
 
 _RateLimitChecker = RateLimitCheck()
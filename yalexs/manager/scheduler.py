@@ -0,0 +1,186 @@
+"""Deadline scheduling with a single event loop timer."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import time
+from collections.abc import Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+_KT = TypeVar("_KT", bound=Hashable)
+
+_MONOTONIC_RESOLUTION = time.get_clock_info("monotonic").resolution
+
+# Rebuild the heap once it holds this many times more entries than
+# there are deadlines so superseded entries do not pile up
+_COMPACT_RATIO = 4
+_COMPACT_MIN_SIZE = 64
+
+
+class DeadlineScheduler(Generic[_KT]):
+    """Call a callback for each key once its deadline has passed.
+
+    Every deadline lives in one heap that is served by a single
+    event loop timer, instead of a timer per key, so keeping many
+    keys rescheduled does not churn the event loop. Cancelling or
+    moving a deadline does not touch the heap; superseded entries
+    are skipped when they come up.
+    """
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, callback: Callable[[_KT], None]
+    ) -> None:
+        """Initialize the scheduler."""
+        self._loop = loop
+        self._callback = callback
+        # The heap entry that is current for each key
+        self._deadlines: dict[_KT, tuple[float, int]] = {}
+        self._heap: list[tuple[float, int, _KT]] = []
+        self._sequence = 0
+        self._timer: asyncio.TimerHandle | None = None
+
+    def __contains__(self, key: object) -> bool:
+        """Return if a deadline is scheduled for the key."""
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        """Return the number of scheduled deadlines."""
+        return len(self._deadlines)
+
+    def schedule(self, key: _KT, when: float) -> None:
+        """Schedule the callback for key at loop time when.
+
+        Replaces any deadline already scheduled for the key.
+        """
+        if (current := self._deadlines.get(key)) and current[0] == when:
+            return
+        self._sequence += 1
+        self._deadlines[key] = (when, self._sequence)
+        heapq.heappush(self._heap, (when, self._sequence, key))
+        if len(self._heap) > max(
+            _COMPACT_MIN_SIZE, len(self._deadlines) * _COMPACT_RATIO
+        ):
+            self._compact()
+        if self._timer is None or when < self._timer.when():
+            self._arm(when)
+
+    def cancel(self, key: _KT) -> bool:
+        """Cancel the deadline for a key and return if there was one."""
+        return self._deadlines.pop(key, None) is not None
+
+    def cancel_all(self) -> None:
+        """Cancel every deadline."""
+        self._deadlines.clear()
+        self._heap.clear()
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _compact(self) -> None:
+        """Drop the superseded entries from the heap."""
+        deadlines = self._deadlines
+        self._heap = [
+            entry for entry in self._heap if deadlines.get(entry[2]) == entry[:2]
+        ]
+        heapq.heapify(self._heap)
+
+    def _arm(self, when: float) -> None:
+        """Set the loop timer to fire at when."""
+        if self._timer:
+            self._timer.cancel()
+        self._timer = self._loop.call_at(when, self._run)
+
+    def _run(self) -> None:
+        """Call the callbacks for the deadlines that have passed."""
+        self._timer = None
+        heap = self._heap
+        deadlines = self._deadlines
+        now = self._loop.time() + _MONOTONIC_RESOLUTION
+        due: list[_KT] = []
+        while heap and heap[0][0] <= now:
+            when, sequence, key = heapq.heappop(heap)
+            if deadlines.get(key) == (when, sequence):
+                del deadlines[key]
+                due.append(key)
+        # Skip the superseded entries so the timer is not set for them
+        while heap and deadlines.get(heap[0][2]) != heap[0][:2]:
+            heapq.heappop(heap)
+        if heap:
+            self._arm(heap[0][0])
+        for key in due:
+            self._callback(key)
+
+
+def _call_scoped(key: tuple[ScopedScheduler[Any], Any]) -> None:
+    """Call the callback of the scope a deadline belongs to."""
+    scope, scoped_key = key
+    scope._async_fire(scoped_key)
+
+
+class SharedScheduler:
+    """One DeadlineScheduler serving the deadlines of many owners.
+
+    Each owner gets a ScopedScheduler with its own callback and
+    keys, so owners can use the same keys without clashing and
+    cancelling everything for one owner leaves the others alone.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Initialize the scheduler."""
+        self._scheduler: DeadlineScheduler[tuple[ScopedScheduler[Any], Any]] = (
+            DeadlineScheduler(loop, _call_scoped)
+        )
+
+    def __len__(self) -> int:
+        """Return the number of scheduled deadlines of every owner."""
+        return len(self._scheduler)
+
+    def scope(self, callback: Callable[[_KT], None]) -> ScopedScheduler[_KT]:
+        """Return a scheduler for one owner."""
+        return ScopedScheduler(self._scheduler, callback)
+
+
+class ScopedScheduler(Generic[_KT]):
+    """The deadlines of one owner of a SharedScheduler."""
+
+    def __init__(
+        self,
+        scheduler: DeadlineScheduler[tuple[ScopedScheduler[Any], Any]],
+        callback: Callable[[_KT], None],
+    ) -> None:
+        """Initialize the scope."""
+        self._scheduler = scheduler
+        self._callback = callback
+        self._keys: set[_KT] = set()
+
+    def __contains__(self, key: object) -> bool:
+        """Return if a deadline is scheduled for the key."""
+        return key in self._keys
+
+    def __len__(self) -> int:
+        """Return the number of scheduled deadlines."""
+        return len(self._keys)
+
+    def schedule(self, key: _KT, when: float) -> None:
+        """Schedule the callback for key at loop time when."""
+        self._keys.add(key)
+        self._scheduler.schedule((self, key), when)
+
+    def cancel(self, key: _KT) -> bool:
+        """Cancel the deadline for a key and return if there was one."""
+        if key not in self._keys:
+            return False
+        self._keys.discard(key)
+        return self._scheduler.cancel((self, key))
+
+    def cancel_all(self) -> None:
+        """Cancel every deadline of the owner."""
+        for key in self._keys:
+            self._scheduler.cancel((self, key))
+        self._keys.clear()
+
+    def _async_fire(self, key: _KT) -> None:
+        """Call the callback for a deadline that has passed."""
+        self._keys.discard(key)
+        self._callback(key)
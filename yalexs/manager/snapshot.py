@@ -0,0 +1,74 @@
+"""Snapshots of the device data for a warm start."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any
+
+from .._compat import json_dumps, json_loads
+from ..activity import ActivityCursor, ActivityTypes
+from ..api_common import _activity_from_dict
+from ..util import write_file_atomic
+
+_LOGGER = logging.getLogger(__name__)
+
+# Bump when the layout changes so older snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+
+def activity_to_snapshot(activity: ActivityTypes) -> dict[str, Any]:
+    """Return the snapshot of an activity."""
+    return {"source": activity.source, "data": activity.raw}
+
+
+def activity_from_snapshot(data: dict[str, Any]) -> ActivityTypes | None:
+    """Rebuild an activity from its snapshot."""
+    return _activity_from_dict(data["source"], data["data"])
+
+
+def cursor_to_snapshot(cursor: ActivityCursor) -> dict[str, Any]:
+    """Return the snapshot of an activity cursor."""
+    return {"date_time": cursor.date_time, "activity_ids": sorted(cursor.activity_ids)}
+
+
+def cursor_from_snapshot(data: dict[str, Any]) -> ActivityCursor:
+    """Rebuild an activity cursor from its snapshot."""
+    return ActivityCursor(data["date_time"], data["activity_ids"])
+
+
+def _read_snapshot(path: str) -> bytes:
+    """Read the snapshot file."""
+    return Path(path).read_bytes()
+
+
+async def async_save_snapshot(path: str, snapshot: dict[str, Any]) -> None:
+    """Save a snapshot to path."""
+    data = json_dumps({**snapshot, "version": SNAPSHOT_VERSION}).encode()
+    await asyncio.get_running_loop().run_in_executor(
+        None, write_file_atomic, Path(path), data
+    )
+
+
+async def async_load_snapshot(path: str) -> dict[str, Any] | None:
+    """Load the snapshot at path or return None if there is no usable one."""
+    try:
+        data = await asyncio.get_running_loop().run_in_executor(
+            None, _read_snapshot, path
+        )
+    except FileNotFoundError:
+        _LOGGER.debug("Snapshot file not found: %s", path)
+        return None
+    except OSError as err:
+        _LOGGER.warning("Unable to read snapshot file (%s): %s", path, err)
+        return None
+    try:
+        snapshot = json_loads(data)
+    except ValueError as err:
+        _LOGGER.warning("Unable to decode snapshot file (%s): %s", path, err)
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        _LOGGER.debug("Ignoring snapshot with an unsupported version: %s", path)
+        return None
+    return snapshot
@@ -15,8 +15,15 @@ from ..backports.tasks import create_eager_task
 class SubscriberMixin(ABC):
     """Base implementation for a subscriber."""
 
-    def __init__(self, update_interval: timedelta) -> None:
-        """Initialize an subscriber."""
+    def __init__(
+        self, update_interval: timedelta, *, coalesce_signals: bool = False
+    ) -> None:
+        """Initialize an subscriber.
+
+        If coalesce_signals is set, signaled devices are marked dirty
+        and their callbacks are called once on the next event loop
+        iteration, in the order the devices were first signaled.
+        """
         super().__init__()
         self._update_interval_seconds = update_interval.total_seconds()
         self._subscriptions: defaultdict[str, set[Callable[[], None]]] = defaultdict(
@@ -25,6 +32,10 @@ class SubscriberMixin(ABC):
         self._unsub_interval: asyncio.TimerHandle | None = None
         self._loop = asyncio.get_running_loop()
         self._refresh_task: asyncio.Task | None = None
+        self._coalesce_signals = coalesce_signals
+        # dict instead of set to keep the order devices were signaled in
+        self._dirty_device_ids: dict[str, None] = {}
+        self._signal_flush_handle: asyncio.Handle | None = None
 
     def async_subscribe_device_id(
         self, device_id: str, update_callback: Callable[[], None]
@@ -70,6 +81,14 @@ class SubscriberMixin(ABC):
         """Cleanup on shutdown."""
         self._refresh_task.cancel()
         self._async_cancel_update_interval()
+        self._async_cancel_signal_flush()
+
+    def _async_cancel_signal_flush(self) -> None:
+        """Drop the signals waiting to be dispatched."""
+        if self._signal_flush_handle:
+            self._signal_flush_handle.cancel()
+            self._signal_flush_handle = None
+        self._dirty_device_ids.clear()
 
     def async_unsubscribe_device_id(
         self, device_id: str, update_callback: Callable[[], None]
@@ -84,5 +103,25 @@ class SubscriberMixin(ABC):
 
     def async_signal_device_id_update(self, device_id: str) -> None:
         """Call the callbacks for a device_id."""
+        if not self._coalesce_signals:
+            self._async_dispatch_device_id_update(device_id)
+            return
+        self._dirty_device_ids[device_id] = None
+        if self._signal_flush_handle is None:
+            self._signal_flush_handle = self._loop.call_soon(
+                self._async_flush_device_id_updates
+            )
+
+    def _async_flush_device_id_updates(self) -> None:
+        """Call the callbacks for the devices signaled since the last flush."""
+        self._signal_flush_handle = None
+        dirty_device_ids = self._dirty_device_ids
+        # Devices signaled by the callbacks are dispatched in the next flush
+        self._dirty_device_ids = {}
+        for device_id in dirty_device_ids:
+            self._async_dispatch_device_id_update(device_id)
+
+    def _async_dispatch_device_id_update(self, device_id: str) -> None:
+        """Call the callbacks for a device_id now."""
         for update_callback in self._subscriptions.get(device_id, ()):
             update_callback()
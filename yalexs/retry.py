@@ -0,0 +1,80 @@
+"""Retry policy for api requests."""
+
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+
+from .api_common import (
+    API_RETRY_ATTEMPTS,
+    API_RETRY_DEADLINE,
+    API_RETRY_MAX_TIME,
+    API_RETRY_TIME,
+)
+
+RETRY_STATUSES = frozenset({HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.BAD_GATEWAY})
+
+
+def parse_retry_after(value: str | None, now: float | None = None) -> float | None:
+    """Parse a Retry-After header into a number of seconds.
+
+    The header can either be a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at.tzinfo is None:
+        return None
+    return max(0.0, retry_at.timestamp() - (time.time() if now is None else now))
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How a request is retried when the api is overloaded.
+
+    Retries back off exponentially with full jitter so clients that
+    were rate limited at the same time do not retry in lockstep. A
+    Retry-After sent by the api is always honored, and no retry is
+    started once it would run past the deadline for the call.
+    """
+
+    attempts: int = API_RETRY_ATTEMPTS
+    base_delay: float = API_RETRY_TIME
+    max_delay: float = API_RETRY_MAX_TIME
+    deadline: float | None = API_RETRY_DEADLINE
+    retry_statuses: frozenset[int] = RETRY_STATUSES
+
+    def should_retry(self, status: int) -> bool:
+        """Return if a response status should be retried."""
+        return status in self.retry_statuses
+
+    def backoff(self, attempt: int) -> float:
+        """Return the jittered delay before retrying after an attempt."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Return the delay before retrying, honoring any Retry-After."""
+        if retry_after is None:
+            return self.backoff(attempt)
+        # Spread out the clients that were all told to come back at
+        # the same time
+        return retry_after + random.uniform(0, self.base_delay)
+
+    def deadline_at(self, start: float) -> float | None:
+        """Return the monotonic time the retry budget for a call runs out."""
+        return None if self.deadline is None else start + self.deadline
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
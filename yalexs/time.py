@@ -4,7 +4,6 @@ import datetime
 from functools import lru_cache
 
 import ciso8601
-import dateutil.parser
 
 
 @lru_cache(maxsize=512)
@@ -18,4 +17,8 @@ def parse_datetime(datetime_string: str) -> datetime.datetime:
     try:
         return ciso8601.parse_datetime(datetime_string)
     except ValueError:
+        # dateutil is slow to import and only needed for the
+        # strings that are not ISO 8601
+        import dateutil.parser  # noqa: PLC0415
+
         return dateutil.parser.parse(datetime_string)
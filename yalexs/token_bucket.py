@@ -0,0 +1,116 @@
+"""Token bucket rate limiting for api requests."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+
+from .api_common import (
+    API_ENDPOINT_CLASS_AUTH,
+    API_ENDPOINT_CLASS_OPERATE,
+    API_ENDPOINT_CLASS_READ,
+    API_ENDPOINT_CLASS_WAKEUP,
+)
+from .cache import TTLCache
+from .exceptions import RateLimited
+
+# Buckets kept before the least recently used ones are dropped
+TOKEN_BUCKET_CACHE_SIZE = 16384
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    """The rate requests are allowed at and how many can burst."""
+
+    rate: float
+    burst: float
+
+    def refill_time(self, tokens: float) -> float:
+        """Return how long it takes a bucket to fill up from tokens."""
+        return (self.burst - tokens) / self.rate
+
+
+# The bursts cover setting up a large account, which reads the detail
+# of every device and asks every lock for its status at once, so only
+# sustained traffic is slowed down
+DEFAULT_BUCKET_LIMITS: dict[str, BucketLimit] = {
+    API_ENDPOINT_CLASS_READ: BucketLimit(rate=5.0, burst=300),
+    API_ENDPOINT_CLASS_OPERATE: BucketLimit(rate=1.0, burst=50),
+    # Waking a lock or doorbell drains its battery and the api is
+    # quick to block clients that do it too often
+    API_ENDPOINT_CLASS_WAKEUP: BucketLimit(rate=1 / 10, burst=200),
+    API_ENDPOINT_CLASS_AUTH: BucketLimit(rate=1 / 60, burst=5),
+}
+
+
+class TokenBucketLimiter:
+    """Keep requests under the api limits by waiting for them.
+
+    Each access token has a bucket per endpoint class. A request
+    takes a token from its bucket, waiting for one to be refilled
+    when the bucket is empty instead of failing, unless the wait
+    would run past its timeout. Tokens are reserved in the order
+    requests arrive so waiters are served first come first served.
+
+    A bucket that has refilled is the same as a missing one, so
+    buckets expire once full and idle accounts and old access
+    tokens do not use any memory.
+    """
+
+    def __init__(self, limits: dict[str, BucketLimit] | None = None) -> None:
+        """Initialize the limiter.
+
+        The limits are merged into the default limits. Endpoint
+        classes without a limit are not rate limited.
+        """
+        self._limits = DEFAULT_BUCKET_LIMITS | (limits or {})
+        # The tokens left in each bucket and when they were counted
+        self._buckets: TTLCache[tuple[str, str], tuple[float, float]] = TTLCache(
+            TOKEN_BUCKET_CACHE_SIZE
+        )
+
+    def tokens(self, token: str, endpoint_class: str) -> float:
+        """Return the tokens left in a bucket, negative if there are waiters."""
+        if (limit := self._limits.get(endpoint_class)) is None:
+            return float("inf")
+        return self._tokens((token, endpoint_class), limit, time.monotonic())
+
+    async def acquire(
+        self, token: str, endpoint_class: str, *, timeout: float | None = None
+    ) -> None:
+        """Wait until a request is allowed.
+
+        Raises RateLimited without waiting if the request would not be
+        allowed within timeout seconds.
+        """
+        if (limit := self._limits.get(endpoint_class)) is None:
+            return
+        key = (token, endpoint_class)
+        now = time.monotonic()
+        tokens = self._tokens(key, limit, now) - 1
+        wait = 0.0 if tokens >= 0 else -tokens / limit.rate
+        if timeout is not None and wait > timeout:
+            raise RateLimited(
+                f"Rate limited, {endpoint_class} requests are allowed again"
+                f" in {int(wait)} seconds",
+                now + wait,
+            )
+        self._buckets.set(key, (tokens, now), limit.refill_time(tokens))
+        if not wait:
+            return
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Give the reserved token back for the requests behind
+            now = time.monotonic()
+            tokens = min(limit.burst, self._tokens(key, limit, now) + 1)
+            self._buckets.set(key, (tokens, now), limit.refill_time(tokens))
+            raise
+
+    def _tokens(self, key: tuple[str, str], limit: BucketLimit, now: float) -> float:
+        """Return the tokens in a bucket at now."""
+        if (state := self._buckets.get(key)) is None:
+            return limit.burst
+        tokens, counted_at = state
+        return min(limit.burst, tokens + (now - counted_at) * limit.rate)
@@ -0,0 +1,209 @@
+"""Storage for the cached access tokens."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from contextlib import closing
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .util import write_file_atomic
+
+if TYPE_CHECKING:
+    import sqlite3
+
+_LOGGER = logging.getLogger(__name__)
+
+# Writes are held this long so the writes of many accounts, or many
+# writes of one account, are done in a single executor job
+TOKEN_STORE_WRITE_DELAY = 1.0
+
+
+class TokenStoreBackend(ABC):
+    """Where the tokens of a TokenStore are kept.
+
+    The methods block and are called from the executor.
+    """
+
+    @abstractmethod
+    def read(self, key: str) -> str | None:
+        """Return the value stored for a key or None if there is none."""
+
+    @abstractmethod
+    def write(self, entries: dict[str, str | None]) -> None:
+        """Store the values for the keys, deleting those that are None."""
+
+
+class FileBackend(TokenStoreBackend):
+    """Keep each token in its own file, using the file path as the key."""
+
+    def read(self, key: str) -> str | None:
+        """Return the contents of the file."""
+        try:
+            return Path(key).read_text()
+        except FileNotFoundError:
+            return None
+
+    def write(self, entries: dict[str, str | None]) -> None:
+        """Replace or remove the files."""
+        for key, value in entries.items():
+            if value is None:
+                Path(key).unlink(missing_ok=True)
+            else:
+                write_file_atomic(Path(key), value.encode())
+
+
+class SQLiteBackend(TokenStoreBackend):
+    """Keep every token in one SQLite database file."""
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the backend."""
+        self._path = path
+        self._created = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return a connection to the database, creating the table if needed."""
+        import sqlite3  # noqa: PLC0415
+
+        connection = sqlite3.connect(self._path)
+        if not self._created:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS tokens"
+                    " (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+                )
+            self._created = True
+        return connection
+
+    def read(self, key: str) -> str | None:
+        """Return the value stored for a key."""
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT value FROM tokens WHERE key = ?", (key,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def write(self, entries: dict[str, str | None]) -> None:
+        """Store the values in a single transaction."""
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO tokens (key, value) VALUES (?, ?)",
+                [(key, value) for key, value in entries.items() if value is not None],
+            )
+            connection.executemany(
+                "DELETE FROM tokens WHERE key = ?",
+                [(key,) for key, value in entries.items() if value is None],
+            )
+
+
+class TokenStore:
+    """Read-through cache of access tokens in front of a backend.
+
+    Reads are served from memory once a key has been found or written,
+    keys that are missing are read from the backend again next time.
+    Writes update memory right away and are written to the backend
+    together after TOKEN_STORE_WRITE_DELAY seconds, so a token that
+    is written several times or the tokens of many accounts only
+    cost one executor job.
+    """
+
+    def __init__(
+        self,
+        backend: TokenStoreBackend | None = None,
+        write_delay: float = TOKEN_STORE_WRITE_DELAY,
+    ) -> None:
+        """Initialize the store, keeping each token in a file by default."""
+        self._backend = backend or FileBackend()
+        self._write_delay = write_delay
+        self._cache: dict[str, str | None] = {}
+        self._pending: dict[str, str | None] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+
+    async def async_get(self, key: str) -> str | None:
+        """Return the value for a key."""
+        if key in self._cache:
+            return self._cache[key]
+        value = await asyncio.get_running_loop().run_in_executor(
+            None, self._backend.read, key
+        )
+        if key in self._cache:
+            # A write while reading is newer than what was read
+            return self._cache[key]
+        if value is not None:
+            self._cache[key] = value
+        return value
+
+    def async_set(self, key: str, value: str | None) -> None:
+        """Set the value for a key, or delete it if value is None."""
+        self._cache[key] = value
+        self._pending[key] = value
+        self._async_schedule_flush()
+
+    def _async_schedule_flush(self) -> None:
+        """Schedule a flush unless one is already scheduled."""
+        loop = asyncio.get_running_loop()
+        # The store is shared by the process and may outlive a loop
+        if self._loop is not loop:
+            self._loop = loop
+            self._flush_handle = None
+            self._flush_task = None
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                self._write_delay, self._async_start_flush
+            )
+
+    def _async_start_flush(self) -> None:
+        """Write the pending values to the backend."""
+        self._flush_handle = None
+        if self._flush_task and not self._flush_task.done():
+            # Wait for the running write so writes are not reordered
+            self._async_schedule_flush()
+            return
+        self._flush_task = asyncio.get_running_loop().create_task(
+            self._async_scheduled_flush()
+        )
+
+    async def _async_scheduled_flush(self) -> None:
+        """Write the pending values, keeping them for the next flush on failure."""
+        try:
+            await self.async_flush()
+        except Exception:
+            _LOGGER.exception("Unable to save the access tokens")
+
+    async def async_flush(self) -> None:
+        """Write the pending values to the backend now."""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if (
+            self._flush_task
+            and not self._flush_task.done()
+            and self._flush_task is not asyncio.current_task()
+            and self._flush_task.get_loop() is asyncio.get_running_loop()
+        ):
+            await self._flush_task
+        if not self._pending:
+            return
+        entries = self._pending
+        self._pending = {}
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._backend.write, entries
+            )
+        except Exception:
+            # Keep the entries so they are written with the next flush
+            self._pending = entries | self._pending
+            raise
+        for key, value in entries.items():
+            # Forget deleted keys once they are gone from the backend
+            if value is None and key not in self._pending:
+                self._cache.pop(key, None)
+
+
+# The store used when none is passed so every gateway in the process
+# sees the tokens written by the others before they reach the backend
+_DefaultTokenStore = TokenStore()
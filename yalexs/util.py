@@ -1,7 +1,10 @@
 import datetime
+import os
 import random
 import ssl
+import tempfile
 from functools import cache
+from pathlib import Path
 from typing import TYPE_CHECKING, Optional, Union
 
 from .activity import (
@@ -136,3 +139,19 @@ def get_ssl_context() -> ssl.SSLContext:
     random.shuffle(backup_ciphers)
     context.set_ciphers(":".join((*default_ciphers, *backup_ciphers)))
     return context
+
+
+def write_file_atomic(path: Path, data: bytes) -> None:
+    """Replace a file so it is never left partially written."""
+    target = path.resolve()
+    fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}-")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        tmp_path.replace(target)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise